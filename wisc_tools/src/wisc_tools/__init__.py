@@ -0,0 +1,5 @@
+import logging
+
+# The library stays silent until the application configures logging, e.g. through
+# wisc_tools.convenience.diagnostics.enable_diagnostics
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,165 @@
+'''
+Conversions between wisc_tools structures and ROS messages.
+
+Message packages are resolved lazily, so this module imports without ROS.
+Call use_standins() to swap in the plain Python types from
+wisc_tools.adapters.standins, and use_ros() to go back
+'''
+from wisc_tools.convenience.lazy import LazyModule
+from wisc_tools.structures import Position, Quaternion, Pose
+
+transformations = LazyModule('wisc_tools.conversions.transformations')
+
+std_msgs = LazyModule('std_msgs.msg')
+geometry_msgs = LazyModule('geometry_msgs.msg')
+wisc_msgs = LazyModule('wisc_msgs.msg')
+visualization_msgs = LazyModule('visualization_msgs.msg')
+
+def use_standins():
+    global std_msgs, geometry_msgs, wisc_msgs, visualization_msgs
+    from wisc_tools.adapters import standins
+    std_msgs = standins.std_msgs
+    geometry_msgs = standins.geometry_msgs
+    wisc_msgs = standins.wisc_msgs
+    visualization_msgs = standins.visualization_msgs
+
+def use_ros():
+    global std_msgs, geometry_msgs, wisc_msgs, visualization_msgs
+    std_msgs = LazyModule('std_msgs.msg')
+    geometry_msgs = LazyModule('geometry_msgs.msg')
+    wisc_msgs = LazyModule('wisc_msgs.msg')
+    visualization_msgs = LazyModule('visualization_msgs.msg')
+
+#===============================================================================
+#       Position
+#===============================================================================
+
+def ros_vector3(position):
+    return geometry_msgs.Vector3(x=position.x,y=position.y,z=position.z)
+
+def ros_point(position):
+    return geometry_msgs.Point(x=position.x,y=position.y,z=position.z)
+
+def from_ros_vector3(vector3):
+    return Position(x=vector3.x,y=vector3.y,z=vector3.z)
+
+def from_ros_point(point):
+    return Position(x=point.x,y=point.y,z=point.z)
+
+#===============================================================================
+#       Orientation
+#===============================================================================
+
+def ros_quaternion(quaternion):
+    return geometry_msgs.Quaternion(x=quaternion.x,y=quaternion.y,z=quaternion.z,w=quaternion.w)
+
+def ros_euler(quaternion):
+    (r,p,y) = transformations.euler_from_quaternion([quaternion.w,quaternion.x,quaternion.y,quaternion.z],'szxy')
+    return wisc_msgs.Euler(r=r,p=p,y=y)
+
+def from_ros_quaternion(quaternion):
+    return Quaternion(x=quaternion.x,y=quaternion.y,z=quaternion.z,w=quaternion.w)
+
+def from_ros_euler(euler):
+    tf_quat = transformations.quaternion_from_euler(euler.r,euler.p,euler.y,'szxy')
+    return Quaternion.from_vector_quaternion(tf_quat)
+
+#===============================================================================
+#       Pose
+#===============================================================================
+
+def ros_pose(pose):
+    return geometry_msgs.Pose(position=ros_point(pose.position),orientation=ros_quaternion(pose.quaternion))
+
+def ros_eulerpose(pose):
+    return wisc_msgs.EulerPose(position=ros_point(pose.position),orientation=ros_euler(pose.quaternion))
+
+def from_ros_pose(pose):
+    return Pose(from_ros_point(pose.position),from_ros_quaternion(pose.orientation))
+
+def from_ros_eulerpose(eulerpose):
+    return Pose(from_ros_point(eulerpose.position),from_ros_euler(eulerpose.orientation))
+
+def ros_ee_pose_goals(poses):
+    return wisc_msgs.EEPoseGoals(ee_poses=[ros_pose(pose) for pose in poses])
+
+#===============================================================================
+#       In-place Fill
+#===============================================================================
+
+# Publishers that send at a fixed rate can keep one message per topic and
+# refill it every tick instead of allocating new ones
+
+class MessagePool(object):
+    '''
+    MessagePool Class.
+    Free list of reusable messages built by factory on demand
+    '''
+    def __init__(self, factory):
+        self.factory = factory
+        self.free = []
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self):
+        if self.free:
+            return self.free.pop()
+        return self.factory()
+
+    def release(self, msg):
+        self.free.append(msg)
+
+def fill_ros_point(msg, position):
+    msg.x = position.x
+    msg.y = position.y
+    msg.z = position.z
+    return msg
+
+def fill_ros_quaternion(msg, quaternion):
+    msg.x = quaternion.x
+    msg.y = quaternion.y
+    msg.z = quaternion.z
+    msg.w = quaternion.w
+    return msg
+
+def fill_ros_pose(msg, pose):
+    fill_ros_point(msg.position, pose.position)
+    fill_ros_quaternion(msg.orientation, pose.quaternion)
+    return msg
+
+def fill_ros_pose_values(msg, position, quaternion):
+    # position is [x,y,z] and quaternion [w,x,y,z], as in PoseArray rows
+    point = msg.position
+    point.x, point.y, point.z = position
+    orientation = msg.orientation
+    orientation.w, orientation.x, orientation.y, orientation.z = quaternion
+    return msg
+
+def fill_ee_pose_goals(msg, poses, pool=None, stamp=None):
+    '''
+    Refills msg.ee_poses from a list of Poses or a PoseArray, reusing the Pose
+    messages already there. Extra messages go back to pool, and missing ones
+    come from it (or are created if no pool is given). Poses are written
+    field by field; a PoseArray's rows are converted to floats with one
+    tolist() per array, since messages take plain floats.
+    '''
+    if not hasattr(poses, 'positions'):
+        poses = list(poses)
+    messages = msg.ee_poses
+    count = len(poses)
+    while len(messages) > count:
+        extra = messages.pop()
+        if pool is not None:
+            pool.release(extra)
+    while len(messages) < count:
+        messages.append(pool.acquire() if pool is not None else geometry_msgs.Pose())
+    if hasattr(poses, 'positions'):
+        for message, position, quaternion in zip(messages, poses.positions.tolist(), poses.quaternions.tolist()):
+            fill_ros_pose_values(message, position, quaternion)
+    else:
+        for message, pose in zip(messages, poses):
+            fill_ros_pose(message, pose)
+    if stamp is not None:
+        msg.header.stamp = stamp
+    return msg
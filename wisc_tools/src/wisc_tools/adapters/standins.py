@@ -0,0 +1,87 @@
+'''
+Plain Python stand-ins for the ROS message types wisc_tools produces and
+consumes. They take the same keyword arguments and expose the same fields,
+so conversions can run in tests, benchmarks and worker processes that have
+no ROS workspace. See wisc_tools.adapters.ros.use_standins
+'''
+
+class Message(object):
+    '''
+    Message Class.
+    Keyword-constructed record with per-field defaults, compared by value
+    '''
+    __slots__ = ()
+    defaults = {}
+
+    def __init__(self, **kwargs):
+        for field in self.__slots__:
+            if field in kwargs:
+                setattr(self, field, kwargs.pop(field))
+            else:
+                default = self.defaults.get(field, 0.0)
+                setattr(self, field, default() if callable(default) else default)
+        if kwargs:
+            raise TypeError('{0} has no fields {1}'.format(type(self).__name__, ', '.join(sorted(kwargs))))
+
+    def __eq__(self, other):
+        return type(self) == type(other) and all([getattr(self, field) == getattr(other, field) for field in self.__slots__])
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(['{0}={1!r}'.format(field, getattr(self, field)) for field in self.__slots__]))
+
+class Namespace(object):
+    # Mirrors a <package>.msg module
+    def __init__(self, **messages):
+        self.__dict__.update(messages)
+
+class Header(Message):
+    __slots__ = ('seq', 'stamp', 'frame_id')
+    defaults = {'seq':0, 'frame_id':''}
+
+class ColorRGBA(Message):
+    __slots__ = ('r', 'g', 'b', 'a')
+
+class Vector3(Message):
+    __slots__ = ('x', 'y', 'z')
+
+class Point(Message):
+    __slots__ = ('x', 'y', 'z')
+
+class Quaternion(Message):
+    __slots__ = ('x', 'y', 'z', 'w')
+
+class Pose(Message):
+    __slots__ = ('position', 'orientation')
+    defaults = {'position':Point, 'orientation':Quaternion}
+
+class Euler(Message):
+    __slots__ = ('r', 'p', 'y')
+
+class EulerPose(Message):
+    __slots__ = ('position', 'orientation')
+    defaults = {'position':Point, 'orientation':Euler}
+
+class EEPoseGoals(Message):
+    __slots__ = ('header', 'ee_poses')
+    defaults = {'header':Header, 'ee_poses':list}
+
+class Marker(Message):
+    __slots__ = ('header', 'ns', 'id', 'type', 'action', 'pose', 'scale', 'color', 'lifetime',
+                 'frame_locked', 'points', 'colors', 'text', 'mesh_resource', 'mesh_use_embedded_materials')
+    defaults = {'header':Header, 'ns':'', 'id':0, 'type':0, 'action':0, 'pose':Pose, 'scale':Vector3,
+                'color':ColorRGBA, 'frame_locked':False, 'points':list, 'colors':list, 'text':'',
+                'mesh_resource':'', 'mesh_use_embedded_materials':False}
+    ARROW, CUBE, SPHERE, CYLINDER, LINE_STRIP, LINE_LIST, CUBE_LIST, SPHERE_LIST, POINTS = range(9)
+    ADD, MODIFY, DELETE, DELETEALL = 0, 0, 2, 3
+
+class MarkerArray(Message):
+    __slots__ = ('markers',)
+    defaults = {'markers':list}
+
+std_msgs = Namespace(Header=Header, ColorRGBA=ColorRGBA)
+geometry_msgs = Namespace(Vector3=Vector3, Point=Point, Quaternion=Quaternion, Pose=Pose)
+wisc_msgs = Namespace(Euler=Euler, EulerPose=EulerPose, EEPoseGoals=EEPoseGoals)
+visualization_msgs = Namespace(Marker=Marker, MarkerArray=MarkerArray)
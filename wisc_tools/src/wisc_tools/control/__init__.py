@@ -1,4 +1,23 @@
-__all__ = ["Event","EventController","StateController"]
+__all__ = ["Event","EventController","StateController","ModeEngine","StateControllerPool","StateControllerRunner","Catalog","load_catalog","Clock","RosClock","WallClock","SimulatedClock","TrajectoryRecorder","TrajectoryReplayer","TrajectoryMarkers"]
 
 from .planning import *
+from .modes import ModeEngine
+from .clock import Clock, RosClock, WallClock, SimulatedClock
+from .catalog import Catalog, load_catalog
 from .state_controller import StateController
+
+# Imported on first use so that plain controller users skip asyncio, zlib and friends
+LAZY = {
+    'StateControllerPool':'pool',
+    'StateControllerRunner':'runner',
+    'TrajectoryRecorder':'recorder',
+    'TrajectoryReplayer':'recorder',
+    'TrajectoryMarkers':'visualization',
+}
+
+def __getattr__(name):
+    if name in LAZY:
+        import importlib
+        module = importlib.import_module('.'+LAZY[name], __name__)
+        return getattr(module, name)
+    raise AttributeError('module {0} has no attribute {1}'.format(__name__, name))
@@ -0,0 +1,156 @@
+import os
+import numpy as np
+from wisc_tools.structures import Position, Quaternion, Pose, PoseIndex, quaternions_from_euler
+from wisc_tools.structures.structures import MODE_KINDS
+
+# Bump when the compiled layout changes so stale caches are ignored
+CACHE_VERSION = 2
+
+def compile_columns(poses):
+    '''
+    Flattens {arm: {name: eulerpose dict}} into pose columns, converting every
+    Euler rotation to a quaternion in one vectorized pass
+    '''
+    entries = [(arm,name,info) for arm,named in poses.items() for name,info in named.items()]
+    rotations = np.array([[info['rotation']['r'],info['rotation']['p'],info['rotation']['y']] for arm,name,info in entries],dtype=float).reshape(-1,3)
+    return {'arms':list(poses.keys()),
+            'keys':[(arm,name) for arm,name,info in entries],
+            'defaults':[bool(info['default']) for arm,name,info in entries],
+            'positions':np.array([[info['position']['x'],info['position']['y'],info['position']['z']] for arm,name,info in entries],dtype=float).reshape(-1,3),
+            'quaternions':quaternions_from_euler(rotations[:,0],rotations[:,1],rotations[:,2],'szxy')}
+
+def build_poses(columns):
+    # Builds the {arm: {name: {'pose','default'}}} layout used by StateController
+    compiled = {arm:{} for arm in columns['arms']}
+    for (arm,name),default,position,quaternion in zip(columns['keys'],columns['defaults'],columns['positions'].tolist(),columns['quaternions'].tolist()):
+        compiled[arm][name] = {'pose':Pose(Position(*position),Quaternion.from_vector_quaternion(quaternion)),'default':default}
+    return compiled
+
+class Catalog(object):
+    '''
+    Catalog Class.
+    Compiled poses, modes, actions and annotations. Catalogs are treated as
+    read-only, so one instance can be shared by any number of controllers
+    '''
+
+    def __init__(self, poses={}, modes={}, actions={}, annotations={}):
+        self.poses = poses
+        self.modes = modes
+        self.actions = actions
+        self.annotations = annotations
+        self.indices = {}
+
+    @classmethod
+    def from_dicts(cls, poses={}, modes={}, actions={}, annotations={}):
+        return cls(build_poses(compile_columns(poses)), modes, actions, annotations)
+
+    def default_pose(self, arm):
+        return [info['pose'] for pose,info in self.poses[arm].items() if info['default']][0]
+
+    def pose_index(self, arm):
+        # Built on first use and shared by every controller using this catalog
+        index = self.indices.get(arm)
+        if index is None:
+            index = self.indices[arm] = PoseIndex.from_catalog(self.poses[arm])
+        return index
+
+    def validate(self):
+        '''
+        Returns a list of problems with references between actions, poses,
+        modes and annotations. An empty list means the catalog is consistent
+        '''
+        problems = []
+        for arm,named in self.poses.items():
+            if not any([info['default'] for info in named.values()]):
+                problems.append('arm {0} has no default pose'.format(arm))
+        for mode,info in self.modes.items():
+            if info['value'] not in info['values']:
+                problems.append('mode {0} starts at unknown value {1}'.format(mode,info['value']))
+            if info.get('kind','slinear') not in MODE_KINDS:
+                problems.append('mode {0} has unknown kind {1}'.format(mode,info['kind']))
+        for action,arms in self.actions.items():
+            for arm,events in arms.items():
+                if arm not in self.poses:
+                    problems.append('action {0} uses unknown arm {1}'.format(action,arm))
+                    continue
+                for event in events:
+                    if event['pose'] not in self.poses[arm]:
+                        problems.append('action {0} uses unknown pose {1} for arm {2}'.format(action,event['pose'],arm))
+                    for mode,value in event.get('modes',{}).items():
+                        if mode not in self.modes:
+                            problems.append('action {0} uses unknown mode {1}'.format(action,mode))
+                        elif value not in self.modes[mode]['values']:
+                            problems.append('action {0} uses unknown value {1} for mode {2}'.format(action,value,mode))
+                    for annotation in event.get('annotations',{}).keys():
+                        if annotation not in self.annotations:
+                            problems.append('action {0} uses unknown annotation {1}'.format(action,annotation))
+        return problems
+
+def parse_catalog(data, path):
+    import json
+    if path.endswith('.msgpack') or path.endswith('.mpk'):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError('Loading {0} requires msgpack (pip install msgpack)'.format(path))
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data.decode('utf-8'))
+
+def load_catalog(path, cache_dir=None):
+    '''
+    Loads a Catalog from a JSON or MessagePack file holding 'poses', 'modes',
+    'actions' and 'annotations'. References are validated, and the compiled
+    catalog is cached in cache_dir (~/.cache/wisc_tools by default, False to
+    disable) under the file's hash, so unchanged files skip compilation
+    '''
+    # Only catalog loading needs these, so they stay out of the package import
+    import hashlib
+    import json
+    with open(path,'rb') as f:
+        data = f.read()
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser('~'),'.cache','wisc_tools')
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha1(data).hexdigest()
+        cache_path = os.path.join(cache_dir,'catalog-{0}-{1}.npz'.format(CACHE_VERSION,digest))
+        if os.path.exists(cache_path):
+            try:
+                # Plain arrays and JSON only: a cache file can never run code when loaded
+                with np.load(cache_path,allow_pickle=False) as cached:
+                    rest = json.loads(str(cached['definition']))
+                    columns = {'arms':rest['arms'],
+                               'keys':[tuple(key) for key in rest['keys']],
+                               'defaults':rest['defaults'],
+                               'positions':cached['positions'],
+                               'quaternions':cached['quaternions']}
+                # Poses are cached as arrays, which load far faster than rebuilt Quaternions
+                return Catalog(build_poses(columns),rest['modes'],rest['actions'],rest['annotations'])
+            except Exception:
+                # A corrupt or incompatible cache is rebuilt below
+                pass
+
+    definition = parse_catalog(data, path)
+    columns = compile_columns(definition.get('poses',{}))
+    catalog = Catalog(build_poses(columns),
+                      definition.get('modes',{}),
+                      definition.get('actions',{}),
+                      definition.get('annotations',{}))
+    problems = catalog.validate()
+    if len(problems) > 0:
+        raise ValueError('Invalid catalog {0}:\n  {1}'.format(path,'\n  '.join(problems)))
+
+    if cache_path is not None:
+        try:
+            rest = json.dumps({'arms':columns['arms'],'keys':columns['keys'],'defaults':columns['defaults'],
+                               'modes':catalog.modes,'actions':catalog.actions,'annotations':catalog.annotations})
+        except (TypeError,ValueError):
+            # MessagePack can hold values JSON cannot; such catalogs are just not cached
+            return catalog
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        temporary = '{0}.{1}.tmp'.format(cache_path,os.getpid())
+        with open(temporary,'wb') as f:
+            np.savez(f,positions=columns['positions'],quaternions=columns['quaternions'],definition=np.array(rest))
+        os.rename(temporary,cache_path)
+    return catalog
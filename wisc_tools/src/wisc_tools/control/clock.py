@@ -0,0 +1,64 @@
+import time
+from abc import ABCMeta, abstractmethod
+
+try:
+    from abc import ABC
+except ImportError:
+    ABC = ABCMeta('ABC', (object,), {})
+
+class Clock(ABC):
+    '''
+    Clock Class.
+    Source of time (in seconds) for a StateController
+    '''
+    simulated = False
+
+    @abstractmethod
+    def now(self):
+        pass
+
+class RosClock(Clock):
+    '''
+    RosClock Class.
+    Reads time from rospy, honoring /use_sim_time
+    '''
+    def __init__(self):
+        import rospy
+        self.get_time = rospy.get_time
+
+    def now(self):
+        return self.get_time()
+
+class WallClock(Clock):
+    '''
+    WallClock Class.
+    Monotonic wall time, independent of ROS
+    '''
+    def __init__(self):
+        self.source = getattr(time, 'monotonic', time.time)
+
+    def now(self):
+        return self.source()
+
+class SimulatedClock(Clock):
+    '''
+    SimulatedClock Class.
+    Only moves when advanced, so scripted runs can go faster than real time
+    '''
+    simulated = True
+
+    def __init__(self, start=0.0):
+        self.time = float(start)
+
+    def now(self):
+        return self.time
+
+    def advance(self, duration):
+        assert duration >= 0
+        self.time += duration
+        return self.time
+
+    def advance_to(self, time):
+        assert time >= self.time
+        self.time = float(time)
+        return self.time
@@ -0,0 +1,245 @@
+'''
+Layered mode resolution.
+
+Every mode keeps two precomputed trajectories: the deferred layer, fed by
+scheduled actions, and the override layer, fed by direct set_mode calls. A flag
+picks which layer drives the mode, so toggling an override never refits
+anything from the events. The layer taking over is rebased on the mode's
+current value, keeping its later waypoints, so the value never jumps. With a
+fade time (per mode through a 'fade' entry in the mode info) the value also
+cross-fades linearly from the old layer to the new one.
+'''
+import numpy as np
+from wisc_tools.structures import ModeTrajectory
+from wisc_tools.structures.structures import STEP_KINDS, LINEAR_KINDS
+
+# Kinds ModeStack reproduces exactly; modes of any other kind are looked up one by one
+STACKABLE = STEP_KINDS + LINEAR_KINDS
+
+class ModeView(object):
+    '''
+    ModeView Class.
+    A mode resolved at one engine state, read like a ModeTrajectory. Views are
+    replaced rather than modified, so snapshots can hold on to them.
+    '''
+    def __init__(self,deferred,override,active,fade=None):
+        self.deferred = deferred
+        self.override = override
+        self.active = active
+        self.fade = fade
+
+    @property
+    def trajectory(self):
+        return self.override if self.active else self.deferred
+
+    @property
+    def previous(self):
+        return self.deferred if self.active else self.override
+
+    def __getitem__(self,time):
+        value = self.trajectory[time]
+        if self.fade is not None:
+            start,duration = self.fade
+            weight = min(max((time - start) / duration,0.0),1.0)
+            if weight < 1.0:
+                previous = self.previous[time]
+                value = previous + weight * (value - previous)
+        return value
+
+    def sample(self,times):
+        '''Vectorized lookup at many times, as an (M,) array'''
+        times = np.asarray(times,dtype=float)
+        values = self.trajectory.sample(times)
+        if self.fade is not None:
+            start,duration = self.fade
+            weights = np.clip((times - start) / duration,0.0,1.0)
+            previous = self.previous.sample(times)
+            values = previous + weights * (values - previous)
+        return values
+
+class ModeStack(object):
+    '''
+    ModeStack Class.
+    Packs many step or linear ModeTrajectory objects into padded arrays so they
+    can all be evaluated at one time in a single vectorized pass, like
+    structures.PoseTrajectoryStack
+    '''
+    def __init__(self,trajectories=[]):
+        self.trajectories = []
+        self.lengths = np.zeros(0,dtype=int)
+        self.steps = np.zeros(0,dtype=bool)
+        self.extrapolated = np.zeros(0,dtype=bool)
+        self.minimum = np.zeros(0)
+        self.maximum = np.zeros(0)
+        self.times = np.zeros((0,1))
+        self.values = np.zeros((0,1))
+        self.refresh(trajectories)
+
+    def __len__(self):
+        return len(self.trajectories)
+
+    def refresh(self,trajectories):
+        trajectories = list(trajectories)
+        width = max([len(trajectory.times) for trajectory in trajectories] + [1])
+        if len(trajectories) != len(self.trajectories) or width > self.times.shape[1]:
+            count = len(trajectories)
+            self.trajectories = [None] * count
+            self.lengths = np.zeros(count,dtype=int)
+            self.steps = np.zeros(count,dtype=bool)
+            self.extrapolated = np.zeros(count,dtype=bool)
+            self.minimum = np.zeros(count)
+            self.maximum = np.zeros(count)
+            self.times = np.full((count,width),np.inf)
+            self.values = np.zeros((count,width))
+        # Only rows whose trajectory object was replaced get rewritten
+        for row,trajectory in enumerate(trajectories):
+            if self.trajectories[row] is trajectory:
+                continue
+            length = len(trajectory.times)
+            self.times[row,:] = np.inf
+            self.times[row,:length] = trajectory.times
+            self.values[row,:length] = trajectory.values
+            self.lengths[row] = length
+            self.steps[row] = trajectory.step
+            # Linear trajectories of 4+ waypoints are not padded in front, so interp1d
+            # extrapolates the first segment there (and the result is clamped)
+            self.extrapolated[row] = not trajectory.step and length >= 4
+            self.minimum[row] = trajectory.minimum
+            self.maximum[row] = trajectory.maximum
+            self.trajectories[row] = trajectory
+
+    def sample(self,time):
+        rows = np.arange(len(self.trajectories))
+        last = self.lengths - 1
+        start = np.clip((self.times <= time).sum(axis=1) - 1,0,np.maximum(last,0))
+        stop = np.minimum(start + 1,last)
+        t0 = self.times[rows,start]
+        t1 = self.times[rows,stop]
+        span = t1 - t0
+        fraction = np.where(span > 0,(time - t0) / np.where(span > 0,span,1.0),0.0)
+        fraction = np.minimum(fraction,1.0)
+        fraction = np.where(self.extrapolated,fraction,np.maximum(fraction,0.0))
+        fraction = np.where(self.steps,0.0,fraction)
+        v0 = self.values[rows,start]
+        v1 = self.values[rows,stop]
+        return np.clip(v0 + fraction * (v1 - v0),self.minimum,self.maximum)
+
+class ModeEngine(object):
+    '''
+    ModeEngine Class.
+    Deferred and override layers for every mode, with O(1) switching between
+    them. Reads like a {mode: ModeView} mapping.
+    '''
+    def __init__(self,mode_info={},fade=0.0):
+        self.modes = list(mode_info.keys())
+        self.kinds = {mode:info.get('kind','slinear') for mode,info in mode_info.items()}
+        self.fade_times = {mode:info.get('fade',fade) for mode,info in mode_info.items()}
+        self.overrides = {mode:info['override'] for mode,info in mode_info.items()}
+        initial = {mode:ModeTrajectory([{'time':0,'mode':info['values'][info['value']]}],kind=self.kinds[mode]) for mode,info in mode_info.items()}
+        self.layers = {False:dict(initial),True:dict(initial)}
+        self.fades = {}
+        self.views = {}
+        self.index = {mode:index for index,mode in enumerate(self.modes)}
+        self.active = np.array([self.overrides[mode] for mode in self.modes],dtype=bool)
+        self.stack = ModeStack()
+        self.stale = True
+
+    def __len__(self):
+        return len(self.modes)
+
+    def __iter__(self):
+        return iter(self.modes)
+
+    def __contains__(self,mode):
+        return mode in self.overrides
+
+    def keys(self):
+        return list(self.modes)
+
+    def items(self):
+        return [(mode,self[mode]) for mode in self.modes]
+
+    def __getitem__(self,mode):
+        view = self.views.get(mode)
+        if view is None:
+            view = self.views[mode] = ModeView(self.layers[False][mode],self.layers[True][mode],self.overrides[mode],self.fades.get(mode))
+        return view
+
+    def layer(self,mode,override):
+        return self.layers[override][mode]
+
+    def set_layer(self,mode,override,trajectory):
+        self.layers[override][mode] = trajectory
+        self.views.pop(mode,None)
+        self.stale = True
+
+    def rebase(self,mode,override,time):
+        '''Restarts a layer at time from the mode's resolved value, keeping its later waypoints'''
+        trajectory = self.layers[override][mode]
+        later = trajectory.times > time
+        times = np.concatenate([[time],trajectory.times[later]])
+        values = np.concatenate([[self[mode][time]],trajectory.values[later]])
+        self.set_layer(mode,override,ModeTrajectory.from_arrays(times,values,kind=trajectory.kind))
+
+    def set_override(self,time,mode,override,fade=None):
+        '''
+        Makes the override (or deferred) layer drive mode from time on, fading
+        over `fade` seconds (default: the mode's fade time). Returns whether
+        anything changed.
+        '''
+        if self.overrides[mode] == override:
+            return False
+        # The layer taking over may have been fitted long ago, so it picks up where the mode is now
+        self.rebase(mode,override,time)
+        fade = self.fade_times[mode] if fade is None else fade
+        self.overrides[mode] = override
+        self.active[self.index[mode]] = override
+        if fade > 0:
+            self.fades[mode] = (time,fade)
+        else:
+            self.fades.pop(mode,None)
+        self.views.pop(mode,None)
+        return True
+
+    def evaluate(self,mode,time):
+        return self[mode][time]
+
+    def evaluate_all(self,time):
+        '''{mode: value} at time, with every stackable mode in one pass'''
+        count = len(self.modes)
+        if self.stale:
+            self.stack.refresh([self.layers[False][mode] for mode in self.modes] + [self.layers[True][mode] for mode in self.modes])
+            self.stale = False
+        sampled = self.stack.sample(time)
+        active = self.active
+        current = np.where(active,sampled[count:],sampled[:count])
+        if self.fades:
+            previous = np.where(active,sampled[:count],sampled[count:])
+            weights = np.ones(count)
+            for index,mode in enumerate(self.modes):
+                if mode in self.fades:
+                    start,duration = self.fades[mode]
+                    weights[index] = min(max((time - start) / duration,0.0),1.0)
+                    if time >= start + duration:
+                        # Finished fades are dropped so views go back to a plain lookup
+                        del self.fades[mode]
+                        self.views.pop(mode,None)
+            current = previous + weights * (current - previous)
+        values = dict(zip(self.modes,current.tolist()))
+        for mode in self.modes:
+            if self.kinds[mode] not in STACKABLE:
+                values[mode] = self[mode][time]
+        return values
+
+    def checkpoint(self):
+        # Trajectories are replaced rather than modified, so shallow copies suffice
+        return ({False:dict(self.layers[False]),True:dict(self.layers[True])},dict(self.overrides),dict(self.fades))
+
+    def restore(self,checkpoint):
+        layers,overrides,fades = checkpoint
+        self.layers = {False:dict(layers[False]),True:dict(layers[True])}
+        self.overrides = dict(overrides)
+        self.fades = dict(fades)
+        self.views = {}
+        self.active = np.array([self.overrides[mode] for mode in self.modes],dtype=bool)
+        self.stale = True
@@ -1,4 +1,11 @@
 from wisc_tools.structures import Mode, Position, Quaternion, Pose, ModeTrajectory, PoseTrajectory, AnnotationTrajectory
+from wisc_tools.convenience.instrumentation import metrics
+from wisc_tools.control.modes import ModeEngine
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right, insort
+import logging
+
+logger = logging.getLogger(__name__)
 # from collections.abc import Sequence
 
 class Event(object):
@@ -74,12 +81,35 @@ class Event(object):
     def get_annotation(self,annotation):
         annotation = self.annotations.get(annotation,None)
         if annotation:
-            return annotation['value']
+            return annotation['values'][-1]
         else:
             return None
 
+    def get_annotations(self,annotation):
+        annotation = self.annotations.get(annotation,None)
+        if annotation:
+            return list(annotation['values'])
+        else:
+            return []
+
+    def get_undelivered_annotations(self,annotation):
+        annotation = self.annotations.get(annotation,None)
+        if annotation:
+            return annotation['values'][annotation['delivered']:]
+        else:
+            return []
+
     def add_annotation(self,annotation,value,group_id):
-        self.annotations[annotation] = {'value':value, 'group_id':group_id}
+        # Annotations are discrete, so several values at one time all fire
+        if annotation in self.annotations:
+            self.annotations[annotation]['values'].append(value)
+        else:
+            self.annotations[annotation] = {'values':[value], 'group_id':group_id, 'delivered':0}
+
+    def deliver_annotations(self):
+        # Values added to this event afterwards are still delivered on a later tick
+        for info in self.annotations.values():
+            info['delivered'] = len(info['values'])
 
     def delete_annotation(self,annotation):
         del self.annotations[annotation]
@@ -112,6 +142,14 @@ class Event(object):
     def delete_mode(self,mode):
         del self.modes[mode]
 
+    def copy(self):
+        # Pose values are never mutated in place, but Mode objects are
+        event = Event(self.time)
+        event.poses = {key:dict(info) for key,info in self.poses.items()}
+        event.annotations = {key:{'values':list(info['values']),'group_id':info['group_id'],'delivered':info['delivered']} for key,info in self.annotations.items()}
+        event.modes = {key:{'value':Mode(info['value'].override_value,info['value'].deferred_value),'group_id':info['group_id']} for key,info in self.modes.items()}
+        return event
+
 class EventController(object):
     '''
     EventController Class.
@@ -119,12 +157,21 @@ class EventController(object):
     '''
     def __init__(self,arm_info={},annotation_info={},mode_info={}):
         self.events = []
-        self.arm_trajectories = {arm:PoseTrajectory([{'time':0,'pose':pose}]) for arm,pose in arm_info.iteritems()}
-        self.annotation_trajectories = {annotation:AnnotationTrajectory([{'time':0,'annotation':annotation}]) for annotation in annotation_info.keys()}
-        self.mode_trajectories = {mode:ModeTrajectory([{'time':0,'mode':info['values'][info['value']]}]) for mode,info in mode_info.iteritems()}
-        self.mode_overrides = {mode:info['override'] for mode,info in mode_info.iteritems()}
-        self.mode_thresholds = {mode:(min([value for key,value in info['values'].iteritems()]),
-                                      max([value for key,value in info['values'].iteritems()])) for mode,info in mode_info.iteritems()}
+        self.arm_trajectories = {arm:PoseTrajectory([{'time':0,'pose':pose}]) for arm,pose in arm_info.items()}
+        self.annotation_trajectories = {annotation:AnnotationTrajectory([]) for annotation in annotation_info.keys()}
+        self.mode_engine = ModeEngine(mode_info)
+        self.mode_thresholds = {mode:(min([value for key,value in info['values'].items()]),
+                                      max([value for key,value in info['values'].items()])) for mode,info in mode_info.items()}
+        self.pending_refreshes = None
+
+    @property
+    def mode_trajectories(self):
+        # {mode: ModeView}, resolving each mode's override and deferred layers
+        return self.mode_engine
+
+    @property
+    def mode_overrides(self):
+        return self.mode_engine.overrides
 
     def __len__(self):
         t = self.times
@@ -143,33 +190,96 @@ class EventController(object):
         return [event.time for event in self.events]
 
     def get_event_at_time(self,time):
-        return next((e for e in self.events if e.time == time), None)
+        # Events are kept sorted by time
+        index = bisect_left(self.events,time)
+        if index < len(self.events) and self.events[index].time == time:
+            return self.events[index]
+        return None
+
+    def next_event_time(self,time):
+        return next((e.time for e in self.events if e.time > time), None)
+
+    @contextmanager
+    def batch(self,current_time):
+        '''
+        Defers trajectory refreshes until the block exits, then refits each
+        affected channel once at current_time. Events, trajectories and
+        overrides are restored if the block raises.
+        '''
+        if self.pending_refreshes is not None:
+            # Nested batches fold into the outermost one
+            yield self
+            return
+        events = [event.copy() for event in self.events]
+        arm_trajectories = dict(self.arm_trajectories)
+        annotation_trajectories = dict(self.annotation_trajectories)
+        modes = self.mode_engine.checkpoint()
+        self.pending_refreshes = []
+        try:
+            yield self
+        except:
+            self.events = events
+            self.arm_trajectories = arm_trajectories
+            self.annotation_trajectories = annotation_trajectories
+            self.mode_engine.restore(modes)
+            self.pending_refreshes = None
+            raise
+        pending = self.pending_refreshes
+        self.pending_refreshes = None
+        for entry in pending:
+            entry[0](current_time,*entry[1:])
+
+    def defer_refresh(self,refresh,channel,*args):
+        if self.pending_refreshes is None:
+            return False
+        if (refresh,channel) + args not in self.pending_refreshes:
+            self.pending_refreshes.append((refresh,channel) + args)
+        else:
+            # refresh_arm_trajectory -> arm/<channel>, matching the rebuild timers
+            metrics.count('coalesced_refreshes',channel=refresh.__name__.split('_')[1]+'/'+channel)
+        return True
 
     def refresh_arm_trajectory(self,current_time,arm):
-        current = [{'time':current_time,'pose':self.arm_trajectories[arm][current_time]}]
-        future = [{'time':event.time,'pose':event.get_pose(arm)} for event in self.events if event.has_pose(arm) and event.time > current_time]
-        self.arm_trajectories[arm] = PoseTrajectory(current+future)
+        if self.defer_refresh(self.refresh_arm_trajectory,arm):
+            return
+        with metrics.timer('trajectory_rebuild','arm/'+arm):
+            current = [{'time':current_time,'pose':self.arm_trajectories[arm][current_time]}]
+            future = [{'time':event.time,'pose':event.get_pose(arm)} for event in self.events if event.has_pose(arm) and event.time > current_time]
+            self.arm_trajectories[arm] = PoseTrajectory(current+future)
 
     def refresh_annotation_trajectory(self,current_time,annotation):
-        current = [{'time':current_time,'annotation':self.annotation_trajectories[annotation][current_time]}]
-        future = [{'time':event.time,'annotation':event.get_annotation(annotation)} for event in self.events if event.has_annotation(annotation) and event.time > current_time]
-        self.annotation_trajectories[annotation] = AnnotationTrajectory(current+future)
-
-    def refresh_mode_trajectory(self,current_time,mode):
-        current = [{'time':current_time,'mode':self.mode_trajectories[mode][current_time]}]
-        if self.mode_overrides[mode]:
-            future = [{'time':event.time,'mode':event.get_mode(mode).override_value} for event in self.events if event.has_mode(mode,True) and event.time > current_time]
-        else:
-            future = [{'time':event.time,'mode':event.get_mode(mode).deferred_value} for event in self.events if event.has_mode(mode,False) and event.time > current_time]
-        self.mode_trajectories[mode] = ModeTrajectory(current+future)
+        if self.defer_refresh(self.refresh_annotation_trajectory,annotation):
+            return
+        with metrics.timer('trajectory_rebuild','annotation/'+annotation):
+            # Unlike poses and modes, annotations are discrete: keep every one not yet delivered,
+            # including any that came due since the last tick or was added at its time
+            pending = [{'time':event.time,'annotation':value} for event in self.events if event.has_annotation(annotation) for value in event.get_undelivered_annotations(annotation)]
+            self.annotation_trajectories[annotation] = AnnotationTrajectory(pending)
+
+    def refresh_mode_trajectory(self,current_time,mode,override=None):
+        '''
+        Refits the override layer (override=True), the deferred layer
+        (override=False) or both (None) of mode from the stored events
+        '''
+        if self.defer_refresh(self.refresh_mode_trajectory,mode,override):
+            return
+        with metrics.timer('trajectory_rebuild','mode/'+mode):
+            # A refit layer restarts from the resolved value, so it picks up where the mode is now
+            current = [{'time':current_time,'mode':self.mode_engine[mode][current_time]}]
+            kind = self.mode_engine.kinds[mode]
+            layers = [True,False] if override is None else [override]
+            for layer in layers:
+                events = [event for event in self.events if event.has_mode(mode,layer) and event.time > current_time]
+                if layer:
+                    values = [{'time':event.time,'mode':event.get_mode(mode).override_value} for event in events]
+                else:
+                    values = [{'time':event.time,'mode':event.get_mode(mode).deferred_value} for event in events]
+                self.mode_engine.set_layer(mode,layer,ModeTrajectory(current+values,kind=kind))
 
-    def set_mode_override(self,current_time,mode,value):
-        if self.mode_overrides[mode] != value:
-            print('Changing override for {0} to {1}'.format(mode,value))
-            self.mode_overrides[mode] = value
-            if value:
-                self.delete_all_override_modes_after(current_time,mode)
-            self.refresh_mode_trajectory(current_time,mode)
+    def set_mode_override(self,current_time,mode,value,fade=None):
+        # Both layers are already fitted, so this only rebases the new layer and switches (or cross-fades) to it
+        if self.mode_engine.set_override(current_time,mode,value,fade):
+            logger.info('Changing override for %s to %s',mode,value,extra={'mode':mode,'override':value})
 
     def delete_all_poses_after(self,time,arm):
         [event.delete_pose(arm) for event in self.events if event >= time and event.has_pose(arm)]
@@ -194,7 +304,7 @@ class EventController(object):
 
     def delete_all_poses_with_group_id(self,group_id,current_time):
         # self.events = [event for event in self.events if not event.group_id == group_id]
-        print('deleting all poses with group_id: {}'.format(group_id))
+        logger.debug('Deleting all poses with group_id %s',group_id,extra={'group_id':group_id})
         updated_arms = []
         new_events = []
         for event in self.events:
@@ -236,33 +346,88 @@ class EventController(object):
         self.refresh_arm_trajectory(current_time,arm)
 
     def add_annotation_at_time(self,current_time,time,annotation,value,group_id):
-        if time in self.times:
-            event = self.get_event_at_time(time)
+        event = self.get_event_at_time(time)
+        if event is not None:
             event.add_annotation(annotation,value,group_id)
         else:
             event = Event(time)
             event.add_annotation(annotation,value,group_id)
-            self.events.append(event)
-            self.events.sort()
-        self.refresh_annotation_trajectory(current_time,annotation)
+            insort(self.events,event)
+        if self.pending_refreshes is None:
+            # One annotation goes straight into the sorted index instead of a rescan of every event
+            self.annotation_trajectories[annotation].insert(time,value)
+        else:
+            self.refresh_annotation_trajectory(current_time,annotation)
 
     def add_mode_at_time(self,current_time,time,mode,value,override,group_id):
         if time in self.times:
-            print('Time exists, adding to event')
+            logger.debug('Adding mode to existing event',extra={'mode':mode,'time':time})
             event = self.get_event_at_time(time)
             event.add_mode(mode,value,override,group_id)
         else:
-            print('Creating new event')
+            logger.debug('Creating new event for mode',extra={'mode':mode,'time':time})
             event = Event(time)
             event.add_mode(mode,value,override,group_id)
             self.events.append(event)
             self.events.sort()
-        self.refresh_mode_trajectory(current_time,mode)
+        self.refresh_mode_trajectory(current_time,mode,override)
+
+    def add_events(self,current_time,events):
+        '''
+        Merges many Events into the store with one sort, then refits each
+        affected channel once rather than once per add_*_at_time call. Events
+        at new times are stored as copies, so the caller's Events stay theirs
+        to reuse or change. A pose or mode landing on a
+        time that already holds one for the same channel replaces it;
+        annotations accumulate
+        '''
+        by_time = {event.time:event for event in self.events}
+        arms = []
+        annotations = []
+        # (mode, override) pairs, so only the layers that gained values are refit
+        modes = []
+        for event in events:
+            arms += [arm for arm in event.poses.keys() if arm not in arms]
+            annotations += [annotation for annotation in event.annotations.keys() if annotation not in annotations]
+            for mode,info in event.modes.items():
+                if info['value'].has_override and (mode,True) not in modes:
+                    modes.append((mode,True))
+                if info['value'].has_deferred and (mode,False) not in modes:
+                    modes.append((mode,False))
+            target = by_time.get(event.time)
+            if target is None:
+                by_time[event.time] = event.copy()
+                continue
+            for arm,info in event.poses.items():
+                target.add_pose(arm,info['value'],info['group_id'])
+            for annotation,info in event.annotations.items():
+                for value in info['values']:
+                    target.add_annotation(annotation,value,info['group_id'])
+            for mode,info in event.modes.items():
+                if info['value'].has_override:
+                    target.add_mode(mode,info['value'].override_value,True,info['group_id'])
+                if info['value'].has_deferred:
+                    target.add_mode(mode,info['value'].deferred_value,False,info['group_id'])
+        self.events = sorted(by_time.values())
+        for arm in arms:
+            self.refresh_arm_trajectory(current_time,arm)
+        for annotation in annotations:
+            self.refresh_annotation_trajectory(current_time,annotation)
+        for mode,override in modes:
+            self.refresh_mode_trajectory(current_time,mode,override)
 
     def timestep_to(self,time):
-        # TODO: Capture any annotations that are queued
-        annotations = {annotation:[event.get_annotation(annotation) for event in self.events if event <= time and event.has_annotation(annotation)] for annotation in self.annotation_trajectories.keys()}
-        self.events = [event for event in self.events if event >= time]
+        '''
+        Returns the undelivered annotations due by time and drops events
+        before time. Each annotation is delivered exactly once, even when it
+        is added to an event at a time that has already been ticked.
+        '''
+        annotations = {annotation:trajectory.deliver(time) for annotation,trajectory in self.annotation_trajectories.items()}
+        # Events are kept sorted, so everything up to time is a prefix
+        due = bisect_right(self.events,time)
+        for event in self.events[:due]:
+            event.deliver_annotations()
+        del self.events[:bisect_left(self.events,time)]
         return annotations
 
 
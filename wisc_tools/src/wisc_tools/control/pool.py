@@ -0,0 +1,64 @@
+from __future__ import print_function
+from contextlib import contextmanager
+from wisc_tools.structures import Position, Quaternion, Pose, PoseTrajectoryStack
+from wisc_tools.control.state_controller import StateController
+from wisc_tools.control.clock import RosClock
+
+class StateControllerPool(object):
+    '''
+    StateControllerPool Class.
+    Runs many StateControllers off one shared Catalog and Clock, sampling every
+    arm trajectory of every controller together in one vectorized tick
+    '''
+
+    def __init__(self, catalog, clock=None):
+        self.catalog = catalog
+        self.clock = clock if clock is not None else RosClock()
+        self.controllers = []
+        self.stack = PoseTrajectoryStack()
+
+    def __len__(self):
+        return len(self.controllers)
+
+    def __iter__(self):
+        return self.controllers.__iter__()
+
+    def __getitem__(self, index):
+        return self.controllers[index]
+
+    def spawn(self, arms, joints=[], rosnode=None):
+        controller = StateController(rosnode, arms, joints, clock=self.clock, catalog=self.catalog)
+        self.controllers.append(controller)
+        return controller
+
+    def remove(self, controller):
+        self.controllers.remove(controller)
+
+    @contextmanager
+    def locked(self):
+        # Always acquired in pool order, so two pool ticks cannot deadlock
+        acquired = []
+        try:
+            for controller in self.controllers:
+                controller.lock.acquire()
+                acquired.append(controller)
+            yield
+        finally:
+            for controller in reversed(acquired):
+                controller.lock.release()
+
+    def timestep(self):
+        time = self.clock.now()
+        with self.locked():
+            channels = [(controller,arm) for controller in self.controllers for arm in controller.arms]
+            self.stack.refresh([controller.event_controller.arm_trajectories[arm] for controller,arm in channels])
+            positions, quaternions = self.stack.sample(time)
+            results = []
+            row = 0
+            for controller in self.controllers:
+                arm_poses = {}
+                for arm in controller.arms:
+                    arm_poses[arm] = Pose(Position(*positions[row]),Quaternion.from_vector_quaternion(quaternions[row]))
+                    row += 1
+                results.append(controller.timestep(time,arm_poses))
+            return results
@@ -0,0 +1,231 @@
+'''
+Recording layout: a file header (magic 'WREC', version, length of a JSON list of
+column names) followed by chunks. Each chunk is a header (rows, columns, column
+payload length, annotation payload length), the zlib-compressed float64 columns
+stored column by column, and zlib-compressed JSON annotations as [row, {name: values}]
+'''
+
+import json
+import logging
+import struct
+import threading
+import zlib
+from collections import deque
+import numpy as np
+from wisc_tools.structures import Position, Quaternion, Pose
+from wisc_tools.control.planning import Event
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WREC'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sII')
+CHUNK_HEADER = struct.Struct('<IIII')
+POSE_FIELDS = ['x','y','z','qw','qx','qy','qz']
+
+def encode_chunk(columns,annotations,level):
+    payload = zlib.compress(np.ascontiguousarray(columns.T,dtype='<f8').tobytes(),level)
+    notes = zlib.compress(json.dumps(annotations).encode('utf-8'),level)
+    return CHUNK_HEADER.pack(columns.shape[0],columns.shape[1],len(payload),len(notes)) + payload + notes
+
+def decode_chunk(header,payload,notes):
+    (rows,width,payload_length,notes_length) = header
+    columns = np.frombuffer(zlib.decompress(payload),dtype='<f8').reshape(width,rows).T
+    annotations = json.loads(zlib.decompress(notes).decode('utf-8'))
+    return columns,annotations
+
+class TrajectoryRecorder(object):
+    '''
+    TrajectoryRecorder Class.
+    Appends the arm poses, mode values and annotations of each tick into a
+    fixed-size column chunk. Full chunks are compressed and written by a
+    background thread, so recording never blocks the control loop on I/O.
+    Without a sink, the newest max_chunks compressed chunks are kept in memory
+    '''
+
+    def __init__(self, arms, modes, sink=None, chunk_size=1024, max_chunks=64, level=1):
+        self.arms = list(arms)
+        self.modes = list(modes)
+        self.columns = ['time'] + ['{0}.{1}'.format(arm,field) for arm in self.arms for field in POSE_FIELDS] + self.modes
+        self.chunk_size = chunk_size
+        self.level = level
+        self.buffer = np.full((chunk_size,len(self.columns)),np.nan)
+        self.annotations = []
+        self.rows = 0
+        self.dropped = 0
+        self.failed = 0
+        self.stopping = False
+        self.chunks = deque(maxlen=max_chunks)
+        self.pending = queue.Queue(maxsize=max_chunks)
+        if isinstance(sink,str):
+            sink = open(sink,'wb')
+            self.owns_sink = True
+        else:
+            self.owns_sink = False
+        self.sink = sink
+        if self.sink is not None:
+            names = json.dumps(self.columns).encode('utf-8')
+            self.sink.write(FILE_HEADER.pack(MAGIC,VERSION,len(names)) + names)
+        self.writer = threading.Thread(target=self.__write__)
+        self.writer.daemon = True
+        self.writer.start()
+
+    @classmethod
+    def for_controller(cls, controller, sink=None, **kwargs):
+        # Attaches to the controller so every timestep is recorded
+        recorder = cls(controller.arms, controller.modes.keys(), sink, **kwargs)
+        controller.recorder = recorder
+        return recorder
+
+    def record(self, time, current):
+        row = self.buffer[self.rows]
+        row[0] = time
+        column = 1
+        for arm in self.arms:
+            pose = current['arms'].get(arm)
+            if isinstance(pose,Pose):
+                row[column:column+7] = (pose.position.x,pose.position.y,pose.position.z,
+                                        pose.quaternion.w,pose.quaternion.x,pose.quaternion.y,pose.quaternion.z)
+            column += 7
+        for mode in self.modes:
+            info = current['modes'].get(mode)
+            if info is not None:
+                row[column] = info['value']
+            column += 1
+        annotations = {name:values for name,values in current['annotations'].items() if len(values) > 0}
+        if len(annotations) > 0:
+            self.annotations.append([self.rows,annotations])
+        self.rows += 1
+        if self.rows == self.chunk_size:
+            self.seal()
+
+    def seal(self):
+        if self.rows == 0:
+            return
+        chunk = (self.buffer[:self.rows],self.annotations)
+        try:
+            self.pending.put_nowait(chunk)
+        except queue.Full:
+            # The writer has fallen behind; keep the loop running and lose this chunk
+            self.dropped += 1
+        self.buffer = np.full((self.chunk_size,len(self.columns)),np.nan)
+        self.annotations = []
+        self.rows = 0
+
+    def __write__(self):
+        # Once stopping is set the queue is drained and the writer exits, sentinel or not
+        while not (self.stopping and self.pending.empty()):
+            chunk = self.pending.get()
+            if chunk is None:
+                break
+            try:
+                encoded = encode_chunk(chunk[0],chunk[1],self.level)
+                if self.sink is not None:
+                    self.sink.write(encoded)
+                else:
+                    self.chunks.append(encoded)
+            except Exception as e:
+                # One bad chunk (say, an annotation JSON cannot encode) must not end the recording
+                self.failed += 1
+                logger.warning('Could not write recording chunk: %s',e,extra={'rows':len(chunk[0])})
+
+    def close(self, timeout=10.0):
+        '''
+        Seals the last chunk and stops the writer. Never blocks on a full
+        queue, and waits at most timeout seconds for queued chunks to be written
+        '''
+        self.seal()
+        self.stopping = True
+        try:
+            # Only wakes a writer idling on an empty queue; a full queue is drained anyway
+            self.pending.put_nowait(None)
+        except queue.Full:
+            pass
+        self.writer.join(timeout)
+        if self.writer.is_alive():
+            logger.warning('Recording writer still busy after %.1fs, leaving the sink open',timeout,extra={'queued':self.pending.qsize()})
+            return
+        if self.sink is not None:
+            self.sink.flush()
+            if self.owns_sink:
+                self.sink.close()
+
+class TrajectoryReplayer(object):
+    '''
+    TrajectoryReplayer Class.
+    Streams a recording back one chunk at a time, either as per-tick states or
+    by re-adding them as events to an EventController
+    '''
+
+    def __init__(self, source):
+        self.source = source
+
+    def __chunks__(self):
+        if isinstance(self.source,TrajectoryRecorder):
+            columns = self.source.columns
+            for encoded in list(self.source.chunks):
+                header = CHUNK_HEADER.unpack(encoded[:CHUNK_HEADER.size])
+                start = CHUNK_HEADER.size
+                yield columns,decode_chunk(header,encoded[start:start+header[2]],encoded[start+header[2]:start+header[2]+header[3]])
+            return
+        with open(self.source,'rb') as f:
+            (magic,version,length) = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError('{0} is not a recording'.format(self.source))
+            if version != VERSION:
+                raise ValueError('{0} uses recording version {1}, expected {2}'.format(self.source,version,VERSION))
+            columns = json.loads(f.read(length).decode('utf-8'))
+            while True:
+                raw = f.read(CHUNK_HEADER.size)
+                if len(raw) < CHUNK_HEADER.size:
+                    return
+                header = CHUNK_HEADER.unpack(raw)
+                yield columns,decode_chunk(header,f.read(header[2]),f.read(header[3]))
+
+    def __iter__(self):
+        for names,(columns,annotations) in self.__chunks__():
+            arms = [name[:-2] for name in names if name.endswith('.x')]
+            modes = names[1+7*len(arms):]
+            notes = {row:values for row,values in annotations}
+            for row,values in enumerate(columns):
+                state = {'time':float(values[0]),'arms':{},'modes':{},'annotations':notes.get(row,{})}
+                for index,arm in enumerate(arms):
+                    pose = values[1+7*index:8+7*index]
+                    if not np.isnan(pose[0]):
+                        state['arms'][arm] = Pose(Position(*pose[0:3].tolist()),Quaternion.from_vector_quaternion(pose[3:7].tolist()))
+                for index,mode in enumerate(modes):
+                    value = values[1+7*len(arms)+index]
+                    if not np.isnan(value):
+                        state['modes'][mode] = float(value)
+                yield state
+
+    def feed(self, event_controller, current_time, offset=0.0, group_id=0):
+        '''
+        Schedules every recorded tick as events, shifted by offset seconds.
+        All events share group_id, so the replay can be cancelled as one group.
+        The events are built in one pass and each trajectory is refit once
+        '''
+        events = []
+        for state in self:
+            time = state['time'] + offset
+            if len(events) == 0 or events[-1].time != time:
+                events.append(Event(time))
+            # Repeated tick times collapse into one event: the latest pose and mode win,
+            # and annotations accumulate
+            event = events[-1]
+            for arm,pose in state['arms'].items():
+                if arm in event_controller.arm_trajectories:
+                    event.add_pose(arm,pose,group_id)
+            for mode,value in state['modes'].items():
+                if mode in event_controller.mode_trajectories:
+                    event.add_mode(mode,value,event_controller.mode_overrides[mode],group_id)
+            for annotation,values in state['annotations'].items():
+                for value in values:
+                    event.add_annotation(annotation,value,group_id)
+        event_controller.add_events(current_time,events)
+        return len(events)
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class StateControllerRunner(object):
+    '''
+    StateControllerRunner Class.
+    Drives a StateController from an asyncio loop at a fixed rate, waking early
+    when the next scheduled event is due and coalescing commands between ticks
+    '''
+
+    def __init__(self, controller, rate=30.0, on_tick=None, on_deadline_missed=None):
+        self.controller = controller
+        self.period = 1.0 / rate
+        self.on_tick = on_tick
+        self.on_deadline_missed = on_deadline_missed
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.running = False
+        self.pending = OrderedDict()
+        self.pending_lock = threading.Lock()
+        self.sequence = itertools.count()
+        self.task = None
+
+    def queue(self, key, command, *args, **kwargs):
+        # Later commands for the same target replace earlier ones, but keep arrival order
+        with self.pending_lock:
+            self.pending.pop(key, None)
+            self.pending[key] = (command, args, kwargs)
+
+    def append(self, key, command, *args, **kwargs):
+        # For discrete commands, such as annotations, where every one queued must be applied
+        with self.pending_lock:
+            self.pending[key + (next(self.sequence),)] = (command, args, kwargs)
+
+    def set_pose(self, arm, pose, offset=None):
+        self.queue(('pose',arm), self.controller.set_pose, arm, pose, offset=offset, update=False)
+
+    def set_mode(self, mode, value, offset=None, override=True):
+        self.queue(('mode',mode), self.controller.set_mode, mode, value, offset=offset, override=override, update=False)
+
+    def set_action(self, action):
+        self.queue(('action',), self.controller.set_action, action, update=False)
+
+    def set_annotation(self, annotation, data):
+        self.append(('annotation',annotation), self.controller.set_annotation, annotation, data)
+
+    def next_event_delay(self):
+        now = self.controller.now
+        with self.controller.lock:
+            time = self.controller.event_controller.next_event_time(now)
+        if time is None:
+            return None
+        return time - now
+
+    def tick(self):
+        with self.pending_lock:
+            pending, self.pending = self.pending, OrderedDict()
+        for key, (command, args, kwargs) in pending.items():
+            try:
+                command(*args, **kwargs)
+            except Exception as e:
+                logger.warning('Could not apply %s: %s', key, e, extra={'command':key})
+        current = self.controller.timestep()
+        self.ticks += 1
+        if self.on_tick is not None:
+            self.on_tick(current)
+        return current
+
+    async def run(self):
+        # Simulated clocks are advanced instead of slept on, so runs go as fast as ticks allow
+        clock = self.controller.clock
+        time = clock.now if clock.simulated else asyncio.get_event_loop().time
+        self.running = True
+        deadline = time()
+        while self.running:
+            self.tick()
+            now = time()
+            if now >= deadline:
+                deadline += self.period
+                if now > deadline:
+                    # Skip the ticks we could not make instead of bursting to catch up
+                    missed = int((now - deadline) / self.period) + 1
+                    self.missed_deadlines += missed
+                    if self.on_deadline_missed is not None:
+                        self.on_deadline_missed(missed, now - deadline)
+                    deadline += missed * self.period
+            delay = deadline - now
+            event_delay = self.next_event_delay()
+            if event_delay is not None and event_delay < delay:
+                delay = event_delay
+            if clock.simulated:
+                clock.advance(max(delay, 0))
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(max(delay, 0))
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -1,13 +1,20 @@
 from __future__ import print_function
 from wisc_tools.structures import Mode, Position, Quaternion, Pose, ModeTrajectory, PoseTrajectory, AnnotationTrajectory
 from wisc_tools.control import EventController
-import rospy
+from wisc_tools.control.clock import RosClock
+from wisc_tools.control.catalog import Catalog
+from wisc_tools.convenience.instrumentation import metrics, timed
+from collections import namedtuple
+import logging
+import threading
 import math
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 def serialize(input):
     if isinstance(input, dict):
-        return {key:serialize(value) for key,value in input.iteritems()}
+        return {key:serialize(value) for key,value in input.items()}
     elif isinstance(input, list):
         return [serialize(element) for element in input]
     elif isinstance(input, Pose):
@@ -15,55 +22,62 @@ def serialize(input):
     else:
         return input
 
+# Published once per tick and never mutated afterwards, so readers need no lock
+Snapshot = namedtuple('Snapshot',['time','current','arm_trajectories','mode_trajectories','mode_overrides'])
+
 class StateController(object):
     '''
     Generic StateController Object.
     Handles updates to goals, modes, annotations, and actions
     '''
 
-    next_group_id = 0
-
-    def __init__(self, rosnode, arms=[], joints=[], modes={}, actions={}, poses={}, annotations={}):
+    def __init__(self, rosnode, arms=[], joints=[], modes={}, actions={}, poses={}, annotations={}, clock=None, catalog=None):
         self.rosnode = rosnode
-        self.new(arms, joints, modes, actions, poses, annotations)
+        self.clock = clock if clock is not None else RosClock()
+        self.lock = threading.RLock()
+        self.recorder = None
+        self.new(arms, joints, modes, actions, poses, annotations, catalog)
 
     @property
     def now(self):
-        return rospy.get_time()
+        return self.clock.now()
 
     @property
     def current_serializable(self):
-        return serialize(self.current)
+        return serialize(self.snapshot.current)
 
     @property
     def future(self):
+        snapshot = self.snapshot
         return {
-            'armData':[self.pose_future(arm,trajectory) for (arm, trajectory) in self.event_controller.arm_trajectories.iteritems()],
-            'modeData':[self.mode_future(mode,trajectory) for (mode, trajectory) in self.event_controller.mode_trajectories.iteritems()],
+            'armData':[self.pose_future(arm,trajectory) for (arm, trajectory) in snapshot.arm_trajectories.items()],
+            'modeData':[self.mode_future(mode,trajectory) for (mode, trajectory) in snapshot.mode_trajectories.items()],
         }
 
-    def new(self, arms, joints, modes, actions, poses, annotations):
-
-        self.current = {'actions':[],'modes':{},'arms':{},'annotations':{},'poses':{}}
-        self.arms = arms
-        self.joints = joints
-        self.modes = modes
-        self.actions = actions
-        self.annotations = annotations
-        self.poses = {}
-        for arm, pose in poses.iteritems():
-            self.poses[arm] = {pose_name:{'pose':Pose.from_eulerpose_dict(pose_info),'default':pose_info['default']} for (pose_name,pose_info) in pose.iteritems()}
-        default_poses = []
-        for arm in self.arms:
-            for pose,poseinfo in self.poses[arm].iteritems():
-                if poseinfo['default']:
-                    default_poses.append(poseinfo['pose'].ros_pose)
-        print(default_poses)
-
-        self.event_controller = EventController({arm:[info['pose'] for pose,info in poses.iteritems() if info['default']][0] for arm,poses in self.poses.iteritems()},
-                                                self.annotations,
-                                                self.modes)
-        self.initialize()
+    def new(self, arms, joints, modes, actions, poses, annotations, catalog=None):
+        with self.lock:
+            if catalog is None:
+                catalog = Catalog.from_dicts(poses, modes, actions, annotations)
+            self.current = {'actions':[],'modes':{},'arms':{},'annotations':{},'poses':{}}
+            # Group ids only need to be unique within one controller's event store
+            self.next_group_id = 0
+            self.catalog = catalog
+            self.arms = arms
+            self.joints = joints
+            self.modes = catalog.modes
+            self.actions = catalog.actions
+            self.annotations = catalog.annotations
+            self.poses = catalog.poses
+            if logger.isEnabledFor(logging.DEBUG):
+                for arm in self.arms:
+                    for pose,poseinfo in self.poses[arm].items():
+                        if poseinfo['default']:
+                            logger.debug('Default pose for %s is %s',arm,pose,extra={'arm':arm,'pose':poseinfo['pose'].dict})
+
+            self.event_controller = EventController({arm:catalog.default_pose(arm) for arm in self.poses.keys()},
+                                                    self.annotations,
+                                                    self.modes)
+            self.initialize()
 
     def pose_future(self,arm,trajectory):
         now = self.now
@@ -104,131 +118,187 @@ class StateController(object):
         # }
 
 
-    def set_action(self,action):
-        # Actions piggyback off poses and modes.
-        print('Setting action: {0}'.format(action))
-        # Get the time to do the first action, and then specify the offsets based on that
-        now = self.now
-        times = []
-        for arm in self.actions[action].keys():
-            current_pose = self.event_controller.arm_trajectories[arm][now]
-            goal_pose = self.poses[arm][self.actions[action][arm][0]['pose']]['pose']
-            times.append(self.time_to_pose(current_pose,goal_pose))
-
-        # Offset is the max time estimate across arms
-        ttp = max(times)
-
-        for arm in self.actions[action].keys():
-            current_pose = self.event_controller.arm_trajectories[arm][now]
-            goal_pose = self.poses[arm][self.actions[action][arm][0]['pose']]['pose']
-            last = None
-            for event in self.actions[action][arm]:
-                if last is None:
-                    self.event_controller.add_pose_at_time(self.now, now + ttp, arm, self.poses[arm][event['pose']]['pose'], self.next_group_id)
-                    for e in event['modes']:
-                        self.event_controller.add_mode_at_time(self.now, now + ttp, e, self.modes[e]['values'][event['modes'][e]], False, self.next_group_id)
-                    for e in event['annotations']:
-                        self.event_controller.add_annotation_at_time(self.now, now + ttp, e, event['annotations'][e], self.next_group_id)
-                else:
-                    self.event_controller.add_pose_at_time(self.now, now + ttp + last['time'], arm, self.poses[arm][event['pose']]['pose'], self.next_group_id)
-                    for e in event['modes']:
-                        self.event_controller.add_mode_at_time(self.now, now + ttp + last['time'], e, self.modes[e]['values'][event['modes'][e]], False, self.next_group_id)
-                    for e in event['annotations']:
-                        self.event_controller.add_annotation_at_time(self.now, now + ttp, e, event['annotations'][e], self.next_group_id)
-                last = event
-        self.next_group_id += 1
-        self.timestep()
-        [print({'time': event.time, 'poses': event.poses}) for event in self.event_controller.events]
-
-    def set_pose(self,arm,pose,offset=None):
-        # Estimate the amount of time needed to get to that pose
-        print('Setting pose for {0} to {1}'.format(arm, pose))
-        # If offset is none, calculate the time to do the event
-        goal_pose = self.poses[arm][pose]['pose']
-        current_time = self.now
-        current_pose =  self.event_controller.arm_trajectories[arm][current_time]
-        if offset == None:
-            offset = self.time_to_pose(current_pose,goal_pose)
-
-        # spatial_dist,rotation_dist = self.current['arms'][arm].distance_to(self.poses[arm][pose]['pose'])
-        # print('Estimated distance {0}:{1}'.format(spatial_dist,rotation_dist))
-        self.event_controller.add_pose_at_time(self.now, self.now+offset, arm, goal_pose, self.next_group_id)
-        self.next_group_id += 1
-        # [print({'time': event.time, 'poses': event.poses}) for event in self.event_controller.events]
-        self.timestep()
-        # self.event_controller.add_pose_at_time()
-
-    def set_mode(self,mode,value,offset=None,override=True):
-        # Estimate time needed to smoothly apply that mode
-        print('Mode',mode)
-        print('Value',value)
-        print('Override',override)
-        current_time = self.now
-        current_value =  self.event_controller.mode_trajectories[mode][current_time]
-        if value != None:
-            goal_value = self.modes[mode]['values'][value]
-        else:
-            goal_value = current_value
-
-        time_to_mode = self.time_to_mode(current_value,goal_value)
-        mode_time = current_time + time_to_mode
-        print('Setting mode for {0} to {1} in {2}s'.format(mode, value, time_to_mode))
-        if override:
-            self.event_controller.add_mode_at_time(current_time,mode_time,mode,goal_value,True, self.next_group_id)
-            self.event_controller.set_mode_override(current_time,mode,True)
-            #print(self.event_controller.events)
-        else:
-            self.event_controller.set_mode_override(current_time,mode,False)
-        self.timestep()
+    def future_markers(self,markers,stamp=None):
+        '''
+        Refills a visualization.TrajectoryMarkers from every arm's previewed
+        trajectory; returns only the markers that changed since the last call
+        '''
+        snapshot = self.snapshot
+        return markers.update_all(snapshot.arm_trajectories,snapshot.time,stamp)
+
+    def nearest_poses(self,arm,pose=None,k=1):
+        '''Names of the k catalog poses for arm closest to pose (default: where the arm is now)'''
+        if pose is None:
+            # Read from the published snapshot, since this runs without the lock
+            pose = self.snapshot.arm_trajectories[arm][self.now]
+        return [match.key for match in self.catalog.pose_index(arm).nearest(pose,k)]
+
+    @timed('set_action')
+    def set_action(self,action,update=True):
+        with self.lock:
+            # Actions piggyback off poses and modes.
+            logger.info('Setting action %s',action,extra={'action':action})
+            # Get the time to do the first action, and then specify the offsets based on that
+            now = self.now
+            times = []
+            for arm in self.actions[action].keys():
+                current_pose = self.event_controller.arm_trajectories[arm][now]
+                goal_pose = self.poses[arm][self.actions[action][arm][0]['pose']]['pose']
+                times.append(self.time_to_pose(current_pose,goal_pose))
+
+            # Offset is the max time estimate across arms
+            ttp = max(times)
+
+            with self.event_controller.batch(now):
+                for arm in self.actions[action].keys():
+                    last = None
+                    for event in self.actions[action][arm]:
+                        if last is None:
+                            self.event_controller.add_pose_at_time(now, now + ttp, arm, self.poses[arm][event['pose']]['pose'], self.next_group_id)
+                            for e in event['modes']:
+                                self.event_controller.add_mode_at_time(now, now + ttp, e, self.modes[e]['values'][event['modes'][e]], False, self.next_group_id)
+                            for e in event['annotations']:
+                                self.event_controller.add_annotation_at_time(now, now + ttp, e, event['annotations'][e], self.next_group_id)
+                        else:
+                            self.event_controller.add_pose_at_time(now, now + ttp + last['time'], arm, self.poses[arm][event['pose']]['pose'], self.next_group_id)
+                            for e in event['modes']:
+                                self.event_controller.add_mode_at_time(now, now + ttp + last['time'], e, self.modes[e]['values'][event['modes'][e]], False, self.next_group_id)
+                            for e in event['annotations']:
+                                self.event_controller.add_annotation_at_time(now, now + ttp, e, event['annotations'][e], self.next_group_id)
+                        last = event
+            self.next_group_id += 1
+            if update:
+                self.timestep()
+            if logger.isEnabledFor(logging.DEBUG):
+                for event in self.event_controller.events:
+                    logger.debug('Queued event',extra={'time':event.time,'poses':event.poses})
+
+    @timed('set_pose')
+    def set_pose(self,arm,pose,offset=None,update=True):
+        with self.lock:
+            # Estimate the amount of time needed to get to that pose
+            logger.info('Setting pose for %s to %s',arm,pose,extra={'arm':arm,'pose':pose})
+            # If offset is none, calculate the time to do the event
+            goal_pose = self.poses[arm][pose]['pose']
+            current_time = self.now
+            current_pose =  self.event_controller.arm_trajectories[arm][current_time]
+            if offset == None:
+                offset = self.time_to_pose(current_pose,goal_pose)
+
+            # spatial_dist,rotation_dist = self.current['arms'][arm].distance_to(self.poses[arm][pose]['pose'])
+            # print('Estimated distance {0}:{1}'.format(spatial_dist,rotation_dist))
+            self.event_controller.add_pose_at_time(current_time, current_time+offset, arm, goal_pose, self.next_group_id)
+            self.next_group_id += 1
+            # [print({'time': event.time, 'poses': event.poses}) for event in self.event_controller.events]
+            if update:
+                self.timestep()
+            # self.event_controller.add_pose_at_time()
+
+    @timed('set_mode')
+    def set_mode(self,mode,value,offset=None,override=True,update=True):
+        with self.lock:
+            # Estimate time needed to smoothly apply that mode
+            current_time = self.now
+            current_value =  self.event_controller.mode_trajectories[mode][current_time]
+            if value != None:
+                goal_value = self.modes[mode]['values'][value]
+            else:
+                goal_value = current_value
+
+            time_to_mode = self.time_to_mode(current_value,goal_value)
+            mode_time = current_time + time_to_mode
+            logger.info('Setting mode for %s to %s in %.3fs',mode,value,time_to_mode,extra={'mode':mode,'value':value,'override':override})
+            if override:
+                self.event_controller.add_mode_at_time(current_time,mode_time,mode,goal_value,True, self.next_group_id)
+                self.event_controller.set_mode_override(current_time,mode,True)
+                #print(self.event_controller.events)
+            else:
+                self.event_controller.set_mode_override(current_time,mode,False)
+            if update:
+                self.timestep()
 
     def set_annotation(self,annotation,data):
-        print('setting annotation {} with {}'.format(annotation, data))
-        self.event_controller.add_annotation_at_time(self.now, self.now, annotation, data, self.next_group_id)
-        self.next_group_id += 1
+        with self.lock:
+            logger.info('Setting annotation %s',annotation,extra={'annotation':annotation,'data':data})
+            now = self.now
+            self.event_controller.add_annotation_at_time(now, now, annotation, data, self.next_group_id)
+            self.next_group_id += 1
 
     def initialize(self):
-        initial = {'actions':[],'modes':{},'arms':{},'annotations':{},'poses':{}}
-        for arm in self.arms:
+        with self.lock:
+            initial = {'actions':[],'modes':{},'arms':{},'annotations':{},'poses':{}}
             now = self.now
-            defaults = [pose for pose in self.poses[arm].keys() if self.poses[arm][pose]['default']]
-            if len(defaults) >= 1:
-                initial['arms'][arm] = defaults[0]
-            else:
-                initial['arms'][arm] = self.poses[arm].keys()[0]
-            pose = self.poses[arm][initial['arms'][arm]]['pose']
-            self.event_controller.add_pose_at_time(now,now,arm,pose,0)
-        for mode in self.modes.keys():
-            override = self.modes[mode]['override']
-            value = self.modes[mode]['value']
-            current_value = self.modes[mode]['values'][value]
-            initial['modes'][mode] = {'override':override,'name':value,'value':current_value}
-            self.event_controller.add_mode_at_time(now,now,mode,current_value,override,0)
-        self.current = initial
-        return initial
-
-    def timestep(self):
-        time = self.now
-        annotations = self.event_controller.timestep_to(time)
-        self.current["annotations"] = annotations
-        for arm in self.arms:
-            try:
-                self.current['arms'][arm] = self.event_controller.arm_trajectories[arm][time]
-            except:
-                print("could not find arm "+arm)
-        for mode in self.modes.keys():
-            try:
-                current = self.event_controller.mode_trajectories[mode][time]
-                name = None
-                for value_name,value in self.modes[mode]['values'].iteritems():
-                    if value == current:
-                        name = value_name
-                self.current['modes'][mode] = {'override':self.event_controller.mode_overrides[mode],
-                                               'name':name,
-                                               'value':self.event_controller.mode_trajectories[mode][time]}
-            except:
-                print("could not find mode "+mode)
-
-        return serialize(self.current)
+            with self.event_controller.batch(now):
+                for arm in self.arms:
+                    defaults = [pose for pose in self.poses[arm].keys() if self.poses[arm][pose]['default']]
+                    if len(defaults) >= 1:
+                        initial['arms'][arm] = defaults[0]
+                    else:
+                        initial['arms'][arm] = list(self.poses[arm].keys())[0]
+                    pose = self.poses[arm][initial['arms'][arm]]['pose']
+                    self.event_controller.add_pose_at_time(now,now,arm,pose,0)
+                for mode in self.modes.keys():
+                    override = self.modes[mode]['override']
+                    value = self.modes[mode]['value']
+                    current_value = self.modes[mode]['values'][value]
+                    initial['modes'][mode] = {'override':override,'name':value,'value':current_value}
+                    self.event_controller.add_mode_at_time(now,now,mode,current_value,override,0)
+            self.current = initial
+            self.publish(now)
+            return initial
+
+    @timed('timestep')
+    def timestep(self,time=None,arm_poses=None):
+        # A pool may pass in the time and arm poses it sampled for many controllers at once
+        with self.lock:
+            if time is None:
+                time = self.now
+            annotations = self.event_controller.timestep_to(time)
+            metrics.gauge('event_store_size',len(self.event_controller.events))
+            # Build a fresh state each tick so published snapshots are never modified
+            current = {'actions':self.current['actions'],
+                       'modes':dict(self.current['modes']),
+                       'arms':dict(self.current['arms']),
+                       'annotations':annotations,
+                       'poses':self.current['poses']}
+            # Lookups are timed per tick here, not per call, so disabled metrics cost nothing on the hot path
+            with metrics.timer('pose_lookup'):
+                for arm in self.arms:
+                    try:
+                        if arm_poses is not None:
+                            current['arms'][arm] = arm_poses[arm]
+                        else:
+                            current['arms'][arm] = self.event_controller.arm_trajectories[arm][time]
+                    except:
+                        logger.warning('Could not find arm %s',arm,extra={'arm':arm})
+            with metrics.timer('mode_lookup'):
+                values = self.event_controller.mode_engine.evaluate_all(time)
+            for mode in self.modes.keys():
+                try:
+                    value = values[mode]
+                    name = None
+                    for value_name,mode_value in self.modes[mode]['values'].items():
+                        if mode_value == value:
+                            name = value_name
+                    current['modes'][mode] = {'override':self.event_controller.mode_overrides[mode],
+                                              'name':name,
+                                              'value':value}
+                except:
+                    logger.warning('Could not find mode %s',mode,extra={'mode':mode})
+            self.current = current
+            self.publish(time)
+            if self.recorder is not None:
+                self.recorder.record(time,current)
+
+            return serialize(current)
+
+    def publish(self,time):
+        # A single attribute assignment, so readers see either the old or the new snapshot
+        self.snapshot = Snapshot(time,
+                                 self.current,
+                                 dict(self.event_controller.arm_trajectories),
+                                 dict(self.event_controller.mode_trajectories.items()),
+                                 dict(self.event_controller.mode_overrides))
 
     @staticmethod
     def time_to_pose(current_pose,goal_pose):
@@ -0,0 +1,151 @@
+'''
+RViz marker payloads for previewed arm trajectories.
+
+Each arm's future (now .. now+horizon) is sampled in one vectorized call,
+decimated by curvature and written into a LINE_STRIP and a SPHERE_LIST marker
+colored by time ahead. The Marker, Point and ColorRGBA objects are kept per arm
+and refilled in place, and update() only returns markers whose preview moved by
+more than `tolerance`, so a publisher can skip unchanged arms entirely.
+
+    markers = TrajectoryMarkers(frame_id='base_link')
+    changed = controller.future_markers(markers)
+    if changed:
+        publisher.publish(markers.array(changed))
+'''
+import numpy as np
+from wisc_tools.convenience.lazy import LazyModule
+from wisc_tools.conversions import style
+
+ros = LazyModule('wisc_tools.adapters.ros')
+
+def decimate(points,angle=0.05,spacing=None):
+    '''
+    Indices of the (N,3) points worth keeping: both ends, a point every time
+    the accumulated turning angle crosses another multiple of `angle` radians,
+    and, if spacing is given, one every time the path length crosses another
+    multiple of it. Straight stretches collapse; bends keep their detail.
+    '''
+    points = np.asarray(points,dtype=float)
+    count = len(points)
+    if count <= 2:
+        return np.arange(count)
+    segments = np.diff(points,axis=0)
+    lengths = np.linalg.norm(segments,axis=1)
+    directions = segments / np.where(lengths > 0,lengths,1.0)[:,np.newaxis]
+    cosines = np.clip(np.einsum('ij,ij->i',directions[:-1],directions[1:]),-1.0,1.0)
+    # Stationary segments (up to interpolation noise) have no direction, so they add no turning
+    moving = lengths > 1e-9
+    turns = np.where(moving[:-1] & moving[1:],np.arccos(cosines),0.0)
+    keep = np.diff(np.floor(np.cumsum(turns) / angle),prepend=0) > 0
+    if spacing:
+        keep |= np.diff(np.floor(np.cumsum(lengths[:-1]) / spacing),prepend=0) > 0
+    return np.concatenate([[0],np.flatnonzero(keep) + 1,[count - 1]])
+
+def resize(messages,count,factory):
+    # Grows or shrinks a message list in place, keeping existing messages
+    del messages[count:]
+    while len(messages) < count:
+        messages.append(factory())
+    return messages
+
+class TrajectoryMarkers(object):
+    '''
+    TrajectoryMarkers Class.
+    Keeps a line strip and a sphere list marker per arm, refilled in place from
+    the arm's previewed trajectory
+    '''
+    def __init__(self,frame_id='base_link',ns='future',horizon=5.0,samples=100,angle=0.05,spacing=None,
+                 tolerance=1e-4,colormap='viridis',width=0.01,size=0.02,alpha=1.0):
+        self.frame_id = frame_id
+        self.ns = ns
+        self.horizon = horizon
+        self.samples = samples
+        self.angle = angle
+        self.spacing = spacing
+        self.tolerance = tolerance
+        self.colormap = style.get_colormap(colormap)
+        self.width = width
+        self.size = size
+        self.alpha = alpha
+        self.ahead = np.linspace(0.0,horizon,samples)
+        self.arms = {}
+
+    def __create__(self,arm,marker_type,scale):
+        Marker = ros.visualization_msgs.Marker
+        marker = Marker()
+        marker.header.frame_id = self.frame_id
+        marker.ns = self.ns + '/' + arm
+        marker.id = len(self.arms) * 2 + (marker_type == Marker.SPHERE_LIST)
+        marker.type = marker_type
+        marker.action = Marker.ADD
+        marker.pose.orientation.w = 1.0
+        marker.scale.x = scale
+        marker.scale.y = scale
+        marker.scale.z = scale
+        marker.color.a = self.alpha
+        return marker
+
+    def __state__(self,arm):
+        state = self.arms.get(arm)
+        if state is None:
+            Marker = ros.visualization_msgs.Marker
+            line = self.__create__(arm,Marker.LINE_STRIP,self.width)
+            spheres = self.__create__(arm,Marker.SPHERE_LIST,self.size)
+            state = self.arms[arm] = {'line':line,'spheres':spheres,'points':None}
+        return state
+
+    def preview(self,trajectory,now):
+        '''Decimated (M,3) positions and their times ahead of now'''
+        positions = trajectory.sample_positions(now + self.ahead)
+        kept = decimate(positions,self.angle,self.spacing)
+        return positions[kept],self.ahead[kept]
+
+    def update(self,arm,trajectory,now,stamp=None):
+        '''
+        Refills arm's markers from trajectory at now. Returns the changed
+        markers, or an empty list if the preview is unchanged within tolerance.
+        '''
+        state = self.__state__(arm)
+        points,ahead = self.preview(trajectory,now)
+        last = state['points']
+        if last is not None and last.shape == points.shape and np.abs(last - points).max() <= self.tolerance:
+            return []
+        state['points'] = points
+        rgba = self.colormap.rgba(ahead,0.0,self.horizon,self.alpha)
+        for marker in (state['line'],state['spheres']):
+            self.__fill__(marker,points,rgba,stamp)
+        return [state['line'],state['spheres']]
+
+    def __fill__(self,marker,points,rgba,stamp):
+        geometry_msgs = ros.geometry_msgs
+        messages = resize(marker.points,len(points),geometry_msgs.Point)
+        for message,(x,y,z) in zip(messages,points.tolist()):
+            message.x, message.y, message.z = x, y, z
+        style.color_fillMsgsFromRGBA(resize(marker.colors,len(points),ros.std_msgs.ColorRGBA),rgba)
+        if stamp is not None:
+            marker.header.stamp = stamp
+
+    def update_all(self,trajectories,now,stamp=None):
+        '''update() for every {arm: trajectory}; returns all changed markers'''
+        changed = []
+        for arm,trajectory in trajectories.items():
+            changed += self.update(arm,trajectory,now,stamp)
+        return changed
+
+    def markers(self):
+        return [marker for state in self.arms.values() for marker in (state['line'],state['spheres'])]
+
+    def array(self,markers=None):
+        '''A MarkerArray of markers (default: all of them) for publishing'''
+        return ros.visualization_msgs.MarkerArray(markers=list(self.markers() if markers is None else markers))
+
+    def forget(self,arm):
+        '''Drops arm's markers and returns DELETE markers for them'''
+        state = self.arms.pop(arm,None)
+        if state is None:
+            return []
+        Marker = ros.visualization_msgs.Marker
+        deleted = []
+        for marker in (state['line'],state['spheres']):
+            deleted.append(Marker(header=marker.header,ns=marker.ns,id=marker.id,action=Marker.DELETE))
+        return deleted
@@ -1,4 +1,6 @@
-__all__ = ["pairwise","ProgressBar"]
+__all__ = ["pairwise","ProgressBar","LazyModule","Metrics","metrics","timed"]
 
 from .iteration import *
 from .progress import *
+from .lazy import LazyModule
+from .instrumentation import Metrics, metrics, timed
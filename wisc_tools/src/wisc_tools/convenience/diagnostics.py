@@ -0,0 +1,146 @@
+'''
+Structured, rate-limited diagnostics for wisc_tools.
+
+Modules log through logging.getLogger(__name__) and attach context as
+`extra` fields. Nothing is emitted until enable_diagnostics() is called, which
+installs a QueueHandler on the 'wisc_tools' logger: the control thread only
+enqueues records, and a QueueListener thread formats and writes them.
+
+    from wisc_tools.convenience.diagnostics import enable_diagnostics
+    listener = enable_diagnostics(logging.DEBUG, loggers={'wisc_tools.control.planning':logging.INFO})
+    ...
+    disable_diagnostics()
+'''
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = 'wisc_tools'
+
+# Attributes every LogRecord has; anything else came in through `extra`
+RESERVED = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | set(['message', 'asctime'])
+
+def fields(record):
+    return {key:value for key, value in record.__dict__.items() if key not in RESERVED}
+
+class RateLimitFilter(logging.Filter):
+    '''
+    RateLimitFilter Class.
+    Token bucket per (logger, message template): allows `burst` records at once
+    and `rate` per second after that. The next record let through reports how
+    many were suppressed in its `suppressed` field.
+    '''
+    def __init__(self, rate=1.0, burst=5, clock=time.monotonic):
+        super(RateLimitFilter, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = self.clock()
+        with self.lock:
+            tokens, last, suppressed = self.buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self.buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class StructuredFormatter(logging.Formatter):
+    '''
+    StructuredFormatter Class.
+    Appends `extra` fields to the message as key=value pairs, or renders the
+    whole record as one JSON object per line
+    '''
+    def __init__(self, fmt='%(asctime)s %(levelname)s %(name)s: %(message)s', as_json=False):
+        super(StructuredFormatter, self).__init__(fmt)
+        self.as_json = as_json
+
+    def format(self, record):
+        extra = fields(record)
+        if self.as_json:
+            payload = {'time':record.created, 'level':record.levelname, 'logger':record.name, 'message':record.getMessage()}
+            payload.update(extra)
+            return json.dumps(payload, default=repr)
+        message = super(StructuredFormatter, self).format(record)
+        if extra:
+            message += ' ' + ' '.join('{0}={1!r}'.format(key, value) for key, value in sorted(extra.items()))
+        return message
+
+def freeze(value):
+    # A copy of an `extra` value, so later changes by the caller do not reach the listener
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return json.loads(json.dumps(value, default=repr))
+
+class DroppingQueueHandler(QueueHandler):
+    '''QueueHandler that never blocks the logging thread when the queue is full'''
+    def prepare(self, record):
+        # As QueueHandler does, merge the arguments (and any traceback) into the message now,
+        # since they may be changed before the listener gets to the record; extras are copied too
+        message = self.format(record)
+        record = copy.copy(record)
+        for key, value in fields(record).items():
+            setattr(record, key, freeze(value))
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+listener = None
+
+def enable_diagnostics(level=logging.INFO, handler=None, loggers={}, rate=1.0, burst=5, as_json=False, maxsize=10000):
+    '''
+    Routes wisc_tools logging through a background thread.
+    `handler` defaults to stderr; `loggers` maps logger names to levels so
+    single modules can be turned up or down. Records past `maxsize` queued
+    are dropped rather than blocking the caller. Returns the QueueListener.
+    '''
+    global listener
+    disable_diagnostics()
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+    if handler.formatter is None:
+        handler.setFormatter(StructuredFormatter(as_json=as_json))
+    records = queue.Queue(maxsize)
+    queue_handler = DroppingQueueHandler(records)
+    if rate is not None:
+        queue_handler.addFilter(RateLimitFilter(rate, burst))
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    for name, logger_level in loggers.items():
+        logging.getLogger(name).setLevel(logger_level)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.queue_handler = queue_handler
+    listener.start()
+    return listener
+
+def disable_diagnostics():
+    '''Stops the listener, flushing anything still queued'''
+    global listener
+    if listener is None:
+        return
+    logging.getLogger(ROOT).removeHandler(listener.queue_handler)
+    listener.stop()
+    listener = None
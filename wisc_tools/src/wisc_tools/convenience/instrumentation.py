@@ -0,0 +1,181 @@
+'''
+Opt-in timing, counting and gauges for the control hot paths.
+
+Everything goes through the module-level `metrics` registry, which is disabled
+by default. While disabled, timer() hands back a shared no-op context and the
+other calls return after a single attribute check.
+
+    from wisc_tools.convenience import metrics
+    metrics.enable()
+    ...
+    metrics.export()        # nested dict
+    metrics.prometheus()    # Prometheus text exposition format
+'''
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+import threading
+
+# Upper bounds in seconds, from 10us to 1s
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class Histogram(object):
+    '''
+    Histogram Class.
+    Per-bucket counts plus the sum and count of observed latencies
+    '''
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def dict(self):
+        return {'count':self.count,
+                'sum':self.sum,
+                'mean':self.sum / self.count if self.count else 0.0,
+                'buckets':dict(zip(list(self.buckets) + ['+Inf'], self.counts))}
+
+class NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Timer(object):
+    def __init__(self, metrics, name, channel):
+        self.metrics = metrics
+        self.name = name
+        self.channel = channel
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, perf_counter() - self.start, self.channel)
+        return False
+
+class Metrics(object):
+    '''
+    Metrics Class.
+    Registry of latency histograms, counters and gauges, each keyed by name and
+    an optional channel (an arm, mode or annotation name)
+    '''
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def timer(self, name, channel=None):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, channel)
+
+    def observe(self, name, seconds, channel=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get((name, channel))
+            if histogram is None:
+                histogram = self.histograms[(name, channel)] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, channel=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, channel)] = self.counters.get((name, channel), 0) + amount
+
+    def gauge(self, name, value, channel=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, channel)] = value
+
+    def export(self):
+        '''Returns {'timers':..., 'counters':..., 'gauges':...}, each as {name:{channel:value}}'''
+        def group(items):
+            grouped = {}
+            for (name, channel), value in items:
+                grouped.setdefault(name, {})[channel] = value
+            return grouped
+        with self.lock:
+            return {'timers':group((key, histogram.dict) for key, histogram in self.histograms.items()),
+                    'counters':group(self.counters.items()),
+                    'gauges':group(self.gauges.items())}
+
+    def prometheus(self, prefix='wisc_tools'):
+        '''Renders every metric in the Prometheus text exposition format'''
+        def labels(channel, **extra):
+            pairs = [('channel', channel)] if channel is not None else []
+            pairs += sorted(extra.items())
+            if not pairs:
+                return ''
+            return '{' + ','.join('{0}="{1}"'.format(key, value) for key, value in pairs) + '}'
+
+        lines = []
+        with self.lock:
+            for name in sorted(set(name for name, _ in self.histograms)):
+                metric = '{0}_{1}_seconds'.format(prefix, name)
+                lines.append('# TYPE {0} histogram'.format(metric))
+                for (key, channel), histogram in sorted(self.histograms.items(), key=sort_key):
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append('{0}_bucket{1} {2}'.format(metric, labels(channel, le=bound), cumulative))
+                    lines.append('{0}_sum{1} {2!r}'.format(metric, labels(channel), histogram.sum))
+                    lines.append('{0}_count{1} {2}'.format(metric, labels(channel), histogram.count))
+            for kind, store, suffix in (('counter', self.counters, '_total'), ('gauge', self.gauges, '')):
+                for name in sorted(set(name for name, _ in store)):
+                    metric = '{0}_{1}{2}'.format(prefix, name, suffix)
+                    lines.append('# TYPE {0} {1}'.format(metric, kind))
+                    for (key, channel), value in sorted(store.items(), key=sort_key):
+                        if key == name:
+                            lines.append('{0}{1} {2}'.format(metric, labels(channel), value))
+        return '\n'.join(lines) + '\n'
+
+def sort_key(item):
+    (name, channel), _ = item
+    return (name, '' if channel is None else str(channel))
+
+metrics = Metrics()
+
+def timed(name):
+    '''Decorator recording each call's latency under name while metrics are enabled'''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe(name, perf_counter() - start)
+        return wrapper
+    return decorator
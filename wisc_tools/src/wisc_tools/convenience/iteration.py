@@ -1,9 +1,10 @@
+from itertools import tee
 try:
-    from itertools import tee, izip
+    from itertools import izip
+except ImportError:
+    izip = zip
 
-    def pairwise(iterable):
-        a, b = tee(iterable)
-        next(b, None)
-        return izip(a, b)
-except:
-    from more_itertools import pairwise
+def pairwise(iterable):
+    a, b = tee(iterable)
+    next(b, None)
+    return izip(a, b)
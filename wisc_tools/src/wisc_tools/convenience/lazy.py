@@ -0,0 +1,21 @@
+import importlib
+
+class LazyModule(object):
+    '''
+    LazyModule Class.
+    Stands in for a module and only imports it on first attribute access, so
+    heavy or optional dependencies cost nothing until a feature needs them
+    '''
+    def __init__(self, name):
+        self.__dict__['name'] = name
+        self.__dict__['module'] = None
+
+    def __getattr__(self, attribute):
+        module = self.__dict__['module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['name'])
+            self.__dict__['module'] = module
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return '<lazy module {0}>'.format(self.__dict__['name'])
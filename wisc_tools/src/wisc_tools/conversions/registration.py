@@ -0,0 +1,181 @@
+'''
+Point-set registration beyond transformations.superimposition_matrix.
+
+IncrementalRegistration keeps running sums so a streamed correspondence
+updates the fit in O(1); solve_batch fits many independent point-set pairs in
+one batched SVD; ransac_registration rejects outliers with adaptive early
+termination. Point sets are (N,3) rows, as in wisc_tools.structures, and
+every solver returns 4x4 homogeneous matrices mapping v0 onto v1, matching
+superimposition_matrix(v0.T, v1.T, scale).
+'''
+import math
+import numpy as np
+
+def __kabsch__(covariance, variance0, count, scale):
+    '''
+    Rotation and scale from (...,3,3) cross-covariance sums and (...,) source
+    variance sums, following Umeyama's reflection-safe solution
+    '''
+    u, s, vt = np.linalg.svd(covariance)
+    d = np.sign(np.linalg.det(np.matmul(u, vt)))
+    d = np.where(d == 0, 1.0, d)
+    s[..., 2] *= d
+    vt[..., 2, :] *= d[..., np.newaxis]
+    rotation = np.matmul(np.swapaxes(vt, -1, -2), np.swapaxes(u, -1, -2))
+    if scale:
+        factor = s.sum(axis=-1) / np.where(variance0 > 0, variance0, 1.0)
+    else:
+        factor = np.ones(np.shape(count))
+    return rotation, factor
+
+def __matrix__(rotation, factor, centroid0, centroid1):
+    matrix = np.zeros(rotation.shape[:-2] + (4, 4))
+    matrix[..., :3, :3] = rotation * np.asarray(factor)[..., np.newaxis, np.newaxis]
+    matrix[..., :3, 3] = centroid1 - np.einsum('...ij,...j->...i', matrix[..., :3, :3], centroid0)
+    matrix[..., 3, 3] = 1.0
+    return matrix
+
+def solve_batch(v0, v1, weights=None, scale=False):
+    '''
+    Fits B independent registrations at once.
+    v0, v1 are (B,N,3); weights is an optional (B,N) array. Returns (B,4,4).
+    '''
+    v0 = np.asarray(v0, dtype=float)
+    v1 = np.asarray(v1, dtype=float)
+    if weights is None:
+        weights = np.ones(v0.shape[:-1])
+    weights = np.asarray(weights, dtype=float)
+    count = weights.sum(axis=-1)
+    if np.any(count <= 0):
+        raise ValueError('Every point set needs a positive total weight')
+    centroid0 = np.einsum('...n,...ni->...i', weights, v0) / count[..., np.newaxis]
+    centroid1 = np.einsum('...n,...ni->...i', weights, v1) / count[..., np.newaxis]
+    d0 = v0 - centroid0[..., np.newaxis, :]
+    d1 = v1 - centroid1[..., np.newaxis, :]
+    covariance = np.einsum('...n,...ni,...nj->...ij', weights, d0, d1)
+    variance0 = np.einsum('...n,...ni,...ni->...', weights, d0, d0)
+    rotation, factor = __kabsch__(covariance, variance0, count, scale)
+    return __matrix__(rotation, factor, centroid0, centroid1)
+
+def solve(v0, v1, weights=None, scale=False):
+    '''Single (N,3) to (N,3) registration. Returns a 4x4 matrix.'''
+    return solve_batch(np.asarray(v0, dtype=float)[np.newaxis],
+                       np.asarray(v1, dtype=float)[np.newaxis],
+                       None if weights is None else np.asarray(weights, dtype=float)[np.newaxis],
+                       scale)[0]
+
+def transform_points(matrix, points):
+    '''Applies a 4x4 (or broadcastable (...,4,4)) matrix to (...,N,3) points'''
+    matrix = np.asarray(matrix, dtype=float)
+    return np.matmul(points, np.swapaxes(matrix[..., :3, :3], -1, -2)) + matrix[..., np.newaxis, :3, 3]
+
+class IncrementalRegistration(object):
+    '''
+    IncrementalRegistration Class.
+    Streaming registration from running weighted sums. add() and remove() are
+    O(1); the 4x4 fit is recomputed from a 3x3 SVD only when read after a change.
+    '''
+    def __init__(self, scale=False):
+        self.scale = scale
+        self.reset()
+
+    def reset(self):
+        self.count = 0.0
+        self.sum0 = np.zeros(3)
+        self.sum1 = np.zeros(3)
+        self.cross = np.zeros((3, 3))
+        self.square0 = 0.0
+        self.cached = None
+
+    def __len__(self):
+        return int(round(self.count))
+
+    def add(self, p0, p1, weight=1.0):
+        p0 = np.asarray(p0, dtype=float)
+        p1 = np.asarray(p1, dtype=float)
+        self.count += weight
+        self.sum0 += weight * p0
+        self.sum1 += weight * p1
+        self.cross += weight * np.outer(p0, p1)
+        self.square0 += weight * p0.dot(p0)
+        self.cached = None
+
+    def add_many(self, v0, v1, weights=None):
+        v0 = np.asarray(v0, dtype=float).reshape(-1, 3)
+        v1 = np.asarray(v1, dtype=float).reshape(-1, 3)
+        weights = np.ones(len(v0)) if weights is None else np.asarray(weights, dtype=float)
+        self.count += weights.sum()
+        self.sum0 += weights.dot(v0)
+        self.sum1 += weights.dot(v1)
+        self.cross += np.einsum('n,ni,nj->ij', weights, v0, v1)
+        self.square0 += np.einsum('n,ni,ni->', weights, v0, v0)
+        self.cached = None
+
+    def remove(self, p0, p1, weight=1.0):
+        '''Drops a correspondence that was added earlier, e.g. to slide a window'''
+        self.add(p0, p1, -weight)
+
+    @property
+    def matrix(self):
+        if self.cached is None:
+            if self.count < 3 - 1e-9:
+                raise ValueError('Registration needs at least 3 correspondences, has {0}'.format(self.count))
+            centroid0 = self.sum0 / self.count
+            centroid1 = self.sum1 / self.count
+            covariance = self.cross - self.count * np.outer(centroid0, centroid1)
+            variance0 = self.square0 - self.count * centroid0.dot(centroid0)
+            rotation, factor = __kabsch__(covariance, np.float64(variance0), np.float64(self.count), self.scale)
+            self.cached = __matrix__(rotation, factor, centroid0, centroid1)
+        return self.cached
+
+def draw_triples(rng, count, size):
+    # Rows of 3 distinct indices; repeats are redrawn until none remain
+    samples = rng.randint(0, count, (size, 3))
+    while True:
+        repeated = (samples[:, 0] == samples[:, 1]) | (samples[:, 0] == samples[:, 2]) | (samples[:, 1] == samples[:, 2])
+        if not repeated.any():
+            return samples
+        samples[repeated] = rng.randint(0, count, (int(repeated.sum()), 3))
+
+def ransac_registration(v0, v1, threshold, scale=False, confidence=0.99, max_iterations=1000, batch=64, rng=None):
+    '''
+    Robust registration of (N,3) correspondences containing outliers.
+    Minimal 3-point hypotheses are drawn and fitted `batch` at a time; the
+    iteration budget shrinks as the best inlier ratio w grows, stopping once
+    log(1-confidence)/log(1-w**3) samples have been tried. The winner is refit
+    on its inliers. Returns (matrix, inlier mask).
+    '''
+    v0 = np.asarray(v0, dtype=float)
+    v1 = np.asarray(v1, dtype=float)
+    count = len(v0)
+    if count < 3:
+        raise ValueError('Registration needs at least 3 correspondences, has {0}'.format(count))
+    rng = np.random.RandomState() if rng is None else rng
+    best_inliers = np.zeros(count, dtype=bool)
+    best_error = np.inf
+    required = max_iterations
+    iterations = 0
+    while iterations < min(required, max_iterations):
+        size = min(batch, max_iterations - iterations)
+        samples = draw_triples(rng, count, size)
+        hypotheses = solve_batch(v0[samples], v1[samples], scale=scale)
+        errors = np.linalg.norm(transform_points(hypotheses, v0) - v1, axis=-1)
+        inliers = errors < threshold
+        totals = inliers.sum(axis=1)
+        residuals = np.where(inliers, errors, 0.0).sum(axis=1)
+        # Most inliers wins; ties go to the smaller inlier residual
+        best = np.lexsort((residuals, -totals))[0]
+        if totals[best] > best_inliers.sum() or (totals[best] == best_inliers.sum() and residuals[best] < best_error):
+            best_inliers = inliers[best]
+            best_error = residuals[best]
+            ratio = best_inliers.sum() / float(count)
+            if ratio >= 1.0:
+                required = 0
+            elif ratio > 0:
+                required = int(math.ceil(math.log(1.0 - confidence) / math.log(1.0 - ratio**3)))
+        iterations += size
+    if best_inliers.sum() < 3:
+        raise ValueError('No hypothesis found 3 inliers within {0}'.format(threshold))
+    matrix = solve(v0[best_inliers], v1[best_inliers], scale=scale)
+    inliers = np.linalg.norm(transform_points(matrix, v0) - v1, axis=-1) < threshold
+    return matrix, inliers
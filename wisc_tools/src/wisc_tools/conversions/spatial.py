@@ -1,10 +1,36 @@
-import tf
+from collections import deque
+from functools import partial
+import numpy as np
+from wisc_tools.conversions import transformations
+from wisc_tools.convenience.lazy import LazyModule
+from wisc_tools.structures.vectorized import quaternions_from_euler
 
-from wisc_msgs.msg import EulerPose, EEPoseGoals
-import geometry_msgs.msg.Vector3 as rosVector3
-import geometry_msgs.msg.Quaternion as rosQuaternion
-import pyquaternion
-from wisc_tools.geometry import *
+# Message types come through the ROS adapter, so stand-ins work here too
+ros = LazyModule('wisc_tools.adapters.ros')
+
+def rosVector3(**fields):
+    return ros.geometry_msgs.Vector3(**fields)
+
+def rosQuaternion(**fields):
+    return ros.geometry_msgs.Quaternion(**fields)
+
+def rosPose(**fields):
+    return ros.geometry_msgs.Pose(**fields)
+
+def EulerPose(**fields):
+    return ros.wisc_msgs.EulerPose(**fields)
+
+#===============================================================================
+#       Quaternion Order
+#===============================================================================
+
+# ROS tf orders quaternions [x,y,z,w]; the bundled transformations module uses [w,x,y,z]
+
+def wxyz_from_tf(t):
+    return [t[3],t[0],t[1],t[2]]
+
+def tf_from_wxyz(q):
+    return [q[1],q[2],q[3],q[0]]
 
 #===============================================================================
 #       Position Message Conversion
@@ -20,13 +46,13 @@ def position_dictFromMsg(msg):
 #       Orientation Message Conversion
 #===============================================================================
 
-def orientation_eulerMsgFromQuaterionMsg(qmsg):
-    tf_quat == orientation_tfFromQuaternionMsg(qmsg)
-    (r,p,y) = tf.transformations.euler_from_quaternion(tf_quat)
+def orientation_eulerMsgFromQuaterionMsg(qmsg, form='sxyz'):
+    tf_quat = orientation_tfFromQuaternionMsg(qmsg)
+    (r,p,y) = transformations.euler_from_quaternion(wxyz_from_tf(tf_quat),form)
     return rosVector3(x=r,y=p,z=y)
 
 def orientation_quaterionMsgFromEulerMsg(emsg, form='sxyz'):
-    tf_quat = tf.transformations.quaternion_from_euler(emsg.x,emsg.y,emsg.z,form)
+    tf_quat = tf_from_wxyz(transformations.quaternion_from_euler(emsg.x,emsg.y,emsg.z,form))
     return orientation_quaternionMsgFromTf(tf_quat)
 
 def orientation_eulerMsgFromEulerDict(dct):
@@ -38,55 +64,55 @@ def orientation_quaterionMsgFromQuaternionDict(dct):
 def orientation_eulerDictFromEulerMsg(msg):
     return {'x':msg.x, 'y':msg.y, 'z':msg.z}
 
-def orientation_eulerDictFromQuaternionMsg(qmsg):
-    tf_quat == orientation_tfFromQuaternionMsg(qmsg)
-    (r,p,y) = tf.transformations.euler_from_quaternion(tf_quat)
+def orientation_eulerDictFromQuaternionMsg(qmsg, form='sxyz'):
+    tf_quat = orientation_tfFromQuaternionMsg(qmsg)
+    (r,p,y) = transformations.euler_from_quaternion(wxyz_from_tf(tf_quat),form)
     return {'x':r, 'y':p, 'z':y}
 
 def orientation_quaternionDictFromEulerMsg(emsg, form='sxyz'):
-    tf_quat = tf.transformations.quaternion_from_euler(emsg.x,emsg.y,emsg.z,form)
+    tf_quat = tf_from_wxyz(transformations.quaternion_from_euler(emsg.x,emsg.y,emsg.z,form))
     return orientation_quaternionDictFromTf(tf_quat)
 
-def orientation_eulerMsgFromQuaternionDict(dct):
+def orientation_eulerMsgFromQuaternionDict(dct, form='sxyz'):
     tf_quat = orientation_tfFromQuaternionDict(dct)
-    (r,p,y) = tf.transformations.euler_from_quaternion(tf_quat)
+    (r,p,y) = transformations.euler_from_quaternion(wxyz_from_tf(tf_quat),form)
     return rosVector3(x=r,y=p,z=y)
 
 def orientation_quaternionMsgFromEulerDict(dct, form='sxyz'):
-    tf_quat = tf.transformations.quaternion_from_euler(dct['x'],dct['y'],dct['z'],form)
+    tf_quat = tf_from_wxyz(transformations.quaternion_from_euler(dct['x'],dct['y'],dct['z'],form))
     return orientation_quaternionMsgFromTf(tf_quat)
 
 def orientation_quaternionDictFromQuaternionMsg(msg):
     return {'x':msg.x, 'y':msg.y, 'z':msg.z, 'w':msg.w}
 
 def orientation_quaternionDictFromEulerDict(dct, form='sxyz'):
-    tf_quat = tf.transformations.quaternion_from_euler(dct['x'],dct['y'],dct['z'],form)
+    tf_quat = tf_from_wxyz(transformations.quaternion_from_euler(dct['x'],dct['y'],dct['z'],form))
     return orientation_quaternionDictFromTf(tf_quat)
 
-def orientation_eulerDictFromQuaternionDict(dct):
+def orientation_eulerDictFromQuaternionDict(dct, form='sxyz'):
     tf_quat = orientation_tfFromQuaternionDict(dct)
-    (r,p,y) = tf.transformations.euler_from_quaternion(tf_quat)
+    (r,p,y) = transformations.euler_from_quaternion(wxyz_from_tf(tf_quat),form)
     return {'x':r, 'y':p, 'z':y}
 
 #===============================================================================
 #       Pose Message Conversion
 #===============================================================================
 
-def pose_eulerMsgFromQuaternionMsg(qmsg):
+def pose_eulerMsgFromQuaternionMsg(qmsg, form='sxyz'):
     return EulerPose(position=qmsg.position,
-                     orientation=orientation_eulerMsgFromQuaterionMsg(qmsg.orientation))
+                     orientation=orientation_eulerMsgFromQuaterionMsg(qmsg.orientation,form))
 
 def pose_eulerMsgFromEulerDict(dct):
     return EulerPose(position=position_msgFromDict(dct['position']),
                      orientation=orientation_eulerMsgFromEulerDict(dct['orientation']))
 
 def pose_quaternionMsgFromEulerMsg(emsg, form='sxyz'):
-    return Pose(position=emsg.position,
-                orientation=orientation_quaterionMsgFromEulerMsg(emsg.orientation,form))
+    return rosPose(position=emsg.position,
+                   orientation=orientation_quaterionMsgFromEulerMsg(emsg.orientation,form))
 
 def pose_quaternionMsgFromQuaternionDict(dct):
-    return Pose(position=position_msgFromDict(dct['position']),
-                orientation=orientation_quaterionMsgFromQuaternionDict(dct['orientation']))
+    return rosPose(position=position_msgFromDict(dct['position']),
+                   orientation=orientation_quaterionMsgFromQuaternionDict(dct['orientation']))
 
 def pose_eulerDictFromEulerMsg(msg):
     return {
@@ -100,10 +126,10 @@ def pose_quaternionDictFromQuaterionMsg(msg):
         'orientation': orientation_quaternionDictFromQuaternionMsg(msg.orientation)
     }
 
-def pose_eulerDictFromQuaternionDict(dct):
+def pose_eulerDictFromQuaternionDict(dct, form='sxyz'):
     return {
         'position': dct['position'],
-        'orientation': orientation_eulerDictFromQuaternionDict(dct['orientation'])
+        'orientation': orientation_eulerDictFromQuaternionDict(dct['orientation'],form)
     }
 
 def pose_quaternionDictFromEulerDict(dct, form='sxyz'):
@@ -112,10 +138,10 @@ def pose_quaternionDictFromEulerDict(dct, form='sxyz'):
         'orientation': orientation_quaternionDictFromEulerDict(dct['orientation'],form)
     }
 
-def pose_eulerDictFromQuaternionMsg(msg):
+def pose_eulerDictFromQuaternionMsg(msg, form='sxyz'):
     return {
         'position': position_dictFromMsg(msg.position),
-        'orientation': orientation_eulerDictFromQuaternionMsg(msg.orientation)
+        'orientation': orientation_eulerDictFromQuaternionMsg(msg.orientation,form)
     }
 
 def pose_quaternionDictFromEulerMsg(msg, form='sxyz'):
@@ -124,13 +150,13 @@ def pose_quaternionDictFromEulerMsg(msg, form='sxyz'):
         'orientation': orientation_quaternionDictFromEulerMsg(msg.orientation,form)
     }
 
-def pose_eulerMsgFromQuaternionDict(dct):
-    EulerPose(position=position_msgFromDict(dct['position']),
-              orientation=orientation_eulerMsgFromQuaternionDict(dct['orientation']))
+def pose_eulerMsgFromQuaternionDict(dct, form='sxyz'):
+    return EulerPose(position=position_msgFromDict(dct['position']),
+                     orientation=orientation_eulerMsgFromQuaternionDict(dct['orientation'],form))
 
 def pose_quaternionMsgFromEulerDict(dct, form='sxyz'):
-    return Pose(position=position_msgFromDict(dct['position']),
-                orientation=orientation_quaternionMsgFromEulerDict(dct['orientation'],form))
+    return rosPose(position=position_msgFromDict(dct['position']),
+                   orientation=orientation_quaternionMsgFromEulerDict(dct['orientation'],form))
 
 #===============================================================================
 #       Position to Tf Conversion
@@ -143,7 +169,7 @@ def position_tfFromMsg(msg):
     return [msg.x,msg.y,msg.z]
 
 def position_dictFromTf(t):
-    return {'x':t[0], 'y':t[1], 'z':[2]}
+    return {'x':t[0], 'y':t[1], 'z':t[2]}
 
 def position_msgFromTf(t):
     return rosVector3(x=t[0],y=t[1],z=t[2])
@@ -169,6 +195,8 @@ def orientation_quaternionMsgFromTf(t):
 #===============================================================================
 
 def pose_tfFromQuaternionDict(dct):
+    pos = position_tfFromDict(dct['position'])
+    rot = orientation_tfFromQuaternionDict(dct['orientation'])
     return pos, rot
 
 def pose_tfFromQuaternionMsg(msg):
@@ -183,5 +211,231 @@ def pose_quaternionDictFromTf(pos,rot):
     }
 
 def pose_quaternionMsgFromTf(pos,rot):
-    return Pose(position=position_msgFromTf(pos),
-                orientation=orientation_quaternionMsgFromTf(rot))
+    return rosPose(position=position_msgFromTf(pos),
+                   orientation=orientation_quaternionMsgFromTf(rot))
+
+#===============================================================================
+#       In-place Message Fill
+#===============================================================================
+
+# Counterparts of the *Msg builders that overwrite an existing message, so a
+# publisher can reuse one message per tick
+
+def position_fillMsgFromDict(msg,dct):
+    msg.x, msg.y, msg.z = dct['x'], dct['y'], dct['z']
+    return msg
+
+def position_fillMsgFromTf(msg,t):
+    msg.x, msg.y, msg.z = t[0], t[1], t[2]
+    return msg
+
+def orientation_fillQuaternionMsgFromQuaternionDict(msg,dct):
+    msg.x, msg.y, msg.z, msg.w = dct['x'], dct['y'], dct['z'], dct['w']
+    return msg
+
+def orientation_fillQuaternionMsgFromTf(msg,t):
+    msg.x, msg.y, msg.z, msg.w = t[0], t[1], t[2], t[3]
+    return msg
+
+def pose_fillQuaternionMsgFromQuaternionDict(msg,dct):
+    position_fillMsgFromDict(msg.position,dct['position'])
+    orientation_fillQuaternionMsgFromQuaternionDict(msg.orientation,dct['orientation'])
+    return msg
+
+def pose_fillQuaternionMsgFromTf(msg,pos,rot):
+    position_fillMsgFromTf(msg.position,pos)
+    orientation_fillQuaternionMsgFromTf(msg.orientation,rot)
+    return msg
+
+#===============================================================================
+#       Batched Conversion
+#===============================================================================
+
+def orientation_tfListFromEulerDicts(dcts, form='sxyz'):
+    angles = np.array([[dct['x'],dct['y'],dct['z']] for dct in dcts],dtype=float).reshape(-1,3)
+    quaternions = quaternions_from_euler(angles[:,0],angles[:,1],angles[:,2],form)
+    return quaternions[:,[1,2,3,0]].tolist()
+
+def orientation_quaternionDictsFromEulerDicts(dcts, form='sxyz'):
+    return [orientation_quaternionDictFromTf(t) for t in orientation_tfListFromEulerDicts(dcts,form)]
+
+def pose_quaternionDictsFromEulerDicts(dcts, form='sxyz'):
+    rotations = orientation_quaternionDictsFromEulerDicts([dct['orientation'] for dct in dcts],form)
+    return [{'position':dct['position'],'orientation':rotation} for dct,rotation in zip(dcts,rotations)]
+
+def pose_tfListFromEulerDicts(dcts, form='sxyz'):
+    rotations = orientation_tfListFromEulerDicts([dct['orientation'] for dct in dcts],form)
+    return [(position_tfFromDict(dct['position']),rotation) for dct,rotation in zip(dcts,rotations)]
+
+#===============================================================================
+#       Conversion Graph
+#===============================================================================
+
+def fuse(steps):
+    '''Collapses a chain of one-argument converters into a single function'''
+    if len(steps) == 1:
+        return steps[0]
+    if len(steps) == 2:
+        first, second = steps
+        return lambda value: second(first(value))
+    def fused(value):
+        for step in steps:
+            value = step(value)
+        return value
+    return fused
+
+class ConversionGraph(object):
+    '''
+    ConversionGraph Class.
+    Registered converters between representations of one kind of value
+    ('position', 'orientation', 'pose'). Any pair connected through the graph
+    can be converted; the cheapest chain is resolved once per
+    (kind, source, target, form) and cached as one fused function.
+    '''
+    def __init__(self):
+        self.edges = {}
+        self.batches = {}
+        self.cache = {}
+
+    def register(self, kind, source, target, function, uses_form=False, batch=None):
+        '''
+        function converts one value; uses_form marks converters taking an Euler
+        axes `form` argument. batch, if given, converts a list in one call.
+        '''
+        self.edges.setdefault(kind,{})[(source,target)] = (function,uses_form)
+        if batch is not None:
+            self.batches.setdefault(kind,{})[(source,target)] = batch
+        self.cache = {}
+
+    def representations(self, kind):
+        return sorted(set(rep for pair in self.edges.get(kind,{}) for rep in pair))
+
+    def __route__(self, kind, source, target, batched):
+        # Breadth-first relaxation over a handful of nodes. When batching, an
+        # Euler conversion mapped value by value costs more than a native batch
+        # edge followed by cheap per-value repacking
+        edges = self.edges.get(kind,{})
+        batches = self.batches.get(kind,{})
+        best = {source:(0,[])}
+        frontier = deque([source])
+        while frontier:
+            node = frontier.popleft()
+            cost, path = best[node]
+            for (start,stop) in edges:
+                if start != node:
+                    continue
+                step = 4 if batched and edges[(start,stop)][1] and (start,stop) not in batches else 1
+                if stop not in best or cost + step < best[stop][0]:
+                    best[stop] = (cost + step, path + [(start,stop)])
+                    frontier.append(stop)
+        if target not in best:
+            raise ValueError('No conversion from {0} to {1} for {2}'.format(source,target,kind))
+        return best[target][1]
+
+    def __bind__(self, kind, pair, form):
+        function,uses_form = self.edges[kind][pair]
+        return partial(function,form=form) if uses_form else function
+
+    def converter(self, kind, source, target, form='sxyz'):
+        key = (kind,source,target,form,False)
+        function = self.cache.get(key)
+        if function is None:
+            if source == target:
+                function = lambda value: value
+            else:
+                function = fuse([self.__bind__(kind,pair,form) for pair in self.__route__(kind,source,target,False)])
+            self.cache[key] = function
+        return function
+
+    def batch_converter(self, kind, source, target, form='sxyz'):
+        key = (kind,source,target,form,True)
+        function = self.cache.get(key)
+        if function is None:
+            if source == target:
+                function = list
+            else:
+                steps = []
+                for pair in self.__route__(kind,source,target,True):
+                    batch = self.batches.get(kind,{}).get(pair)
+                    if batch is not None:
+                        steps.append(partial(batch,form=form))
+                    else:
+                        single = self.__bind__(kind,pair,form)
+                        steps.append(lambda values, single=single: [single(value) for value in values])
+                function = fuse(steps)
+            self.cache[key] = function
+        return function
+
+    def convert(self, kind, value, source, target, form='sxyz'):
+        return self.converter(kind,source,target,form)(value)
+
+    def convert_many(self, kind, values, source, target, form='sxyz'):
+        return self.batch_converter(kind,source,target,form)(list(values))
+
+def unpack(function):
+    return lambda pair: function(*pair)
+
+conversions = ConversionGraph()
+
+for source, target, function, uses_form in [
+        ('dict', 'msg', position_msgFromDict, False),
+        ('msg', 'dict', position_dictFromMsg, False),
+        ('dict', 'tf', position_tfFromDict, False),
+        ('msg', 'tf', position_tfFromMsg, False),
+        ('tf', 'dict', position_dictFromTf, False),
+        ('tf', 'msg', position_msgFromTf, False)]:
+    conversions.register('position', source, target, function, uses_form)
+
+for source, target, function, uses_form in [
+        ('quaternion_msg', 'euler_msg', orientation_eulerMsgFromQuaterionMsg, True),
+        ('euler_msg', 'quaternion_msg', orientation_quaterionMsgFromEulerMsg, True),
+        ('euler_dict', 'euler_msg', orientation_eulerMsgFromEulerDict, False),
+        ('quaternion_dict', 'quaternion_msg', orientation_quaterionMsgFromQuaternionDict, False),
+        ('euler_msg', 'euler_dict', orientation_eulerDictFromEulerMsg, False),
+        ('quaternion_msg', 'euler_dict', orientation_eulerDictFromQuaternionMsg, True),
+        ('euler_msg', 'quaternion_dict', orientation_quaternionDictFromEulerMsg, True),
+        ('quaternion_dict', 'euler_msg', orientation_eulerMsgFromQuaternionDict, True),
+        ('euler_dict', 'quaternion_msg', orientation_quaternionMsgFromEulerDict, True),
+        ('quaternion_msg', 'quaternion_dict', orientation_quaternionDictFromQuaternionMsg, False),
+        ('quaternion_dict', 'euler_dict', orientation_eulerDictFromQuaternionDict, True),
+        ('quaternion_dict', 'tf', orientation_tfFromQuaternionDict, False),
+        ('quaternion_msg', 'tf', orientation_tfFromQuaternionMsg, False),
+        ('tf', 'quaternion_dict', orientation_quaternionDictFromTf, False),
+        ('tf', 'quaternion_msg', orientation_quaternionMsgFromTf, False)]:
+    conversions.register('orientation', source, target, function, uses_form)
+conversions.register('orientation', 'euler_dict', 'quaternion_dict', orientation_quaternionDictFromEulerDict, True,
+                     batch=orientation_quaternionDictsFromEulerDicts)
+conversions.register('orientation', 'euler_dict', 'tf',
+                     lambda dct, form: tf_from_wxyz(transformations.quaternion_from_euler(dct['x'],dct['y'],dct['z'],form)), True,
+                     batch=orientation_tfListFromEulerDicts)
+
+for source, target, function, uses_form in [
+        ('quaternion_msg', 'euler_msg', pose_eulerMsgFromQuaternionMsg, True),
+        ('euler_dict', 'euler_msg', pose_eulerMsgFromEulerDict, False),
+        ('euler_msg', 'quaternion_msg', pose_quaternionMsgFromEulerMsg, True),
+        ('quaternion_dict', 'quaternion_msg', pose_quaternionMsgFromQuaternionDict, False),
+        ('euler_msg', 'euler_dict', pose_eulerDictFromEulerMsg, False),
+        ('quaternion_msg', 'quaternion_dict', pose_quaternionDictFromQuaterionMsg, False),
+        ('quaternion_dict', 'euler_dict', pose_eulerDictFromQuaternionDict, True),
+        ('quaternion_msg', 'euler_dict', pose_eulerDictFromQuaternionMsg, True),
+        ('euler_msg', 'quaternion_dict', pose_quaternionDictFromEulerMsg, True),
+        ('quaternion_dict', 'euler_msg', pose_eulerMsgFromQuaternionDict, True),
+        ('euler_dict', 'quaternion_msg', pose_quaternionMsgFromEulerDict, True),
+        ('quaternion_dict', 'tf', pose_tfFromQuaternionDict, False),
+        ('quaternion_msg', 'tf', pose_tfFromQuaternionMsg, False),
+        ('tf', 'quaternion_dict', unpack(pose_quaternionDictFromTf), False),
+        ('tf', 'quaternion_msg', unpack(pose_quaternionMsgFromTf), False)]:
+    conversions.register('pose', source, target, function, uses_form)
+conversions.register('pose', 'euler_dict', 'quaternion_dict', pose_quaternionDictFromEulerDict, True,
+                     batch=pose_quaternionDictsFromEulerDicts)
+conversions.register('pose', 'euler_dict', 'tf',
+                     lambda dct, form: (position_tfFromDict(dct['position']),
+                                        tf_from_wxyz(transformations.quaternion_from_euler(dct['orientation']['x'],dct['orientation']['y'],dct['orientation']['z'],form))), True,
+                     batch=pose_tfListFromEulerDicts)
+
+def convert(kind, value, source, target, form='sxyz'):
+    '''e.g. convert('pose', msg, 'quaternion_msg', 'euler_dict')'''
+    return conversions.convert(kind, value, source, target, form)
+
+def convert_many(kind, values, source, target, form='sxyz'):
+    return conversions.convert_many(kind, values, source, target, form)
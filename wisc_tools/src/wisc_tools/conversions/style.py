@@ -1,4 +1,8 @@
-from std_msgs.msg import ColorRGBA
+import numpy as np
+from wisc_tools.convenience.lazy import LazyModule
+
+# std_msgs is resolved through the ROS adapter, so stand-ins work here too
+ros = LazyModule('wisc_tools.adapters.ros')
 
 #===============================================================================
 #       Color Message Conversion
@@ -7,7 +11,105 @@ from std_msgs.msg import ColorRGBA
 def color_msgFromDict(dct):
     # assuming range from 0 to 1
     alpha = dct['a'] if 'a' in dct.keys() else 1
-    return ColorRGBA(r=dct['r'],g=dct['g'],b=dct['b'],a=alpha)
+    return ros.std_msgs.ColorRGBA(r=dct['r'],g=dct['g'],b=dct['b'],a=alpha)
 
 def color_dictFromMsg(msg):
     return { 'r': msg.r, 'g': msg.g, 'b': msg.b, 'a': msg.a }
+
+#===============================================================================
+#       Colormaps
+#===============================================================================
+
+def rgb_fromHex(value):
+    value = value.lstrip('#')
+    return [int(value[i:i+2],16)/255.0 for i in (0,2,4)]
+
+class Colormap(object):
+    '''
+    Colormap Class.
+    Precomputed (size,4) RGBA lookup table interpolated from (position, '#rrggbb')
+    stops. Scalars are normalized to [vmin,vmax] and binned into the table, so
+    coloring N values is one index operation.
+    '''
+    def __init__(self,name,stops,size=256):
+        self.name = name
+        self.size = size
+        positions = np.array([position for position,_ in stops],dtype=float)
+        colors = np.array([rgb_fromHex(color) for _,color in stops])
+        samples = np.linspace(positions[0],positions[-1],size)
+        self.lut = np.ones((size,4))
+        for channel in range(3):
+            self.lut[:,channel] = np.interp(samples,positions,colors[:,channel])
+        self.bad = np.zeros(4)
+
+    def __len__(self):
+        return self.size
+
+    def indices(self,values,vmin=None,vmax=None):
+        values = np.asarray(values,dtype=float)
+        finite = np.isfinite(values)
+        if vmin is None:
+            vmin = values[finite].min() if finite.any() else 0.0
+        if vmax is None:
+            vmax = values[finite].max() if finite.any() else 1.0
+        span = vmax - vmin if vmax > vmin else 1.0
+        scaled = (np.where(finite,values,vmin) - vmin) * ((self.size - 1) / span)
+        return np.clip(np.rint(scaled),0,self.size - 1).astype(np.intp),finite
+
+    def rgba(self,values,vmin=None,vmax=None,alpha=None):
+        '''
+        (N,4) RGBA array for N scalars. vmin/vmax default to the finite data
+        range; non-finite values get the fully transparent `bad` color.
+        '''
+        indices,finite = self.indices(values,vmin,vmax)
+        colors = self.lut[indices]
+        if alpha is not None:
+            colors[...,3] = alpha
+        if not finite.all():
+            colors[~finite] = self.bad
+        return colors
+
+# Plotly's Viridis scale, which the web interface colored future paths with
+VIRIDIS = Colormap('viridis',[(index*16/255.0 if index < 16 else 1.0,color) for index,color in enumerate([
+    '#440154','#48186a','#472d7b','#424086','#3b528b','#33638d','#2c728e','#26828e',
+    '#21918c','#1fa088','#28ae80','#3fbc73','#5ec962','#84d44b','#addc30','#d8e219','#fde725'])])
+
+GREYS = Colormap('greys',[(0.0,'#000000'),(1.0,'#ffffff')])
+
+colormaps = {colormap.name:colormap for colormap in (VIRIDIS,GREYS)}
+
+def register_colormap(name,stops,size=256):
+    # Stored lowercase, since get_colormap looks names up case-insensitively
+    colormaps[name.lower()] = Colormap(name,stops,size)
+    return colormaps[name.lower()]
+
+def get_colormap(colormap):
+    if isinstance(colormap,Colormap):
+        return colormap
+    try:
+        return colormaps[colormap.lower()]
+    except KeyError:
+        raise LookupError('Unknown colormap {0}, expected one of {1}'.format(colormap,sorted(colormaps)))
+
+#===============================================================================
+#       Batched Color Conversion
+#===============================================================================
+
+def color_rgbaFromValues(values,colormap='viridis',vmin=None,vmax=None,alpha=None):
+    return get_colormap(colormap).rgba(values,vmin,vmax,alpha)
+
+def color_msgsFromRGBA(rgba):
+    ColorRGBA = ros.std_msgs.ColorRGBA
+    return [ColorRGBA(r=r,g=g,b=b,a=a) for r,g,b,a in np.asarray(rgba,dtype=float).reshape(-1,4).tolist()]
+
+def color_fillMsgsFromRGBA(msgs,rgba):
+    # Overwrites existing messages, e.g. a Marker's colors, instead of allocating
+    for msg,(r,g,b,a) in zip(msgs,np.asarray(rgba,dtype=float).reshape(-1,4).tolist()):
+        msg.r, msg.g, msg.b, msg.a = r, g, b, a
+    return msgs
+
+def color_dictsFromRGBA(rgba):
+    return [{'r':r,'g':g,'b':b,'a':a} for r,g,b,a in np.asarray(rgba,dtype=float).reshape(-1,4).tolist()]
+
+def color_msgsFromValues(values,colormap='viridis',vmin=None,vmax=None,alpha=None):
+    return color_msgsFromRGBA(color_rgbaFromValues(values,colormap,vmin,vmax,alpha))
@@ -0,0 +1,293 @@
+'''
+A local, tf-style frame tree with time-interpolated lookups.
+
+Each parent->child edge keeps its recent stamped transforms in a ring buffer.
+Lookups walk the tree to the common ancestor, interpolating every edge at the
+requested stamp (lerp for translation, slerp for rotation), and cache the frame
+path. Results that do not depend on a stamp, the latest transform (stamp=None)
+or a path of static edges only, are cached too and reused until one of the
+edges they depend on receives a new transform. Stamped lookups at control rate
+rarely repeat a stamp, so caching them would only churn the cache.
+
+Transforms are (translation, rotation) pairs with [w,x,y,z] quaternions, as in
+wisc_tools.structures. lookup(target, source) maps coordinates expressed in
+source into target, like tf's lookupTransform(target, source, time).
+'''
+from collections import OrderedDict
+import math
+import threading
+import numpy as np
+from wisc_tools.structures import Position, Quaternion, Pose
+from wisc_tools.structures.vectorized import rotate_vectors
+
+class ExtrapolationError(LookupError):
+    pass
+
+# Single transforms are chained as plain float tuples: for 3- and 4-vectors
+# this is several times faster than per-call NumPy overhead
+
+IDENTITY = ((0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0))
+
+def multiply(a, b):
+    return (a[0]*b[0] - a[1]*b[1] - a[2]*b[2] - a[3]*b[3],
+            a[0]*b[1] + a[1]*b[0] + a[2]*b[3] - a[3]*b[2],
+            a[0]*b[2] - a[1]*b[3] + a[2]*b[0] + a[3]*b[1],
+            a[0]*b[3] + a[1]*b[2] - a[2]*b[1] + a[3]*b[0])
+
+def rotate(q, v):
+    w, x, y, z = q
+    tx = 2.0 * (y*v[2] - z*v[1])
+    ty = 2.0 * (z*v[0] - x*v[2])
+    tz = 2.0 * (x*v[1] - y*v[0])
+    return (v[0] + w*tx + y*tz - z*ty,
+            v[1] + w*ty + z*tx - x*tz,
+            v[2] + w*tz + x*ty - y*tx)
+
+def compose(first, second):
+    '''first * second, i.e. apply second in first's frame'''
+    offset = rotate(first[1], second[0])
+    return ((first[0][0] + offset[0], first[0][1] + offset[1], first[0][2] + offset[2]),
+            multiply(first[1], second[1]))
+
+def invert(transform):
+    w, x, y, z = transform[1]
+    rotation = (w, -x, -y, -z)
+    offset = rotate(rotation, transform[0])
+    return (-offset[0], -offset[1], -offset[2]), rotation
+
+def slerp(q0, q1, fraction):
+    # Scalar counterpart of structures.vectorized.slerp
+    dot = sum(a*b for a, b in zip(q0, q1))
+    if dot < 0:
+        q1 = tuple(-value for value in q1)
+        dot = -dot
+    if dot > 0.9995:
+        w0, w1 = 1.0 - fraction, fraction
+    else:
+        theta = math.acos(min(dot, 1.0))
+        w0 = math.sin((1.0 - fraction) * theta) / math.sin(theta)
+        w1 = math.sin(fraction * theta) / math.sin(theta)
+    result = [w0*a + w1*b for a, b in zip(q0, q1)]
+    norm = math.sqrt(sum(value*value for value in result))
+    return tuple(value / norm for value in result)
+
+class EdgeBuffer(object):
+    '''
+    EdgeBuffer Class.
+    Ring buffer of stamped transforms for one parent->child edge. Every sample
+    is written twice, at i and i+capacity, so the live window is always one
+    contiguous, time-sorted slice.
+    '''
+    def __init__(self, capacity=256, static=False):
+        self.capacity = capacity
+        self.static = static
+        self.stamps = np.empty(2 * capacity)
+        self.translations = np.empty((2 * capacity, 3))
+        self.rotations = np.empty((2 * capacity, 4))
+        self.start = 0
+        self.count = 0
+        self.version = 0
+
+    def __len__(self):
+        return self.count
+
+    def window(self):
+        stop = self.start + self.count
+        return self.stamps[self.start:stop], self.translations[self.start:stop], self.rotations[self.start:stop]
+
+    @property
+    def latest(self):
+        return self.stamps[self.start + self.count - 1]
+
+    @property
+    def earliest(self):
+        return self.stamps[self.start]
+
+    def __write__(self, index, stamp, translation, rotation):
+        for slot in (index % self.capacity, index % self.capacity + self.capacity):
+            self.stamps[slot] = stamp
+            self.translations[slot] = translation
+            self.rotations[slot] = rotation
+
+    def insert(self, stamp, translation, rotation):
+        rotation = np.asarray(rotation, dtype=float)
+        rotation = rotation / math.sqrt(rotation.dot(rotation))
+        if self.static:
+            self.start = 0
+            self.count = 1
+            self.__write__(0, stamp, translation, rotation)
+        elif self.count == 0 or stamp > self.latest:
+            if self.count == self.capacity:
+                self.start = (self.start + 1) % self.capacity
+                self.count -= 1
+            self.__write__(self.start + self.count, stamp, translation, rotation)
+            self.count += 1
+        else:
+            # Late or repeated stamps are rare, so they rebuild the window
+            stamps, translations, rotations = [array.copy() for array in self.window()]
+            position = int(np.searchsorted(stamps, stamp, side='left'))
+            replace = position < len(stamps) and stamps[position] == stamp
+            if not replace and position == 0 and self.count == self.capacity:
+                # Older than everything kept in a full buffer
+                return
+            stamps = np.insert(np.delete(stamps, position) if replace else stamps, position, stamp)
+            translations = np.insert(np.delete(translations, position, axis=0) if replace else translations, position, translation, axis=0)
+            rotations = np.insert(np.delete(rotations, position, axis=0) if replace else rotations, position, rotation, axis=0)
+            keep = slice(max(0, len(stamps) - self.capacity), None)
+            self.start = 0
+            self.count = 0
+            for values in zip(stamps[keep], translations[keep], rotations[keep]):
+                self.__write__(self.count, *values)
+                self.count += 1
+        self.version += 1
+
+    def sample(self, stamp):
+        if self.count == 0:
+            raise LookupError('Edge has no transforms yet')
+        stamps, translations, rotations = self.window()
+        if self.static or stamp is None:
+            return tuple(translations[-1].tolist()), tuple(rotations[-1].tolist())
+        if stamp < stamps[0] or stamp > stamps[-1]:
+            raise ExtrapolationError('Stamp {0} is outside the buffered range [{1}, {2}]'.format(stamp, stamps[0], stamps[-1]))
+        index = min(int(np.searchsorted(stamps, stamp, side='right')) - 1, self.count - 2)
+        if index < 0:
+            return tuple(translations[0].tolist()), tuple(rotations[0].tolist())
+        t0, t1 = stamps[index], stamps[index + 1]
+        fraction = float((stamp - t0) / (t1 - t0)) if t1 > t0 else 0.0
+        p0, p1 = translations[index].tolist(), translations[index + 1].tolist()
+        translation = tuple(a + fraction * (b - a) for a, b in zip(p0, p1))
+        return translation, slerp(rotations[index].tolist(), rotations[index + 1].tolist(), fraction)
+
+class TransformBuffer(object):
+    '''
+    TransformBuffer Class.
+    Frame tree of EdgeBuffers. Each frame has at most one parent; setting a
+    transform for a child under a new parent re-parents it.
+    '''
+    def __init__(self, capacity=256, cache_size=128):
+        self.capacity = capacity
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+        self.parents = {}
+        self.edges = {}
+        self.paths = {}
+        self.results = OrderedDict()
+
+    @property
+    def frames(self):
+        with self.lock:
+            return set(self.parents.keys()) | set(self.parents.values())
+
+    def set_transform(self, parent, child, stamp, translation, rotation, static=False):
+        '''Records child's pose in parent at stamp; rotation is [w,x,y,z]'''
+        with self.lock:
+            if self.parents.get(child) != parent:
+                if parent == child or child in self.__ancestors__(parent):
+                    raise ValueError('{0} -> {1} would make the frame tree cyclic'.format(parent, child))
+                self.parents[child] = parent
+                self.edges[child] = EdgeBuffer(self.capacity, static)
+                # Topology changed, so every cached path is suspect
+                self.paths = {}
+                self.results.clear()
+            elif self.edges[child].static != static:
+                # A static edge keeps one transform and a dynamic one a history, so start over.
+                # Versions restart too, so no cached result may survive
+                self.edges[child] = EdgeBuffer(self.capacity, static)
+                self.results.clear()
+            self.edges[child].insert(stamp if not static else 0.0, np.asarray(translation, dtype=float), rotation)
+
+    def set_static_transform(self, parent, child, translation, rotation):
+        self.set_transform(parent, child, 0.0, translation, rotation, static=True)
+
+    def set_pose(self, parent, child, stamp, pose, static=False):
+        self.set_transform(parent, child, stamp,
+                           [pose.position.x, pose.position.y, pose.position.z],
+                           [pose.quaternion.w, pose.quaternion.x, pose.quaternion.y, pose.quaternion.z],
+                           static)
+
+    def __ancestors__(self, frame):
+        chain = []
+        while frame in self.parents:
+            frame = self.parents[frame]
+            chain.append(frame)
+        return chain
+
+    def __path__(self, target, source):
+        '''(edges from source up to the common ancestor, edges from target up to it)'''
+        path = self.paths.get((target, source))
+        if path is None:
+            source_chain = [source] + self.__ancestors__(source)
+            target_chain = [target] + self.__ancestors__(target)
+            common = next((frame for frame in source_chain if frame in target_chain), None)
+            if common is None:
+                raise LookupError('{0} and {1} are not connected'.format(target, source))
+            path = (source_chain[:source_chain.index(common)], target_chain[:target_chain.index(common)])
+            self.paths[(target, source)] = path
+        return path
+
+    def latest_common_time(self, target, source):
+        with self.lock:
+            up, down = self.__path__(target, source)
+            stamps = [self.edges[frame].latest for frame in up + down if not self.edges[frame].static]
+            return min(stamps) if stamps else None
+
+    def lookup(self, target, source, stamp=None):
+        '''
+        Transform taking coordinates in source into target at stamp, as
+        (translation, [w,x,y,z] rotation). stamp=None uses the latest time
+        every edge on the path can provide. The arrays are read-only, since
+        they may be shared with the result cache.
+        '''
+        with self.lock:
+            up, down = self.__path__(target, source)
+            edges = [self.edges[frame] for frame in up + down]
+            cacheable = stamp is None or all(edge.static for edge in edges)
+            if cacheable:
+                versions = tuple(edge.version for edge in edges)
+                key = (target, source)
+                cached = self.results.get(key)
+                if cached is not None and cached[0] == versions:
+                    self.results.move_to_end(key)
+                    return cached[1]
+            if stamp is None:
+                stamp = self.latest_common_time(target, source)
+            # ancestor <- source, composed from the top down
+            from_source = IDENTITY
+            for frame in reversed(up):
+                from_source = compose(from_source, self.edges[frame].sample(stamp))
+            from_target = IDENTITY
+            for frame in reversed(down):
+                from_target = compose(from_target, self.edges[frame].sample(stamp))
+            translation, rotation = compose(invert(from_target), from_source)
+            transform = (np.array(translation), np.array(rotation))
+            for array in transform:
+                array.setflags(write=False)
+            if cacheable:
+                self.results[key] = (versions, transform)
+                if len(self.results) > self.cache_size:
+                    self.results.popitem(last=False)
+            return transform
+
+    def lookup_matrix(self, target, source, stamp=None):
+        from wisc_tools.conversions import transformations
+        translation, rotation = self.lookup(target, source, stamp)
+        matrix = transformations.quaternion_matrix(rotation)
+        matrix[:3, 3] = translation
+        return matrix
+
+    def lookup_pose(self, target, source, stamp=None):
+        translation, rotation = self.lookup(target, source, stamp)
+        return Pose(Position(*[float(value) for value in translation]), Quaternion.from_vector_quaternion(rotation))
+
+    def transform_pose(self, target, source, pose, stamp=None):
+        '''Re-expresses a Pose given in source in target'''
+        translation, rotation = self.lookup(target, source, stamp)
+        transform = compose((tuple(translation), tuple(rotation)),
+                            ((pose.position.x, pose.position.y, pose.position.z),
+                             (pose.quaternion.w, pose.quaternion.x, pose.quaternion.y, pose.quaternion.z)))
+        return Pose(Position(*[float(value) for value in transform[0]]), Quaternion.from_vector_quaternion(transform[1]))
+
+    def transform_points(self, target, source, points, stamp=None):
+        '''Re-expresses (N,3) points given in source in target'''
+        translation, rotation = self.lookup(target, source, stamp)
+        return rotate_vectors(rotation, np.asarray(points, dtype=float)) + translation
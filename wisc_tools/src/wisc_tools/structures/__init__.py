@@ -1,3 +1,5 @@
-__all__ = ["Mode","Position","Pose","Quaternion","ModeTrajectory","AnnotationTrajectory","PoseTrajectory","AnnotationTrajectory","ModeTrajectory"]
+__all__ = ["Mode","Position","Pose","Quaternion","ModeTrajectory","AnnotationTrajectory","PoseTrajectory","AnnotationTrajectory","ModeTrajectory","PoseTrajectoryStack","PoseArray","PoseIndex","WaypointColumns","slerp","quaternions_from_euler"]
 
 from .structures import *
+from .vectorized import PoseTrajectoryStack, PoseArray, slerp, quaternions_from_euler
+from .index import PoseIndex
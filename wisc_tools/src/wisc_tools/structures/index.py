@@ -0,0 +1,91 @@
+from collections import namedtuple
+import numpy as np
+from wisc_tools.convenience.lazy import LazyModule
+from wisc_tools.structures.vectorized import PoseArray, quaternion_distances
+
+spatial = LazyModule('scipy.spatial')
+
+# One query result; distances follow Pose.distance_to's (spatial,rotational) split
+Match = namedtuple('Match',['key','index','spatial','rotational'])
+
+class PoseIndex(object):
+    '''
+    PoseIndex Class.
+    KD-tree over pose positions with exact quaternion-distance refinement.
+    Matches are ranked by spatial + rotation_weight * rotational distance.
+    The tree is built on the first query.
+    '''
+    def __init__(self,positions,quaternions,keys=None,rotation_weight=0.0,leafsize=16):
+        self.poses = PoseArray(positions,quaternions)
+        self.keys = list(keys) if keys is not None else list(range(len(self.poses)))
+        assert len(self.keys) == len(self.poses)
+        self.rotation_weight = rotation_weight
+        self.leafsize = leafsize
+        self.tree = None
+
+    @classmethod
+    def from_poses(cls,poses,keys=None,**kwargs):
+        poses = PoseArray.coerce(poses)
+        return cls(poses.positions,poses.quaternions,keys,**kwargs)
+
+    @classmethod
+    def from_catalog(cls,named_poses,**kwargs):
+        '''Indexes one arm's {name: {'pose','default'}} entries, keyed by name'''
+        names = list(named_poses.keys())
+        return cls.from_poses([named_poses[name]['pose'] for name in names],names,**kwargs)
+
+    @classmethod
+    def from_trajectory(cls,trajectory,**kwargs):
+        '''Indexes a PoseTrajectory's waypoints, keyed by waypoint time'''
+        return cls(trajectory.positions,trajectory.quaternions,trajectory.times.tolist(),**kwargs)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self,index):
+        return self.poses[index]
+
+    def __build__(self):
+        if self.tree is None:
+            self.tree = spatial.cKDTree(self.poses.positions,leafsize=self.leafsize)
+        return self.tree
+
+    def __matches__(self,query,indices):
+        indices = np.asarray(indices,dtype=int)
+        distances = np.linalg.norm(self.poses.positions[indices] - query.positions[0],axis=-1)
+        rotations = quaternion_distances(self.poses.quaternions[indices],query.quaternions[0])
+        scores = distances + self.rotation_weight * rotations if self.rotation_weight else distances
+        order = np.argsort(scores,kind='stable')
+        return indices[order],distances[order],rotations[order],scores[order]
+
+    def __results__(self,indices,distances,rotations):
+        return [Match(self.keys[index],int(index),float(distance),float(rotation))
+                for index,distance,rotation in zip(indices,distances,rotations)]
+
+    def nearest(self,pose,k=1):
+        '''The k best matches for pose, best first'''
+        query = PoseArray.coerce(pose)
+        k = min(k,len(self))
+        if k == 0:
+            return []
+        tree = self.__build__()
+        candidates = k if not self.rotation_weight else min(len(self),4*k)
+        distances,indices = tree.query(query.positions[0],k=candidates)
+        indices,distances,rotations,scores = self.__matches__(query,np.atleast_1d(indices))
+        # Every unseen pose is at least the farthest candidate away in space,
+        # so the top k are final once the kth score is within that distance
+        if candidates < len(self) and scores[k-1] > distances.max():
+            # Anything that could still beat the kth score lies inside this radius
+            indices = tree.query_ball_point(query.positions[0],scores[k-1])
+            indices,distances,rotations,scores = self.__matches__(query,indices)
+        return self.__results__(indices[:k],distances[:k],rotations[:k])
+
+    def within(self,pose,radius,max_rotation=None):
+        '''All matches within radius in space (and max_rotation, if given), best first'''
+        query = PoseArray.coerce(pose)
+        indices = self.__build__().query_ball_point(query.positions[0],radius)
+        indices,distances,rotations,scores = self.__matches__(query,indices)
+        if max_rotation is not None:
+            keep = rotations <= max_rotation
+            indices,distances,rotations = indices[keep],distances[keep],rotations[keep]
+        return self.__results__(indices,distances,rotations)
@@ -0,0 +1,86 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from wisc_tools.structures.structures import PoseTrajectory
+
+# Each waypoint is stored as one float64 row: time, x, y, z, qw, qx, qy, qz
+COLUMNS = 8
+
+def pack(times,positions,quaternions):
+    return np.column_stack([np.asarray(times,dtype=float),np.asarray(positions,dtype=float),np.asarray(quaternions,dtype=float)])
+
+def resample_times(times,period):
+    count = int(np.floor((times[-1] - times[0]) / period + 1e-9)) + 1
+    return times[0] + period * np.arange(count)
+
+def _fit_worker(args):
+    (input_name,input_rows,output_name,output_rows,start,stop,out_start,period,kind) = args
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    output_memory = shared_memory.SharedMemory(name=output_name)
+    try:
+        source = np.ndarray((input_rows,COLUMNS),dtype=float,buffer=input_memory.buf)[start:stop]
+        trajectory = PoseTrajectory.from_arrays(source[:,0],source[:,1:4],source[:,4:8],kind=kind)
+        times = resample_times(source[:,0],period)
+        positions,quaternions = trajectory.sample(times)
+        target = np.ndarray((output_rows,COLUMNS),dtype=float,buffer=output_memory.buf)
+        target[out_start:out_start+len(times)] = pack(times,positions,quaternions)
+        del source, target
+    finally:
+        input_memory.close()
+        output_memory.close()
+    return len(times)
+
+def fit_trajectories(demonstrations,period,kind='slinear',max_workers=None,arrays=True):
+    '''
+    Fits and resamples many recorded demonstrations at a fixed period across a
+    process pool. Waypoints travel to the workers through one shared memory
+    block and results come back through another, so no Pose objects are pickled.
+
+    demonstrations is a list of PoseTrajectory objects or (times, positions,
+    quaternions) array tuples. Returns the resampled (times, positions,
+    quaternions) tuples, or PoseTrajectory objects when arrays is False. Fitting
+    those happens serially in this process, so only ask for them when needed
+    '''
+    packed = []
+    for demonstration in demonstrations:
+        if isinstance(demonstration,PoseTrajectory):
+            packed.append(pack(demonstration.times,demonstration.positions,demonstration.quaternions))
+        else:
+            packed.append(pack(*demonstration))
+    input_rows = sum([len(rows) for rows in packed])
+    output_counts = [len(resample_times(rows[:,0],period)) for rows in packed]
+    output_rows = sum(output_counts)
+
+    input_memory = shared_memory.SharedMemory(create=True,size=max(input_rows,1)*COLUMNS*8)
+    output_memory = shared_memory.SharedMemory(create=True,size=max(output_rows,1)*COLUMNS*8)
+    try:
+        source = np.ndarray((input_rows,COLUMNS),dtype=float,buffer=input_memory.buf)
+        tasks = []
+        start = 0
+        out_start = 0
+        for rows,count in zip(packed,output_counts):
+            source[start:start+len(rows)] = rows
+            tasks.append((input_memory.name,input_rows,output_memory.name,output_rows,start,start+len(rows),out_start,period,kind))
+            start += len(rows)
+            out_start += count
+        del source
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_fit_worker,tasks))
+        # Copy out before the shared block is released
+        results = np.ndarray((output_rows,COLUMNS),dtype=float,buffer=output_memory.buf).copy()
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+
+    fitted = []
+    out_start = 0
+    for count in output_counts:
+        rows = results[out_start:out_start+count]
+        out_start += count
+        if arrays:
+            fitted.append((rows[:,0],rows[:,1:4],rows[:,4:8]))
+        else:
+            fitted.append(PoseTrajectory.from_arrays(rows[:,0],rows[:,1:4],rows[:,4:8],kind=kind))
+    return fitted
@@ -0,0 +1,100 @@
+'''
+Binary trajectory files.
+
+Layout (little endian):
+    header   magic 'WTRJ', version, trajectory type, value width, waypoint count,
+             data offset, side table offset, side table length
+    data     float64 times[count], then float64 values[count, width]
+             (x, y, z, qw, qx, qy, qz for poses; the mode value for modes)
+    table    utf-8 JSON with the interpolation kind and any annotations
+
+The data block starts on a 64 byte boundary so it can be memory-mapped directly.
+'''
+
+import json
+import struct
+import numpy as np
+from wisc_tools.structures.structures import PoseTrajectory, ModeTrajectory, AnnotationTrajectory
+
+MAGIC = b'WTRJ'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQQQ')
+ALIGNMENT = 64
+
+POSE = 0
+MODE = 1
+ANNOTATION = 2
+
+def __align__(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def save_trajectory(path,trajectory):
+    table = {'kind':trajectory.kind}
+    if isinstance(trajectory,PoseTrajectory):
+        kind = POSE
+        times = trajectory.times
+        values = np.column_stack([trajectory.positions,trajectory.quaternions])
+    elif isinstance(trajectory,ModeTrajectory):
+        kind = MODE
+        times = trajectory.times
+        values = trajectory.values.reshape(-1,1)
+    elif isinstance(trajectory,AnnotationTrajectory):
+        kind = ANNOTATION
+        times = np.array(trajectory.times,dtype=float)
+        values = np.zeros((len(times),0))
+        table['annotations'] = list(trajectory.annotations)
+    else:
+        raise TypeError('Cannot save {0}'.format(type(trajectory).__name__))
+    times = np.ascontiguousarray(times,dtype='<f8')
+    values = np.ascontiguousarray(values,dtype='<f8')
+    count,width = values.shape
+    data_offset = __align__(HEADER.size)
+    table_offset = data_offset + times.nbytes + values.nbytes
+    encoded = json.dumps(table).encode('utf-8')
+    with open(path,'wb') as f:
+        f.write(HEADER.pack(MAGIC,VERSION,kind,width,count,data_offset,table_offset,len(encoded)))
+        f.write(b'\0' * (data_offset - HEADER.size))
+        f.write(times.tobytes())
+        f.write(values.tobytes())
+        f.write(encoded)
+
+def read_header(path):
+    with open(path,'rb') as f:
+        raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise ValueError('{0} is not a trajectory file'.format(path))
+        (magic,version,kind,width,count,data_offset,table_offset,table_length) = HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a trajectory file'.format(path))
+        if version != VERSION:
+            raise ValueError('{0} uses trajectory format version {1}, expected {2}'.format(path,version,VERSION))
+        f.seek(table_offset)
+        table = json.loads(f.read(table_length).decode('utf-8'))
+    return {'type':kind,'width':width,'count':count,'data_offset':data_offset,'table':table}
+
+def open_columns(path):
+    '''
+    Memory-maps the time and value columns of a trajectory file. The arrays are
+    read-only and backed by the page cache, so they are shared between processes
+    '''
+    header = read_header(path)
+    count = header['count']
+    times = np.memmap(path,dtype='<f8',mode='r',offset=header['data_offset'],shape=(count,))
+    if header['width'] > 0:
+        values = np.memmap(path,dtype='<f8',mode='r',offset=header['data_offset']+count*8,shape=(count,header['width']))
+    else:
+        values = np.zeros((count,0))
+    return header,times,values
+
+def open_trajectory(path):
+    header,times,values = open_columns(path)
+    kind = header['table']['kind']
+    if header['type'] == POSE:
+        return PoseTrajectory.from_arrays(times,values[:,0:3],values[:,3:7],kind=kind)
+    elif header['type'] == MODE:
+        return ModeTrajectory.from_arrays(times,values[:,0],kind=kind)
+    elif header['type'] == ANNOTATION:
+        waypoints = [{'time':float(time),'annotation':annotation} for time,annotation in zip(times,header['table']['annotations'])]
+        return AnnotationTrajectory(waypoints,kind=kind)
+    else:
+        raise ValueError('{0} holds an unknown trajectory type {1}'.format(path,header['type']))
@@ -1,16 +1,16 @@
 import numpy as np
 import math
-from scipy import interpolate
 from pyquaternion import Quaternion as pyQuaternion
-from wisc_tools.convenience import pairwise
-from wisc_tools.conversions import transformations
-from wisc_msgs.msg import Euler, EulerPose, EEPoseGoals
-from geometry_msgs.msg import Vector3 as rosVector3
-from geometry_msgs.msg import Point as rosPoint
-from geometry_msgs.msg import Quaternion as rosQuaternion
-from geometry_msgs.msg import Pose as rosPose
+from wisc_tools.convenience.lazy import LazyModule
+from wisc_tools.structures.vectorized import slerp
 from abc import abstractmethod
-import json
+from bisect import bisect_left, bisect_right
+
+# Deferred until a fit or Euler conversion actually needs them
+interpolate = LazyModule('scipy.interpolate')
+transformations = LazyModule('wisc_tools.conversions.transformations')
+# ROS message conversions live in an optional adapter
+ros = LazyModule('wisc_tools.adapters.ros')
 
 class Mode(object):
     '''
@@ -44,11 +44,14 @@ class Position(object):
 
     @property
     def ros_vector3(self):
-        return rosVector3(x=self.x,y=self.y,z=self.z)
+        return ros.ros_vector3(self)
 
     @property
     def ros_point(self):
-        return rosPoint(x=self.x,y=self.y,z=self.z)
+        return ros.ros_point(self)
+
+    def fill_ros_point(self,msg):
+        return ros.fill_ros_point(msg,self)
 
     @property
     def array(self):
@@ -60,14 +63,17 @@ class Position(object):
 
     @classmethod
     def from_ros_vector3(cls,vector3):
-        return Position(x=vector3.x,y=vector3.y,z=vector3.z)
+        return ros.from_ros_vector3(vector3)
 
     @classmethod
     def from_ros_point(cls,point):
-        return Position(x=point.x,y=point.y,z=point.z)
+        return ros.from_ros_point(point)
 
     def distance_to(self,other):
-        return math.sqrt(math.pow(self.x-other.x,2)+math.pow(self.y-other.y,2)+math.pow(self.z-other.z,2))
+        dx = self.x-other.x
+        dy = self.y-other.y
+        dz = self.z-other.z
+        return math.sqrt(dx*dx+dy*dy+dz*dz)
 
     def __repr__(self):
         return '[x:{0},y:{1},z:{2}]'.format(self.x,self.y,self.z)
@@ -76,12 +82,14 @@ class Quaternion(pyQuaternion):
 
     @property
     def ros_quaternion(self):
-        return rosQuaternion(x=self.x,y=self.y,z=self.z,w=self.w)
+        return ros.ros_quaternion(self)
+
+    def fill_ros_quaternion(self,msg):
+        return ros.fill_ros_quaternion(msg,self)
 
     @property
     def ros_euler(self):
-        (r,p,y) = transformations.euler_from_quaternion([self.w,self.x,self.y,self.z],'szxy')
-        return Euler(r=r,p=p,y=y)
+        return ros.ros_euler(self)
 
     @property
     def dict(self):
@@ -98,12 +106,11 @@ class Quaternion(pyQuaternion):
 
     @classmethod
     def from_ros_quaternion(self,quaternion):
-        return Quaternion(x=quaternion.x,y=quaternion.y,z=quaternion.z,w=quaternion.w)
+        return ros.from_ros_quaternion(quaternion)
 
     @classmethod
     def from_ros_euler(self,euler):
-        tf_quat = transformations.quaternion_from_euler(euler.r,euler.p,euler.y,'szxy')
-        return Quaternion.from_vector_quaternion(tf_quat)
+        return ros.from_ros_euler(euler)
 
     @classmethod
     def from_euler_dict(self,dict):
@@ -120,15 +127,18 @@ class Pose(object):
 
     @property
     def ros_pose(self):
-        return rosPose(position=self.position.ros_point,orientation=self.quaternion.ros_quaternion)
+        return ros.ros_pose(self)
+
+    def fill_ros_pose(self,msg):
+        return ros.fill_ros_pose(msg,self)
 
     @property
     def ros_eulerpose(self):
-        return EulerPose(position=self.position.ros_point,orientation=self.orientation.ros_euler)
+        return ros.ros_eulerpose(self)
 
     @classmethod
     def from_ros_eulerpose(self,eulerpose):
-        pass
+        return ros.from_ros_eulerpose(eulerpose)
 
     @classmethod
     def from_eulerpose_dict(cls,dict):
@@ -144,7 +154,7 @@ class Pose(object):
 
     @classmethod
     def from_ros_pose(self,pose):
-        return Pose(position=Position.from_ros_point(pose.position),orientation=Quaternion.from_ros_quaternion(pose.orientation))
+        return ros.from_ros_pose(pose)
 
     @property
     def dict(self):
@@ -156,6 +166,55 @@ class Pose(object):
     def __repr__(self):
         return '({0}, {1})'.format(self.position,self.quaternion)
 
+class WaypointColumns(object):
+    '''
+    WaypointColumns Class.
+    Read-only waypoint list backed by time, position and [w,x,y,z] quaternion
+    arrays. Waypoint dicts are only built when an index is accessed
+    '''
+    def __init__(self,times,positions,quaternions):
+        assert len(times) == len(positions) == len(quaternions)
+        self.times = times
+        self.positions = positions
+        self.quaternions = quaternions
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        position = self.positions[index]
+        pose = Pose(Position(float(position[0]),float(position[1]),float(position[2])),
+                    Quaternion.from_vector_quaternion([float(v) for v in self.quaternions[index]]))
+        return {'time':float(self.times[index]),'pose':pose}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class ModeColumns(object):
+    '''
+    ModeColumns Class.
+    Read-only waypoint list backed by time and mode value arrays
+    '''
+    def __init__(self,times,values):
+        assert len(times) == len(values)
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {'time':float(self.times[index]),'mode':float(self.values[index])}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
 class Trajectory(object):
 
     def __init__(self,waypoints,kind='slinear',circuit=False,min_value=None,max_value=None):
@@ -186,6 +245,20 @@ class Trajectory(object):
         else:
             return vals + [vals[-1],vals[-1],vals[-1]]
 
+    def __pad_times__(self,times):
+        # Array version of the padding applied by t
+        if len(times) < 4:
+            return np.concatenate([times[0]+np.array([-20.0,-15.0,-10.0,-5.0]),times,times[-1]+np.array([5.0,10.0,15.0])])
+        else:
+            return np.concatenate([times,times[-1]+np.array([5.0,10.0,15.0])])
+
+    def __pad_rows__(self,rows):
+        # Array version of __pad__, repeating the first and last rows
+        if len(rows) < 4:
+            return np.concatenate([np.repeat(rows[:1],4,axis=0),rows,np.repeat(rows[-1:],3,axis=0)])
+        else:
+            return np.concatenate([rows,np.repeat(rows[-1:],3,axis=0)])
+
     def __iter__(self):
         return self.wps.__iter__()
 
@@ -198,47 +271,217 @@ class Trajectory(object):
         pass
 
     def __repr__(self):
-        return json.dumps(self.wps)
+        # Waypoints may hold Pose objects or millions of rows, so only summarize them
+        if len(self.wps) == 0:
+            return '<{0} empty>'.format(type(self).__name__)
+        return '<{0} {1} waypoints, t={2}..{3}>'.format(type(self).__name__,len(self.wps),self.wps[0]['time'],self.wps[-1]['time'])
+
+    def save(self,path):
+        from wisc_tools.structures import storage
+        storage.save_trajectory(path,self)
+
+    @classmethod
+    def open(cls,path):
+        '''
+        Opens a trajectory written by save(). Pose and mode columns are
+        memory-mapped rather than read into memory
+        '''
+        from wisc_tools.structures import storage
+        trajectory = storage.open_trajectory(path)
+        if not isinstance(trajectory,cls):
+            raise TypeError('{0} holds a {1}, not a {2}'.format(path,type(trajectory).__name__,cls.__name__))
+        return trajectory
+
+# Kinds that hold each value until the next waypoint; these skip interp1d entirely
+STEP_KINDS = ('step','previous','zero')
+# Kinds looked up straight from the waypoint columns, without padded copies or interp1d
+LINEAR_KINDS = ('linear','slinear')
+MODE_KINDS = STEP_KINDS + ('linear','nearest','slinear','quadratic','cubic')
+
+def interpolate_columns(times,values,query,extrapolate=False):
+    '''
+    Piecewise-linear lookup of (N,...) values over (N,) times, giving the same
+    result as interp1d over the padded columns: the last value holds after the
+    end, and the first holds before the start unless extrapolate is set. Only
+    the rows around each query are read, so memory-mapped columns stay paged out
+    '''
+    if np.ndim(query) == 0:
+        # Single lookups skip the array machinery; bisect only touches log N rows
+        if len(times) == 1:
+            return values[0]
+        index = min(max(bisect_right(times,query) - 1,0),len(times) - 2)
+        t0 = times[index]
+        t1 = times[index + 1]
+        fraction = min((query - t0) / (t1 - t0),1.0) if t1 > t0 else 0.0
+        if not extrapolate:
+            fraction = max(fraction,0.0)
+        v0 = values[index]
+        return v0 + fraction * (values[index + 1] - v0)
+    query = np.asarray(query,dtype=float)
+    if len(times) == 1:
+        return np.broadcast_to(values[0],query.shape + values.shape[1:]).copy()
+    # In-place ufuncs and take, since np.clip and fancy indexing cost more than the math here
+    index = np.searchsorted(times,query,side='right') - 1
+    np.maximum(index,0,out=index)
+    np.minimum(index,len(times) - 2,out=index)
+    t0 = np.take(times,index)
+    span = np.take(times,index + 1) - t0
+    span[span <= 0] = np.inf
+    fraction = (query - t0) / span
+    np.minimum(fraction,1.0,out=fraction)
+    if not extrapolate:
+        np.maximum(fraction,0.0,out=fraction)
+    v0 = np.take(values,index,axis=0)
+    result = np.take(values,index + 1,axis=0)
+    result -= v0
+    result *= fraction.reshape(fraction.shape + (1,) * (v0.ndim - fraction.ndim))
+    result += v0
+    return result
 
 class ModeTrajectory(Trajectory):
+    '''
+    ModeTrajectory Class.
+    Scalar mode values over time, clamped to the waypoint range. Step kinds
+    ('step', 'previous' or 'zero') are a zero-order hold answered by a bisect
+    on the waypoint times; the rest go through scipy's interp1d.
+    '''
 
     def __init__(self,waypoints,fill='interpolate',kind='slinear',circuit=False,min_value=None,max_value=None):
-        super(ModeTrajectory,self).__init__(waypoints,kind='slinear',circuit=False,min_value=None,max_value=None)
+        super(ModeTrajectory,self).__init__(waypoints,kind=kind,circuit=False,min_value=None,max_value=None)
+
+    @classmethod
+    def from_arrays(cls,times,values,kind='slinear'):
+        return cls(ModeColumns(np.asarray(times,dtype=float),np.asarray(values,dtype=float)),kind=kind)
+
+    @property
+    def t(self):
+        return self.padded_times.tolist()
 
     @property
     def v(self):
-        return self.__pad__([wp['mode'] for wp in self.wps])
+        return self.padded_values.tolist()
 
-    def __getitem__(self,time):
+    @property
+    def step(self):
+        return self.kind in STEP_KINDS
+
+    @property
+    def minimum(self):
+        return self.__bounds__()[0]
+
+    @property
+    def maximum(self):
+        return self.__bounds__()[1]
+
+    @property
+    def padded_times(self):
+        return self.__padded__()[0]
+
+    @property
+    def padded_values(self):
+        return self.__padded__()[1]
+
+    @property
+    def step_times(self):
+        return self.__steps__()[0]
+
+    @property
+    def step_values(self):
+        return self.__steps__()[1]
+
+    @property
+    def vfn(self):
+        if self.fitted is None:
+            self.fitted = self.__fit__()
+        return self.fitted
+
+    def __wrap__(self,time):
         if self.circuit:
-            start = min(self.t)
+            start = self.padded_times[0]
             time = time - start % (len(self) + start)
-        return self.__filter__(self.vfn(time))
+        return time
+
+    def __getitem__(self,time):
+        time = self.__wrap__(time)
+        if self.step:
+            times,values = self.steps if self.steps is not None else self.__steps__()
+            # Before the first waypoint the first value holds, as with the padded interpolants
+            return values[max(bisect_right(times,time) - 1,0)]
+        return self.__filter__(float(self.vfn(time)))
+
+    def sample(self,times):
+        '''Vectorized lookup at many times, as an (M,) array'''
+        times = self.__wrap__(np.asarray(times,dtype=float))
+        if self.step:
+            return self.values[np.maximum(np.searchsorted(self.times,times,side='right') - 1,0)]
+        return np.clip(self.vfn(times),self.minimum,self.maximum)
 
     def __filter__(self,value):
         if type(value) == np.ndarray:
             value = float(value)
-        if min(self.v) > value:
-            return min(self.v)
-        elif max(self.v) < value:
-            return max(self.v)
+        if self.minimum > value:
+            return self.minimum
+        elif self.maximum < value:
+            return self.maximum
         else:
             return value
 
+    def __columns__(self):
+        if isinstance(self.wps,ModeColumns):
+            self.times = self.wps.times
+            self.values = self.wps.values
+        else:
+            self.times = np.array([wp['time'] for wp in self.wps],dtype=float)
+            self.values = np.array([wp['mode'] for wp in self.wps],dtype=float)
+
     def __interpolate__(self):
         assert len(self.wps) > 0
-        t = self.t
-        v = self.v
+        self.__columns__()
+        # Everything else is built on first use, so opening a memory-mapped file reads no waypoints
+        self.bounds = None
+        self.padded = None
+        self.steps = None
+        self.fitted = None
+
+    def __bounds__(self):
+        # Bounds are fixed per trajectory, so they are found once rather than per lookup
+        if self.bounds is None:
+            self.bounds = (float(self.values.min()),float(self.values.max()))
+        return self.bounds
+
+    def __padded__(self):
+        if self.padded is None:
+            self.padded = (self.__pad_times__(self.times),self.__pad_rows__(self.values))
+        return self.padded
+
+    def __steps__(self):
+        if self.steps is None:
+            # Plain lists, since bisect on a list beats any NumPy call for a single lookup
+            self.steps = (self.times.tolist(),self.values.tolist())
+        return self.steps
+
+    def __fit__(self):
+        if self.kind in LINEAR_KINDS and not self.circuit:
+            # Only trajectories of 4+ waypoints are unpadded in front, so only they extrapolate
+            return lambda times: interpolate_columns(self.times,self.values,times,len(self.times) >= 4)
+        t = self.padded_times
+        v = self.padded_values
         if not self.circuit:
-            self.vfn = interpolate.interp1d(t,v,kind=self.kind,fill_value='extrapolate')
-            # self.vfn = interpolate.UnivariateSpline(t,v,k=self.kind,ext='const')
+            return interpolate.interp1d(t,v,kind=self.kind,fill_value='extrapolate')
+            # return interpolate.UnivariateSpline(t,v,k=self.kind,ext='const')
         else:
-            tp = [t[-2]-t[-1]]+t+[t[1]+t[-1]]
-            vp = [v[-2]-v[-1]]+v+[v[1]+v[-1]]
-            self.vfn = interpolate.interp1d(tp,vp,kind=self.kind,fill_value='extrapolate')
-            # self.vfn = interpolate.UnivariateSpline(t,v,k=self.kind,ext='const')
+            tp = np.concatenate([[t[-2]-t[-1]],t,[t[1]+t[-1]]])
+            vp = np.concatenate([[v[-2]-v[-1]],v,[v[1]+v[-1]]])
+            return interpolate.interp1d(tp,vp,kind=self.kind,fill_value='extrapolate')
+            # return interpolate.UnivariateSpline(t,v,k=self.kind,ext='const')
 
 class AnnotationTrajectory(Trajectory):
+    '''
+    AnnotationTrajectory Class.
+    Annotations fire at discrete times, so nothing is interpolated: waypoints
+    are kept in a sorted time index for exact and range lookups, with a
+    cursor marking how many have been delivered
+    '''
 
     @property
     def a(self):
@@ -248,91 +491,190 @@ class AnnotationTrajectory(Trajectory):
         if self.circuit:
             start = min(self.t)
             time = time - start % (len(self) + start)
-        if time in self.t:
-            return [event['annotation'] for event in self.wps][0]
+        index = bisect_left(self.times,time)
+        if index < len(self.times) and self.times[index] == time:
+            return self.annotations[index]
         else:
             return None
 
+    def between(self,start,stop):
+        '''
+        Annotations that fire in (start, stop], in time order, found in
+        O(log n + k). start=None includes everything up to stop.
+        '''
+        low = 0 if start is None else bisect_right(self.times,start)
+        high = bisect_right(self.times,stop)
+        return self.annotations[low:high]
+
+    def deliver(self,time):
+        '''
+        Undelivered annotations due by time, in time order, found in
+        O(log n + k). Each annotation is returned by exactly one call.
+        '''
+        high = bisect_right(self.times,time,self.cursor)
+        fired = self.annotations[self.cursor:high]
+        self.cursor = high
+        if self.cursor > 64 and 2 * self.cursor > len(self.times):
+            # Drop the delivered prefix once it is most of the index, so this stays amortized O(1)
+            self.__compact__()
+        return fired
+
+    def insert(self,time,annotation):
+        '''Adds one undelivered annotation, keeping the index sorted without a rebuild'''
+        index = bisect_right(self.times,time)
+        if index < self.cursor:
+            # Due before something already delivered: forget the delivered prefix so it fires next
+            self.__compact__()
+            index = bisect_right(self.times,time)
+        self.times.insert(index,time)
+        self.annotations.insert(index,annotation)
+
+    def __compact__(self):
+        del self.times[:self.cursor]
+        del self.annotations[:self.cursor]
+        self.cursor = 0
+
     def __filter__(self,value):
         return value
 
     def __interpolate__(self):
-        pass
+        order = sorted(range(len(self.wps)),key=lambda index:self.wps[index]['time'])
+        self.times = [self.wps[index]['time'] for index in order]
+        self.annotations = [self.wps[index]['annotation'] for index in order]
+        self.cursor = 0
 
 
 class PoseTrajectory(Trajectory):
 
+    @classmethod
+    def from_arrays(cls,times,positions,quaternions,kind='slinear',circuit=False):
+        '''
+        Builds a trajectory straight from (N,) times, (N,3) positions and (N,4)
+        [w,x,y,z] quaternions without creating Pose objects per waypoint
+        '''
+        return cls(WaypointColumns(np.asarray(times,dtype=float),np.asarray(positions,dtype=float),np.asarray(quaternions,dtype=float)),kind=kind,circuit=circuit)
+
+    @property
+    def t(self):
+        return self.padded_times.tolist()
+
     @property
     def x(self):
-        return self.__pad__([wp['pose'].position.x for wp in self.wps])
+        return self.padded_positions[:,0].tolist()
 
     @property
     def y(self):
-        return self.__pad__([wp['pose'].position.y for wp in self.wps])
+        return self.padded_positions[:,1].tolist()
 
     @property
     def z(self):
-        return self.__pad__([wp['pose'].position.z for wp in self.wps])
+        return self.padded_positions[:,2].tolist()
 
     @property
     def q(self):
-        return self.__pad__([wp['pose'].quaternion for wp in self.wps])
+        return [Quaternion.from_vector_quaternion(row) for row in self.padded_quaternions]
+
+    @property
+    def padded_times(self):
+        return self.__padded__()[0]
+
+    @property
+    def padded_positions(self):
+        return self.__padded__()[1]
+
+    @property
+    def padded_quaternions(self):
+        return self.__padded__()[2]
+
+    @property
+    def pfn(self):
+        if self.fitted is None:
+            self.fitted = self.__fit__()
+        return self.fitted
 
     def __filter__(self,value):
         if type(value) == np.ndarray:
             value = float(value)
         return value
 
-    def __getitem__(self,time):
-        times = self.t
+    def __wrap__(self,time):
         if self.circuit:
-            start = min(times)
+            start = self.padded_times[0]
             time = time - start % (len(self) + start)
-        x = self.__filter__(self.xfn(time))
-        y = self.__filter__(self.yfn(time))
-        z = self.__filter__(self.zfn(time))
-        q = self.q
-        pos = Position(x,y,z)
-
-        start = min(times)
-        stop = max(times)
-        if time < start:
-            quat = self.wps[0]['pose'].quaternion
-        elif time > stop:
-            quat = self.wps[-1]['pose'].quaternion
+        return time
+
+    def __getitem__(self,time):
+        time = self.__wrap__(time)
+        x,y,z = self.pfn(time)
+        pos = Position(float(x),float(y),float(z))
+
+        # Orientations hold outside the waypoints (the padding only repeats the end rows)
+        times = self.times
+        start_idx = bisect_right(times,time)-1
+        if start_idx < 0:
+            quat = Quaternion.from_vector_quaternion(self.quaternions[0])
+        elif start_idx >= len(times)-1:
+            quat = Quaternion.from_vector_quaternion(self.quaternions[-1])
         else:
-            for start_idx,pair in enumerate(pairwise(times)):
-                if pair[0] <= time <= pair[1]:
-                    quat1 = q[start_idx]
-                    quat2 = q[start_idx+1]
-                    quat_times = (pair[0],pair[1])
-            percent = (time - quat_times[0]) / (quat_times[1] - quat_times[0])
+            quat1 = Quaternion.from_vector_quaternion(self.quaternions[start_idx])
+            quat2 = Quaternion.from_vector_quaternion(self.quaternions[start_idx+1])
+            percent = (time - times[start_idx]) / (times[start_idx+1] - times[start_idx])
             quat = Quaternion.from_py_quaternion(pyQuaternion.slerp(quat1,quat2,percent))
         return Pose(pos,quat)
 
+    def sample_positions(self,times):
+        '''Vectorized position-only lookup at many times, as (M,3)'''
+        return self.pfn(self.__wrap__(np.asarray(times,dtype=float)))
+
+    def sample(self,times):
+        '''
+        Vectorized lookup at many times.
+        Returns (M,3) positions and (M,4) [w,x,y,z] quaternions
+        '''
+        times = self.__wrap__(np.asarray(times,dtype=float))
+        positions = self.pfn(times)
+        if len(self.times) == 1:
+            return positions,np.repeat(np.asarray(self.quaternions[:1],dtype=float),len(times),axis=0)
+        start_idx = np.clip(np.searchsorted(self.times,times,side='right')-1,0,len(self.times)-2)
+        span = self.times[start_idx+1] - self.times[start_idx]
+        percent = np.clip((times - self.times[start_idx]) / np.where(span > 0,span,1.0),0.0,1.0)
+        quaternions = slerp(self.quaternions[start_idx],self.quaternions[start_idx+1],percent)
+        return positions,quaternions
+
+    def __columns__(self):
+        # Unpadded waypoint columns, used for vectorized sampling
+        if isinstance(self.wps,WaypointColumns):
+            self.times = self.wps.times
+            self.positions = self.wps.positions
+            self.quaternions = self.wps.quaternions
+        else:
+            self.times = np.array([wp['time'] for wp in self.wps],dtype=float)
+            self.positions = np.array([[wp['pose'].position.x,wp['pose'].position.y,wp['pose'].position.z] for wp in self.wps],dtype=float)
+            self.quaternions = np.array([[wp['pose'].quaternion.w,wp['pose'].quaternion.x,wp['pose'].quaternion.y,wp['pose'].quaternion.z] for wp in self.wps],dtype=float)
+
     def __interpolate__(self):
         assert len(self.wps) > 0
-        times = self.t
+        self.__columns__()
+        # Padded copies and interpolants are built on first use, so opening a
+        # memory-mapped file reads no waypoints
+        self.padded = None
+        self.fitted = None
+
+    def __padded__(self):
+        if self.padded is None:
+            self.padded = (self.__pad_times__(self.times),self.__pad_rows__(self.positions),self.__pad_rows__(self.quaternions))
+        return self.padded
+
+    def __fit__(self):
+        if self.kind in LINEAR_KINDS and not self.circuit:
+            # Only trajectories of 4+ waypoints are unpadded in front, so only they extrapolate
+            return lambda times: interpolate_columns(self.times,self.positions,times,len(self.times) >= 4)
         if not self.circuit:
-            self.xfn = interpolate.interp1d(times,self.x,kind=self.kind,fill_value='extrapolate')
-            self.yfn = interpolate.interp1d(times,self.y,kind=self.kind,fill_value='extrapolate')
-            self.zfn = interpolate.interp1d(times,self.z,kind=self.kind,fill_value='extrapolate')
-            # TODO: Test whether the code below produces better results
-            # self.xfn = interpolate.UnivariateSpline(times,self.x,k=self.kind,ext='const')
-            # self.yfn = interpolate.UnivariateSpline(times,self.y,k=self.kind,ext='const')
-            # self.zfn = interpolate.UnivariateSpline(times,self.z,k=self.kind,ext='const')
+            return interpolate.interp1d(self.padded_times,self.padded_positions,kind=self.kind,axis=0,fill_value='extrapolate')
+            # TODO: Test whether interpolate.UnivariateSpline (ext='const') produces better results
         else:
-            xs = self.x
-            ys = self.y
-            zs = self.z
-            tp = [times[-2]-times[-1]]+t+[times[1]+times[-1]]
-            xp = [xs[-2]-xs[-1]]+xs+[xs[1]+xs[-1]]
-            yp = [ys[-2]-ys[-1]]+ys+[ys[1]+ys[-1]]
-            zp = [zs[-2]-zs[-1]]+zs+[zs[1]+zs[-1]]
-            self.xfn = interpolate.interp1d(tp,xp,kind=self.kind,fill_value='extrapolate')
-            self.yfn = interpolate.interp1d(tp,yp,kind=self.kind,fill_value='extrapolate')
-            self.zfn = interpolate.interp1d(tp,zp,kind=self.kind,fill_value='extrapolate')
-
-            # self.xfn = interpolate.UnivariateSpline(tp,xp,k=self.kind,ext='const')
-            # self.yfn = interpolate.UnivariateSpline(tp,yp,k=self.kind,ext='const')
-            # self.zfn = interpolate.UnivariateSpline(tp,zp,k=self.kind,ext='const')
+            times = self.padded_times
+            positions = self.padded_positions
+            tp = np.concatenate([[times[-2]-times[-1]],times,[times[1]+times[-1]]])
+            pp = np.concatenate([[positions[-2]-positions[-1]],positions,[positions[1]+positions[-1]]])
+            return interpolate.interp1d(tp,pp,kind=self.kind,axis=0,fill_value='extrapolate')
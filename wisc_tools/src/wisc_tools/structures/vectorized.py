@@ -0,0 +1,270 @@
+import numpy as np
+from wisc_tools.convenience.lazy import LazyModule
+
+transformations = LazyModule('wisc_tools.conversions.transformations')
+
+def quaternions_from_euler(ai,aj,ak,axes='sxyz'):
+    '''
+    Array version of transformations.quaternion_from_euler.
+    Takes (N,) angle arrays and returns (N,4) [w,x,y,z] quaternions
+    '''
+    try:
+        firstaxis, parity, repetition, frame = transformations._AXES2TUPLE[axes.lower()]
+    except (AttributeError, KeyError):
+        transformations._TUPLE2AXES[axes]
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis + 1
+    j = transformations._NEXT_AXIS[i+parity-1] + 1
+    k = transformations._NEXT_AXIS[i-parity] + 1
+
+    ai = np.asarray(ai,dtype=float)
+    aj = np.asarray(aj,dtype=float)
+    ak = np.asarray(ak,dtype=float)
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        aj = -aj
+
+    ci = np.cos(ai/2.0)
+    si = np.sin(ai/2.0)
+    cj = np.cos(aj/2.0)
+    sj = np.sin(aj/2.0)
+    ck = np.cos(ak/2.0)
+    sk = np.sin(ak/2.0)
+    cc = ci*ck
+    cs = ci*sk
+    sc = si*ck
+    ss = si*sk
+
+    q = np.empty(ai.shape + (4,))
+    if repetition:
+        q[...,0] = cj*(cc - ss)
+        q[...,i] = cj*(cs + sc)
+        q[...,j] = sj*(cc + ss)
+        q[...,k] = sj*(cs - sc)
+    else:
+        q[...,0] = cj*cc + sj*ss
+        q[...,i] = cj*sc - sj*cs
+        q[...,j] = cj*ss + sj*cc
+        q[...,k] = cj*cs - sj*sc
+    if parity:
+        q[...,j] *= -1.0
+    return q
+
+def slerp(q0,q1,fraction):
+    '''
+    Spherical interpolation between rows of (N,4) [w,x,y,z] quaternion arrays,
+    following pyquaternion's shortest-path convention
+    '''
+    q0 = q0 / np.linalg.norm(q0,axis=-1,keepdims=True)
+    q1 = q1 / np.linalg.norm(q1,axis=-1,keepdims=True)
+    fraction = np.asarray(fraction,dtype=float)[...,np.newaxis]
+    dot = np.sum(q0*q1,axis=-1,keepdims=True)
+    q1 = np.where(dot < 0,-q1,q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot,-1.0,1.0))
+    sin_theta = np.sin(theta)
+    # Nearly parallel quaternions fall back to a normalized lerp
+    close = dot > 0.9995
+    safe_sin = np.where(close,1.0,sin_theta)
+    w0 = np.where(close,1.0-fraction,np.sin((1.0-fraction)*theta)/safe_sin)
+    w1 = np.where(close,fraction,np.sin(fraction*theta)/safe_sin)
+    result = w0*q0 + w1*q1
+    return result / np.linalg.norm(result,axis=-1,keepdims=True)
+
+class PoseTrajectoryStack(object):
+    '''
+    PoseTrajectoryStack Class.
+    Packs many linear PoseTrajectory objects into padded arrays so they can all
+    be sampled at one time in a single vectorized pass. Sampling matches
+    PoseTrajectory outside each trajectory's span: the end pose and the first
+    orientation hold, and so does the first position unless the trajectory is
+    long enough to extrapolate it.
+    '''
+    def __init__(self,trajectories=[]):
+        self.trajectories = []
+        self.lengths = np.zeros(0,dtype=int)
+        self.extrapolated = np.zeros(0,dtype=bool)
+        self.times = np.zeros((0,1))
+        self.positions = np.zeros((0,1,3))
+        self.quaternions = np.zeros((0,1,4))
+        self.refresh(trajectories)
+
+    def __len__(self):
+        return len(self.trajectories)
+
+    def refresh(self,trajectories):
+        trajectories = list(trajectories)
+        width = max([len(trajectory.times) for trajectory in trajectories] + [1])
+        if len(trajectories) != len(self.trajectories) or width > self.times.shape[1]:
+            count = len(trajectories)
+            self.trajectories = [None] * count
+            self.lengths = np.zeros(count,dtype=int)
+            self.extrapolated = np.zeros(count,dtype=bool)
+            self.times = np.full((count,width),np.inf)
+            self.positions = np.zeros((count,width,3))
+            self.quaternions = np.zeros((count,width,4))
+            self.quaternions[...,0] = 1.0
+        # Only rows whose trajectory object was replaced get rewritten
+        for row,trajectory in enumerate(trajectories):
+            if self.trajectories[row] is trajectory:
+                continue
+            length = len(trajectory.times)
+            self.times[row,:] = np.inf
+            self.times[row,:length] = trajectory.times
+            self.positions[row,:length] = trajectory.positions
+            self.quaternions[row,:length] = trajectory.quaternions
+            self.lengths[row] = length
+            # Trajectories of 4+ waypoints are not padded in front, so interp1d
+            # extrapolates their first segment's positions there
+            self.extrapolated[row] = length >= 4
+            self.trajectories[row] = trajectory
+
+    def sample(self,time):
+        rows = np.arange(len(self.trajectories))
+        last = self.lengths - 1
+        start = np.clip((self.times <= time).sum(axis=1) - 1,0,np.maximum(last - 1,0))
+        stop = np.minimum(start + 1,last)
+        t0 = self.times[rows,start]
+        t1 = self.times[rows,stop]
+        span = t1 - t0
+        fraction = np.where(span > 0,(time - t0) / np.where(span > 0,span,1.0),0.0)
+        fraction = np.minimum(fraction,1.0)
+        held = np.maximum(fraction,0.0)
+        p0 = self.positions[rows,start]
+        p1 = self.positions[rows,stop]
+        positions = p0 + np.where(self.extrapolated,fraction,held)[:,np.newaxis] * (p1 - p0)
+        quaternions = slerp(self.quaternions[rows,start],self.quaternions[rows,stop],held)
+        return positions,quaternions
+
+def quaternion_multiply(q0,q1):
+    '''Hamilton product of broadcastable (...,4) [w,x,y,z] quaternion arrays'''
+    w0, x0, y0, z0 = np.moveaxis(np.asarray(q0,dtype=float),-1,0)
+    w1, x1, y1, z1 = np.moveaxis(np.asarray(q1,dtype=float),-1,0)
+    return np.stack([w0*w1 - x0*x1 - y0*y1 - z0*z1,
+                     w0*x1 + x0*w1 + y0*z1 - z0*y1,
+                     w0*y1 - x0*z1 + y0*w1 + z0*x1,
+                     w0*z1 + x0*y1 - y0*x1 + z0*w1],axis=-1)
+
+def quaternion_conjugate(q):
+    return np.asarray(q,dtype=float) * np.array([1.0,-1.0,-1.0,-1.0])
+
+def rotate_vectors(q,v):
+    '''Rotates (...,3) vectors by broadcastable (...,4) unit quaternions'''
+    q = np.asarray(q,dtype=float)
+    v = np.asarray(v,dtype=float)
+    w = q[...,:1]
+    u = q[...,1:]
+    t = 2.0 * np.cross(u,v)
+    return v + w*t + np.cross(u,t)
+
+def quaternion_distances(q0,q1):
+    '''
+    Intrinsic geodesic distance between broadcastable (...,4) quaternion arrays,
+    matching pyquaternion's Quaternion.distance. q and -q are always pi apart;
+    pyquaternion gives 0 or pi there depending on rounding
+    '''
+    q0 = np.asarray(q0,dtype=float)
+    q1 = np.asarray(q1,dtype=float)
+    n0 = np.linalg.norm(q0,axis=-1)
+    n1 = np.linalg.norm(q1,axis=-1)
+    angle = np.arccos(np.clip(np.sum(q0*q1,axis=-1) / (n0*n1),-1.0,1.0))
+    return np.sqrt(np.log(n1/n0)**2 + angle**2)
+
+class PoseArray(object):
+    '''
+    PoseArray Class.
+    N poses as (N,3) positions and (N,4) [w,x,y,z] quaternions, with distance,
+    neighbour and composition kernels that run over the whole set in NumPy.
+    Distances come back as (spatial,rotational) pairs like Pose.distance_to.
+    '''
+    def __init__(self,positions,quaternions):
+        self.positions = np.atleast_2d(np.asarray(positions,dtype=float))
+        self.quaternions = np.atleast_2d(np.asarray(quaternions,dtype=float))
+        if not self.positions.size and not self.quaternions.size:
+            self.positions = self.positions.reshape(0,3)
+            self.quaternions = self.quaternions.reshape(0,4)
+        assert self.positions.shape[-1] == 3 and self.quaternions.shape[-1] == 4
+        assert len(self.positions) == len(self.quaternions)
+
+    @classmethod
+    def from_poses(cls,poses):
+        poses = list(poses)
+        positions = np.array([[pose.position.x,pose.position.y,pose.position.z] for pose in poses],dtype=float).reshape(-1,3)
+        quaternions = np.array([[pose.quaternion.w,pose.quaternion.x,pose.quaternion.y,pose.quaternion.z] for pose in poses],dtype=float).reshape(-1,4)
+        return cls(positions,quaternions)
+
+    @classmethod
+    def coerce(cls,poses):
+        if isinstance(poses,PoseArray):
+            return poses
+        if hasattr(poses,'position'):
+            return cls.from_poses([poses])
+        return cls.from_poses(poses)
+
+    @property
+    def poses(self):
+        from wisc_tools.structures.structures import Position, Quaternion, Pose
+        return [Pose(Position(*[float(value) for value in position]),Quaternion.from_vector_quaternion(quaternion))
+                for position,quaternion in zip(self.positions,self.quaternions)]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self,index):
+        if isinstance(index,(int,np.integer)):
+            return PoseArray(self.positions[index:index+1],self.quaternions[index:index+1]).poses[0]
+        return PoseArray(self.positions[index],self.quaternions[index])
+
+    def __iter__(self):
+        return iter(self.poses)
+
+    def __repr__(self):
+        return '<PoseArray of {0} poses>'.format(len(self))
+
+    def distances_to(self,pose):
+        '''(N,) spatial and rotational distances from every pose to one pose'''
+        other = PoseArray.coerce(pose)
+        spatial = np.linalg.norm(self.positions - other.positions[0],axis=-1)
+        rotational = quaternion_distances(self.quaternions,other.quaternions[0])
+        return spatial,rotational
+
+    def pairwise_distances(self,other=None):
+        '''
+        (N,M) spatial and rotational distance matrices against other (default
+        self). Memory grows as N*M, so chunk very large sets.
+        '''
+        other = self if other is None else PoseArray.coerce(other)
+        spatial = np.linalg.norm(self.positions[:,np.newaxis,:] - other.positions[np.newaxis,:,:],axis=-1)
+        rotational = quaternion_distances(self.quaternions[:,np.newaxis,:],other.quaternions[np.newaxis,:,:])
+        return spatial,rotational
+
+    def nearest(self,pose,k=1,rotation_weight=0.0):
+        '''
+        Indices of the k poses closest to pose, nearest first, scored as
+        spatial + rotation_weight * rotational
+        '''
+        spatial,rotational = self.distances_to(pose)
+        score = spatial + rotation_weight * rotational if rotation_weight else spatial
+        k = min(k,len(score))
+        if k < len(score):
+            candidates = np.argpartition(score,k-1)[:k]
+        else:
+            candidates = np.arange(len(score))
+        return candidates[np.argsort(score[candidates],kind='stable')]
+
+    def compose(self,other):
+        '''
+        Applies other in each pose's frame (self * other), broadcasting a
+        single pose against many
+        '''
+        other = PoseArray.coerce(other)
+        positions = self.positions + rotate_vectors(self.quaternions,other.positions)
+        quaternions = quaternion_multiply(self.quaternions,other.quaternions)
+        return PoseArray(positions,quaternions)
+
+    def inverse(self):
+        quaternions = quaternion_conjugate(self.quaternions)
+        positions = -rotate_vectors(quaternions,self.positions)
+        return PoseArray(positions,quaternions)
@@ -0,0 +1,83 @@
+'''
+Shared setup for the wisc_tools benchmark suite.
+
+Requires pytest-benchmark. Runs without ROS: messages come from
+wisc_tools.adapters.standins. Every benchmark carries the `bench` marker,
+which pytest.ini deselects, so a plain `pytest` run skips them. Select them
+with -m bench, and compare against the committed baseline in baselines/:
+
+    pytest -m bench test/benchmarks --benchmark-storage=test/benchmarks/baselines \
+        --benchmark-compare=0001 --benchmark-compare-fail=mean:10%
+
+After an intended speed change, save a new baseline and commit it:
+
+    pytest -m bench test/benchmarks --benchmark-storage=test/benchmarks/baselines --benchmark-save=baseline
+
+Every benchmark also checks its result against the scalar reference path
+once, so a fast but wrong kernel fails. --benchmark-disable runs each one a
+single time, as a correctness check only. Every scaling benchmark is
+parametrized over SIZES and grouped by operation, so a run prints one scaling
+curve per group. Set WISC_BENCH_MAX_N to cap the largest size for quick runs.
+'''
+import os
+import sys
+
+import numpy as np
+import pytest
+
+try:
+    import wisc_tools
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+
+from wisc_tools.adapters import ros
+ros.use_standins()
+
+MAX_N = int(os.environ.get('WISC_BENCH_MAX_N', 100000))
+SIZES = [n for n in (10, 100, 1000, 10000, 100000) if n <= MAX_N]
+
+def sizes(limit=None):
+    '''Benchmark sizes, optionally capped for quadratic or per-object paths.'''
+    return [n for n in SIZES if limit is None or n <= limit]
+
+def random_eulerposes(n, seed=0):
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform(-1, 1, (n, 3))
+    rotations = rng.uniform(-np.pi, np.pi, (n, 3))
+    return [{'position':{'x':p[0],'y':p[1],'z':p[2]},'rotation':{'r':r[0],'p':r[1],'y':r[2]}}
+            for p, r in zip(positions, rotations)]
+
+def random_columns(n, seed=0):
+    '''Strictly increasing times, positions and unit (w, x, y, z) quaternions.'''
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.01, 0.1, n))
+    positions = rng.uniform(-1, 1, (n, 3))
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    return times, positions, quaternions
+
+def pose_rows(poses):
+    '''(N,3) positions and (N,4) [w,x,y,z] quaternions of Pose objects, for comparing against the scalar path.'''
+    positions = np.array([[pose.position.x, pose.position.y, pose.position.z] for pose in poses]).reshape(-1, 3)
+    quaternions = np.array([[pose.quaternion.w, pose.quaternion.x, pose.quaternion.y, pose.quaternion.z] for pose in poses]).reshape(-1, 4)
+    return positions, quaternions
+
+def same_rotations(q0, q1, atol=1e-6):
+    '''Whether rows of two quaternion arrays are the same rotations, as q and -q are.'''
+    q0 = np.asarray(q0, dtype=float)
+    q1 = np.asarray(q1, dtype=float)
+    dots = np.sum(q0 * q1, axis=-1) / (np.linalg.norm(q0, axis=-1) * np.linalg.norm(q1, axis=-1))
+    return bool(np.allclose(np.abs(dots), 1.0, atol=atol))
+
+@pytest.fixture(scope='session')
+def catalog():
+    home = {'position':{'x':0,'y':0,'z':0},'rotation':{'r':0,'p':0,'y':0}}
+    up = {'position':{'x':0.3,'y':0,'z':0.4},'rotation':{'r':0.2,'p':0,'y':0}}
+    return {
+        'arms':['left','right'],
+        'joints':[],
+        'modes':{'gripper':{'override':False,'value':'open','values':{'open':1.0,'closed':0.0}}},
+        'actions':{},
+        'poses':{arm:{'home':dict(home,default=True),'up':dict(up,default=False)} for arm in ['left','right']},
+        'annotations':{'say':{}},
+    }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+Import-time benchmark for wisc_tools.
+
+Each module is imported in a fresh interpreter several times and the median
+wall time is reported, along with any heavy dependencies the import pulled in.
+
+    python import_time.py [--repeat N] [--max-ms MS] [module ...]
+
+Exits non-zero when --max-ms is given and any module is slower.
+'''
+from __future__ import print_function
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    'wisc_tools.structures',
+    'wisc_tools.control',
+    'wisc_tools.conversions.transformations',
+]
+
+HEAVY = ['scipy', 'rospy', 'geometry_msgs', 'wisc_msgs', 'std_msgs', 'asyncio', 'matplotlib']
+
+PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(set(name.split('.')[0] for name in sys.modules) & set({heavy!r}))
+print(json.dumps({{'ms': elapsed * 1000.0, 'heavy': heavy}}))
+'''
+
+def measure(module, repeat):
+    samples = []
+    heavy = []
+    for _ in range(repeat):
+        process = subprocess.Popen([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, error = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(error.decode('utf-8').strip().splitlines()[-1])
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        samples.append(result['ms'])
+        heavy = result['heavy']
+    samples.sort()
+    return samples[len(samples) // 2], heavy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=None)
+    args = parser.parse_args()
+    slow = []
+    for module in args.modules:
+        try:
+            median, heavy = measure(module, args.repeat)
+        except RuntimeError as e:
+            print('{0:45s} failed: {1}'.format(module, e))
+            slow.append(module)
+            continue
+        print('{0:45s} {1:8.1f} ms   {2}'.format(module, median, ', '.join(heavy) if heavy else '-'))
+        if args.max_ms is not None and median > args.max_ms:
+            slow.append(module)
+    if slow:
+        print('Failed or slower than {0} ms: {1}'.format(args.max_ms, ', '.join(slow)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
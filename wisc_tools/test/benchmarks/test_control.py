@@ -0,0 +1,169 @@
+'''EventController and StateController at varying event counts.'''
+import numpy as np
+import pytest
+
+from wisc_tools.control import Event, EventController, StateController, SimulatedClock
+from wisc_tools.control.state_controller import serialize
+from wisc_tools.control.visualization import TrajectoryMarkers, decimate
+from wisc_tools.control.modes import ModeEngine
+from wisc_tools.structures import Pose, PoseTrajectory, ModeTrajectory
+
+from conftest import sizes, random_eulerposes, random_columns
+
+pytestmark = pytest.mark.bench
+
+def populate(controller, arm, n):
+    '''Queues n pose events (and an annotation on every tenth) after t=0.'''
+    poses = [Pose.from_eulerpose_dict(pose) for pose in random_eulerposes(n)]
+    events = []
+    for index, pose in enumerate(poses):
+        event = Event(1.0 + index * 0.01)
+        event.add_pose(arm, pose, index)
+        if index % 10 == 0:
+            event.add_annotation('say', index, index)
+        events.append(event)
+    controller.events = events
+    controller.refresh_arm_trajectory(0.0, arm)
+    controller.refresh_annotation_trajectory(0.0, 'say')
+    return controller
+
+def event_controller(catalog, n):
+    controller = EventController({'left':Pose.from_eulerpose_dict(catalog['poses']['left']['home'])},
+                                 catalog['annotations'],
+                                 catalog['modes'])
+    return populate(controller, 'left', n)
+
+@pytest.mark.parametrize('n', sizes())
+def test_add_pose_at_time(benchmark, catalog, n):
+    benchmark.group = 'EventController.add_pose_at_time'
+    controller = event_controller(catalog, n)
+    events = list(controller.events)
+    trajectories = dict(controller.arm_trajectories)
+    pose = Pose.from_eulerpose_dict(catalog['poses']['left']['up'])
+
+    def reset():
+        controller.events = list(events)
+        controller.arm_trajectories = dict(trajectories)
+
+    benchmark.pedantic(controller.add_pose_at_time, args=(0.0, 0.5, 'left', pose, n), setup=reset, rounds=20)
+    assert controller.get_event_at_time(0.5).get_pose('left') is pose
+    assert controller.arm_trajectories['left'][0.5].distance_to(pose)[0] < 1e-9
+    assert len(controller.events) == n + 1
+
+@pytest.mark.parametrize('n', sizes())
+def test_timestep_to(benchmark, catalog, n):
+    benchmark.group = 'EventController.timestep_to'
+    controller = event_controller(catalog, n)
+    events = list(controller.events)
+    middle = events[len(events) // 2].time
+
+    def reset():
+        # Delivery is recorded on the events and the annotation index, so both start over
+        controller.events = [event.copy() for event in events]
+        controller.refresh_annotation_trajectory(0.0, 'say')
+
+    result = benchmark.pedantic(controller.timestep_to, args=(middle,), setup=reset, rounds=20)
+    assert result == {'say':[value for event in events if event.time <= middle for value in event.get_annotations('say')]}
+    assert controller.events[0].time == middle
+
+@pytest.mark.parametrize('n', sizes())
+def test_state_controller_timestep(benchmark, catalog, n):
+    benchmark.group = 'StateController.timestep'
+    controller = StateController(None, clock=SimulatedClock(0.0), **catalog)
+    populate(controller.event_controller, 'left', n)
+    result = benchmark(controller.timestep)
+    assert controller.current['arms']['left'].distance_to(controller.event_controller.arm_trajectories['left'][0.0])[0] < 1e-9
+    assert result['arms']['left'] == controller.current['arms']['left'].dict
+    assert result['modes']['gripper']['value'] == 1.0
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_serialize(benchmark, n):
+    benchmark.group = 'serialize'
+    poses = [Pose.from_eulerpose_dict(pose) for pose in random_eulerposes(n)]
+    state = {'actions':[],
+             'modes':{'mode{0}'.format(index):{'override':False,'name':None,'value':0.5} for index in range(n)},
+             'arms':{'arm{0}'.format(index):pose for index, pose in enumerate(poses)},
+             'annotations':{'say':list(range(n))},
+             'poses':{}}
+    result = benchmark(serialize, state)
+    assert result['arms']['arm0'] == poses[0].dict
+    assert result['modes'] == state['modes']
+    assert result['annotations'] == state['annotations']
+
+@pytest.mark.parametrize('n', sizes())
+def test_decimate(benchmark, n):
+    benchmark.group = 'visualization.decimate'
+    _, positions, _ = random_columns(n)
+    points = positions.cumsum(axis=0)
+    result = benchmark(decimate, points)
+    assert result.tolist() == reference_decimate(points, 0.05)
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_trajectory_markers_update(benchmark, n):
+    benchmark.group = 'TrajectoryMarkers.update'
+    trajectory = PoseTrajectory.from_arrays(*random_columns(n))
+    markers = TrajectoryMarkers()
+    times = iter(trajectory.times[0] + 0.001 * index for index in range(10 ** 7))
+    benchmark(lambda: markers.update('left', trajectory, next(times)))
+    # Timed rounds may run past the trajectory's end, so check a fresh preview of its start
+    fresh = TrajectoryMarkers()
+    changed = fresh.update('left', trajectory, trajectory.times[0])
+    points, _ = fresh.preview(trajectory, trajectory.times[0])
+    assert [[point.x, point.y, point.z] for point in changed[0].points] == points.tolist()
+
+def reference_decimate(points, angle):
+    '''decimate() one point at a time, following its docstring.'''
+    kept = [0]
+    turned = 0.0
+    for index in range(1, len(points) - 1):
+        before = points[index] - points[index - 1]
+        after = points[index + 1] - points[index]
+        if np.linalg.norm(before) > 1e-9 and np.linalg.norm(after) > 1e-9:
+            cosine = np.dot(before, after) / (np.linalg.norm(before) * np.linalg.norm(after))
+            previous = turned
+            turned += np.arccos(np.clip(cosine, -1.0, 1.0))
+            if np.floor(turned / angle) > np.floor(previous / angle):
+                kept.append(index)
+    return kept + [len(points) - 1]
+
+def mode_engine(n, kind):
+    '''n modes whose layers each hold 8 random waypoints, every other one overridden.'''
+    info = {'mode{0}'.format(index):{'override':bool(index % 2), 'value':'a', 'values':{'a':0.0, 'b':1.0}, 'kind':kind}
+            for index in range(n)}
+    engine = ModeEngine(info)
+    for index, mode in enumerate(info):
+        for override in (False, True):
+            times, _, _ = random_columns(8, seed=2 * index + override)
+            values = np.random.RandomState(index).uniform(0, 1, 8)
+            engine.set_layer(mode, override, ModeTrajectory.from_arrays(times, values, kind))
+    return engine
+
+@pytest.mark.parametrize('kind', ['slinear', 'step'])
+@pytest.mark.parametrize('n', sizes(1000))
+def test_mode_engine_evaluate_all(benchmark, n, kind):
+    benchmark.group = 'ModeEngine.evaluate_all ({0})'.format(kind)
+    engine = mode_engine(n, kind)
+    result = benchmark(engine.evaluate_all, 0.3)
+    assert list(result) == engine.keys()
+    np.testing.assert_allclose(list(result.values()), [engine[mode][0.3] for mode in engine], atol=1e-9)
+
+@pytest.mark.parametrize('kind', ['slinear', 'step'])
+@pytest.mark.parametrize('n', sizes(1000))
+def test_mode_engine_per_mode(benchmark, n, kind):
+    benchmark.group = 'ModeEngine.evaluate_all ({0})'.format(kind)
+    engine = mode_engine(n, kind)
+    result = benchmark(lambda: {mode:engine[mode][0.3] for mode in engine})
+    assert result == {mode:engine.evaluate(mode, 0.3) for mode in engine}
+
+def test_mode_engine_toggle(benchmark):
+    benchmark.group = 'ModeEngine.set_override'
+    engine = mode_engine(100, 'slinear')
+    state = {'override':False}
+
+    def toggle():
+        state['override'] = not state['override']
+        engine.set_override(0.3, 'mode0', state['override'])
+
+    benchmark(toggle)
+    assert engine.overrides['mode0'] is state['override']
+    assert engine['mode0'].active is state['override']
@@ -0,0 +1,124 @@
+'''Euler and quaternion conversions.'''
+import numpy as np
+import pytest
+
+from wisc_tools.adapters import ros
+from wisc_tools.structures import Pose, PoseArray, Quaternion, quaternions_from_euler
+from wisc_tools.conversions import transformations, registration, style
+
+from conftest import sizes, random_eulerposes, random_columns, pose_rows, same_rotations
+
+pytestmark = pytest.mark.bench
+
+def angles_of(dicts):
+    return np.array([[pose['rotation']['r'], pose['rotation']['p'], pose['rotation']['y']] for pose in dicts])
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_pose_from_eulerpose_dict(benchmark, n):
+    benchmark.group = 'Pose.from_eulerpose_dict'
+    dicts = random_eulerposes(n)
+    result = benchmark(lambda: [Pose.from_eulerpose_dict(pose) for pose in dicts])
+    angles = angles_of(dicts)
+    positions, quaternions = pose_rows(result)
+    np.testing.assert_allclose(positions, [[pose['position'][axis] for axis in 'xyz'] for pose in dicts])
+    assert same_rotations(quaternions, quaternions_from_euler(angles[:, 0], angles[:, 1], angles[:, 2], 'szxy'))
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_pose_dict(benchmark, n):
+    benchmark.group = 'Pose.dict'
+    poses = [Pose.from_eulerpose_dict(pose) for pose in random_eulerposes(n)]
+    result = benchmark(lambda: [pose.dict for pose in poses])
+    # Euler angles are not unique, so compare the rotations they describe
+    assert same_rotations(pose_rows([Pose.from_eulerpose_dict(pose) for pose in result])[1], pose_rows(poses)[1])
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_quaternion_from_euler(benchmark, n):
+    benchmark.group = 'transformations.quaternion_from_euler'
+    angles = np.random.RandomState(0).uniform(-np.pi, np.pi, (n, 3))
+    result = benchmark(lambda: [transformations.quaternion_from_euler(r, p, y, 'szxy') for r, p, y in angles])
+    np.testing.assert_allclose(result, quaternions_from_euler(angles[:, 0], angles[:, 1], angles[:, 2], 'szxy'), atol=1e-12)
+
+@pytest.mark.parametrize('n', sizes())
+def test_quaternions_from_euler(benchmark, n):
+    benchmark.group = 'quaternions_from_euler'
+    angles = np.random.RandomState(0).uniform(-np.pi, np.pi, (n, 3))
+    result = benchmark(quaternions_from_euler, angles[:, 0], angles[:, 1], angles[:, 2], 'szxy')
+    np.testing.assert_allclose(result[:1000], [transformations.quaternion_from_euler(r, p, y, 'szxy') for r, p, y in angles[:1000]], atol=1e-12)
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_euler_from_quaternion(benchmark, n):
+    benchmark.group = 'transformations.euler_from_quaternion'
+    quaternions = np.random.RandomState(0).normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    result = np.array(benchmark(lambda: [transformations.euler_from_quaternion(q, 'szxy') for q in quaternions]))
+    assert same_rotations(quaternions_from_euler(result[:, 0], result[:, 1], result[:, 2], 'szxy'), quaternions)
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_ros_eulerpose_roundtrip(benchmark, n):
+    benchmark.group = 'Pose.ros_eulerpose round trip'
+    poses = [Pose.from_eulerpose_dict(pose) for pose in random_eulerposes(n)]
+    result = benchmark(lambda: [Pose.from_ros_eulerpose(pose.ros_eulerpose) for pose in poses])
+    np.testing.assert_allclose(pose_rows(result)[0], pose_rows(poses)[0], atol=1e-12)
+    assert same_rotations(pose_rows(result)[1], pose_rows(poses)[1])
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_solve_batch(benchmark, n):
+    benchmark.group = 'registration.solve_batch (n pairs of 10 points)'
+    rng = np.random.RandomState(0)
+    v0 = rng.uniform(-1, 1, (n, 10, 3))
+    v1 = v0[:, ::-1]
+    result = benchmark(registration.solve_batch, v0, v1)
+    for index in range(0, n, max(n // 10, 1)):
+        np.testing.assert_allclose(result[index], transformations.superimposition_matrix(v0[index].T, v1[index].T), atol=1e-8)
+
+def test_incremental_registration_update(benchmark):
+    benchmark.group = 'IncrementalRegistration add + matrix'
+    rng = np.random.RandomState(0)
+    fit = registration.IncrementalRegistration()
+    v0, v1 = rng.uniform(-1, 1, (10, 3)), rng.uniform(-1, 1, (10, 3))
+    fit.add_many(v0, v1)
+    p0, p1 = rng.uniform(-1, 1, 3), rng.uniform(-1, 1, 3)
+    added = []
+
+    def update():
+        fit.add(p0, p1)
+        added.append(1)
+        return fit.matrix
+    result = benchmark(update)
+    # Every round added the same pair once more, which a weight on it reproduces
+    weights = np.concatenate([np.ones(10), [len(added)]])
+    expected = registration.solve(np.vstack([v0, p0]), np.vstack([v1, p1]), weights)
+    np.testing.assert_allclose(result, expected, atol=1e-6)
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_ros_ee_pose_goals(benchmark, n):
+    benchmark.group = 'EEPoseGoals'
+    poses = PoseArray(*random_columns(n)[1:]).poses
+    result = benchmark(ros.ros_ee_pose_goals, poses)
+    assert [ros.from_ros_pose(message).distance_to(pose)[0] for message, pose in zip(result.ee_poses, poses)] == [0.0] * n
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_fill_ee_pose_goals(benchmark, n):
+    benchmark.group = 'EEPoseGoals'
+    poses = PoseArray(*random_columns(n)[1:])
+    msg = ros.fill_ee_pose_goals(ros.wisc_msgs.EEPoseGoals(), poses)
+    result = benchmark(ros.fill_ee_pose_goals, msg, poses)
+    assert result is msg
+    expected = ros.ros_ee_pose_goals(poses.poses)
+    assert [(pose.position.x, pose.orientation.w) for pose in result.ee_poses] == [(pose.position.x, pose.orientation.w) for pose in expected.ee_poses]
+
+@pytest.mark.parametrize('n', sizes())
+def test_color_rgba_from_values(benchmark, n):
+    benchmark.group = 'style.color_rgbaFromValues'
+    values = np.random.RandomState(0).uniform(0, 5, n)
+    result = benchmark(style.color_rgbaFromValues, values)
+    lut = style.VIRIDIS.lut
+    low, high = values.min(), values.max()
+    np.testing.assert_array_equal(result, [lut[int(round((value - low) / (high - low) * 255))] if n > 1 else lut[0] for value in values])
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_color_msgs_from_values(benchmark, n):
+    benchmark.group = 'style.color_msgsFromValues'
+    values = np.random.RandomState(0).uniform(0, 5, n)
+    result = benchmark(style.color_msgsFromValues, values)
+    assert [[msg.r, msg.g, msg.b, msg.a] for msg in result] == style.color_rgbaFromValues(values).tolist()
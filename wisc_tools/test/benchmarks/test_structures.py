@@ -0,0 +1,122 @@
+'''Trajectory construction and lookup.'''
+import numpy as np
+import pytest
+
+from wisc_tools.structures import Pose, PoseArray, PoseIndex, PoseTrajectory, ModeTrajectory, AnnotationTrajectory
+
+from conftest import sizes, random_columns, pose_rows, same_rotations
+
+pytestmark = pytest.mark.bench
+
+LOOKUPS = 1000
+
+@pytest.mark.parametrize('n', sizes(10000))
+def test_pose_trajectory_from_waypoints(benchmark, n):
+    benchmark.group = 'PoseTrajectory(waypoints)'
+    times, positions, quaternions = random_columns(n)
+    trajectory = PoseTrajectory.from_arrays(times, positions, quaternions)
+    waypoints = [{'time':time,'pose':pose} for time, pose in zip(times, [trajectory[time] for time in times])]
+    result = benchmark(PoseTrajectory, waypoints)
+    np.testing.assert_allclose(result.positions, positions, atol=1e-9)
+    assert same_rotations(result.quaternions, quaternions)
+
+@pytest.mark.parametrize('n', sizes())
+def test_pose_trajectory_from_arrays(benchmark, n):
+    benchmark.group = 'PoseTrajectory.from_arrays'
+    times, positions, quaternions = random_columns(n)
+    result = benchmark(PoseTrajectory.from_arrays, times, positions, quaternions)
+    rows = pose_rows([result[time] for time in times[::max(n // 10, 1)]])
+    np.testing.assert_allclose(rows[0], positions[::max(n // 10, 1)], atol=1e-9)
+    assert same_rotations(rows[1], quaternions[::max(n // 10, 1)])
+
+@pytest.mark.parametrize('n', sizes())
+def test_pose_trajectory_getitem(benchmark, n):
+    benchmark.group = 'PoseTrajectory[time] x{0}'.format(LOOKUPS)
+    times, positions, quaternions = random_columns(n)
+    trajectory = PoseTrajectory.from_arrays(times, positions, quaternions)
+    queries = np.random.RandomState(1).uniform(times[0], times[-1], LOOKUPS)
+    result = benchmark(lambda: [trajectory[time] for time in queries])
+    positions, quaternions = trajectory.sample(queries)
+    rows = pose_rows(result)
+    np.testing.assert_allclose(rows[0], positions, atol=1e-9)
+    assert same_rotations(rows[1], quaternions)
+
+@pytest.mark.parametrize('n', sizes())
+def test_pose_trajectory_sample(benchmark, n):
+    benchmark.group = 'PoseTrajectory.sample x{0}'.format(LOOKUPS)
+    times, positions, quaternions = random_columns(n)
+    trajectory = PoseTrajectory.from_arrays(times, positions, quaternions)
+    queries = np.random.RandomState(1).uniform(times[0], times[-1], LOOKUPS)
+    positions, quaternions = benchmark(trajectory.sample, queries)
+    rows = pose_rows([trajectory[time] for time in queries])
+    np.testing.assert_allclose(positions, rows[0], atol=1e-9)
+    assert same_rotations(quaternions, rows[1])
+
+@pytest.mark.parametrize('n', sizes())
+def test_mode_trajectory_construction(benchmark, n):
+    benchmark.group = 'ModeTrajectory(waypoints)'
+    times, _, _ = random_columns(n)
+    values = np.random.RandomState(2).uniform(0, 1, n)
+    waypoints = [{'time':time,'mode':value} for time, value in zip(times, values)]
+    result = benchmark(ModeTrajectory, waypoints)
+    np.testing.assert_allclose([result[time] for time in times[::max(n // 10, 1)]], values[::max(n // 10, 1)], atol=1e-9)
+
+@pytest.mark.parametrize('kind', ['slinear', 'step'])
+@pytest.mark.parametrize('n', sizes())
+def test_mode_trajectory_getitem(benchmark, n, kind):
+    benchmark.group = 'ModeTrajectory[time] x{0} ({1})'.format(LOOKUPS, kind)
+    times, _, _ = random_columns(n)
+    values = np.random.RandomState(2).uniform(0, 1, n)
+    trajectory = ModeTrajectory.from_arrays(times, values, kind)
+    queries = np.random.RandomState(1).uniform(times[0], times[-1], LOOKUPS)
+    result = benchmark(lambda: [trajectory[time] for time in queries])
+    np.testing.assert_allclose(result, trajectory.sample(queries), atol=1e-9)
+
+@pytest.mark.parametrize('kind', ['slinear', 'step'])
+@pytest.mark.parametrize('n', sizes())
+def test_mode_trajectory_sample(benchmark, n, kind):
+    benchmark.group = 'ModeTrajectory.sample x{0} ({1})'.format(LOOKUPS, kind)
+    times, _, _ = random_columns(n)
+    values = np.random.RandomState(2).uniform(0, 1, n)
+    trajectory = ModeTrajectory.from_arrays(times, values, kind)
+    queries = np.random.RandomState(1).uniform(times[0], times[-1], LOOKUPS)
+    result = benchmark(trajectory.sample, queries)
+    np.testing.assert_allclose(result, [trajectory[time] for time in queries], atol=1e-9)
+
+@pytest.mark.parametrize('n', sizes())
+def test_pose_array_distances_to(benchmark, n):
+    benchmark.group = 'PoseArray.distances_to'
+    _, positions, quaternions = random_columns(n)
+    poses = PoseArray(positions, quaternions)
+    spatial, rotational = benchmark(poses.distances_to, poses[0])
+    reference = np.array([pose.distance_to(poses[0]) for pose in poses[:100]])
+    np.testing.assert_allclose(spatial[:100], reference[:, 0], atol=1e-9)
+    np.testing.assert_allclose(rotational[:100], reference[:, 1], atol=1e-6)
+
+@pytest.mark.parametrize('n', sizes(1000))
+def test_pose_array_pairwise_distances(benchmark, n):
+    benchmark.group = 'PoseArray.pairwise_distances'
+    _, positions, quaternions = random_columns(n)
+    poses = PoseArray(positions, quaternions)
+    spatial, rotational = benchmark(poses.pairwise_distances)
+    for row in range(0, n, max(n // 10, 1)):
+        np.testing.assert_allclose((spatial[row], rotational[row]), poses.distances_to(poses[row]), atol=1e-6)
+
+@pytest.mark.parametrize('n', sizes())
+def test_pose_index_nearest(benchmark, n):
+    benchmark.group = 'PoseIndex.nearest k=5'
+    _, positions, quaternions = random_columns(n)
+    index = PoseIndex(positions, quaternions, rotation_weight=0.05)
+    query = PoseArray(positions[:1] + 0.01, quaternions[:1])
+    index.nearest(query)
+    result = benchmark(index.nearest, query, 5)
+    assert [match.index for match in result] == PoseArray(positions, quaternions).nearest(query, 5, 0.05).tolist()
+
+@pytest.mark.parametrize('n', sizes())
+def test_annotation_trajectory_between(benchmark, n):
+    benchmark.group = 'AnnotationTrajectory.between'
+    times, _, _ = random_columns(n)
+    trajectory = AnnotationTrajectory([{'time':time, 'annotation':index} for index, time in enumerate(times)])
+    middle = times[n // 2]
+    result = benchmark(trajectory.between, middle, middle + 0.5)
+    assert result == [index for index, time in enumerate(times) if middle < time <= middle + 0.5]
@@ -0,0 +1,52 @@
+'''
+Shared setup for the wisc_tools behavior tests.
+
+Runs without ROS: messages come from wisc_tools.adapters.standins, and
+controllers run on a SimulatedClock so every test is deterministic.
+
+    pytest test
+
+Benchmarks are deselected by pytest.ini; see test/benchmarks/conftest.py.
+'''
+import os
+import sys
+
+import pytest
+
+try:
+    import wisc_tools
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from wisc_tools.adapters import ros
+ros.use_standins()
+
+from wisc_tools.control import StateController
+from wisc_tools.control.catalog import Catalog
+from wisc_tools.control.clock import SimulatedClock
+
+HOME = {'position':{'x':0,'y':0,'z':0},'rotation':{'r':0,'p':0,'y':0}}
+UP = {'position':{'x':0.3,'y':0,'z':0.4},'rotation':{'r':0.2,'p':0,'y':0}}
+
+@pytest.fixture
+def definition():
+    return {
+        'poses':{arm:{'home':dict(HOME,default=True),'up':dict(UP,default=False)} for arm in ['left','right']},
+        'modes':{'gripper':{'override':False,'value':'open','values':{'open':1.0,'closed':0.0}},
+                 'light':{'override':False,'value':'off','values':{'off':0.0,'on':1.0},'kind':'step'}},
+        'actions':{'reach':{'left':[{'pose':'up','modes':{'gripper':'closed'},'annotations':{'say':'reaching'},'time':1.0},
+                                    {'pose':'home','modes':{},'annotations':{},'time':1.0}]}},
+        'annotations':{'say':{}},
+    }
+
+@pytest.fixture
+def catalog(definition):
+    return Catalog.from_dicts(definition['poses'], definition['modes'], definition['actions'], definition['annotations'])
+
+@pytest.fixture
+def clock():
+    return SimulatedClock()
+
+@pytest.fixture
+def controller(catalog, clock):
+    return StateController(None, ['left','right'], clock=clock, catalog=catalog)
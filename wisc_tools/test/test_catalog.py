@@ -0,0 +1,79 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from wisc_tools.control import catalog as catalogs
+from wisc_tools.control.catalog import Catalog, load_catalog
+
+def write(tmp_path, definition, name='catalog.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(definition))
+    return str(path)
+
+def test_consistent_catalogs_validate(catalog):
+    assert catalog.validate() == []
+
+def test_validation_reports_every_broken_reference(definition):
+    definition['poses']['right']['home']['default'] = False
+    definition['modes']['gripper']['value'] = 'ajar'
+    definition['modes']['light']['kind'] = 'bouncy'
+    definition['actions']['wave'] = {'left':[{'pose':'wave','modes':{'gripper':'shut','fan':'on'},'annotations':{'shout':'hi'}}],
+                                     'tail':[{'pose':'home'}]}
+    problems = Catalog.from_dicts(definition['poses'], definition['modes'], definition['actions'], definition['annotations']).validate()
+    assert sorted(problems) == sorted([
+        'arm right has no default pose',
+        'mode gripper starts at unknown value ajar',
+        'mode light has unknown kind bouncy',
+        'action wave uses unknown pose wave for arm left',
+        'action wave uses unknown value shut for mode gripper',
+        'action wave uses unknown mode fan',
+        'action wave uses unknown annotation shout',
+        'action wave uses unknown arm tail',
+    ])
+
+def test_invalid_catalog_files_are_rejected(definition, tmp_path):
+    definition['modes']['gripper']['value'] = 'ajar'
+    with pytest.raises(ValueError) as error:
+        load_catalog(write(tmp_path, definition), cache_dir=False)
+    assert 'ajar' in str(error.value)
+
+def test_loaded_catalogs_match_from_dicts(definition, catalog, tmp_path):
+    loaded = load_catalog(write(tmp_path, definition), cache_dir=str(tmp_path / 'cache'))
+    assert loaded.modes == catalog.modes and loaded.actions == catalog.actions
+    for arm, named in catalog.poses.items():
+        for name, info in named.items():
+            assert loaded.poses[arm][name]['default'] == info['default']
+            assert loaded.poses[arm][name]['pose'].distance_to(info['pose']) == pytest.approx((0.0, 0.0), abs=1e-12)
+
+def test_cached_catalogs_skip_compilation(definition, tmp_path, monkeypatch):
+    path = write(tmp_path, definition)
+    cache = str(tmp_path / 'cache')
+    first = load_catalog(path, cache_dir=cache)
+    [cached] = os.listdir(cache)
+    assert cached.endswith('.npz')
+    # The cache is plain arrays and JSON, readable without unpickling anything
+    with np.load(os.path.join(cache, cached), allow_pickle=False) as arrays:
+        assert json.loads(str(arrays['definition']))['modes'] == definition['modes']
+    def compile_columns(poses):
+        raise AssertionError('compiled despite the cache')
+    monkeypatch.setattr(catalogs, 'compile_columns', compile_columns)
+    second = load_catalog(path, cache_dir=cache)
+    assert second.modes == first.modes
+    assert second.poses['left']['up']['pose'].distance_to(first.poses['left']['up']['pose']) == pytest.approx((0.0, 0.0), abs=1e-12)
+
+def test_corrupt_caches_are_rebuilt(definition, tmp_path):
+    path = write(tmp_path, definition)
+    cache = str(tmp_path / 'cache')
+    load_catalog(path, cache_dir=cache)
+    [cached] = os.listdir(cache)
+    with open(os.path.join(cache, cached), 'wb') as f:
+        f.write(b'garbage')
+    assert load_catalog(path, cache_dir=cache).validate() == []
+    with np.load(os.path.join(cache, cached), allow_pickle=False) as arrays:
+        assert arrays['positions'].shape == (4, 3)
+
+def test_pose_indices_are_shared(catalog):
+    assert catalog.pose_index('left') is catalog.pose_index('left')
+    assert catalog.default_pose('left').distance_to(catalog.poses['left']['home']['pose']) == pytest.approx((0.0, 0.0))
@@ -0,0 +1,43 @@
+import pytest
+
+from wisc_tools.control.clock import Clock, SimulatedClock, WallClock
+
+def test_simulated_clock_only_moves_when_advanced():
+    clock = SimulatedClock(1.0)
+    assert clock.now() == clock.now() == 1.0
+    assert clock.advance(0.5) == 1.5
+    assert clock.advance_to(4.0) == 4.0
+    with pytest.raises(AssertionError):
+        clock.advance(-1.0)
+    with pytest.raises(AssertionError):
+        clock.advance_to(3.0)
+
+def test_wall_clock_is_monotonic():
+    clock = WallClock()
+    assert not clock.simulated
+    first = clock.now()
+    assert clock.now() >= first
+
+def test_clocks_must_implement_now():
+    class Stopped(Clock):
+        pass
+    with pytest.raises(TypeError):
+        Clock()
+    with pytest.raises(TypeError):
+        Stopped()
+
+def test_controller_reads_time_from_its_clock(controller, clock):
+    clock.advance_to(2.5)
+    assert controller.now == 2.5
+    controller.timestep()
+    assert controller.snapshot.time == 2.5
+
+def test_goals_are_scheduled_on_the_simulated_timeline(controller, clock):
+    clock.advance_to(10.0)
+    controller.set_pose('left', 'up', offset=1.0)
+    assert controller.event_controller.next_event_time(10.0) == 11.0
+    clock.advance_to(10.5)
+    halfway = controller.timestep()['arms']['left']['position']['x']
+    assert 0.0 < halfway < 0.3
+    clock.advance_to(11.0)
+    assert controller.timestep()['arms']['left']['position']['x'] == pytest.approx(0.3)
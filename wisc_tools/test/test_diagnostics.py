@@ -0,0 +1,77 @@
+import io
+import logging
+import os
+import subprocess
+import sys
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import wisc_tools
+from wisc_tools.convenience.diagnostics import RateLimitFilter, DroppingQueueHandler, enable_diagnostics, disable_diagnostics
+
+def record(msg='moved %s', args=('left',), **extra):
+    record = logging.LogRecord('wisc_tools.control.planning', logging.WARNING, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_library_is_silent_until_configured():
+    source = os.path.dirname(os.path.dirname(os.path.abspath(wisc_tools.__file__)))
+    script = "import logging, wisc_tools; logging.getLogger('wisc_tools.control.recorder').warning('loud')"
+    result = subprocess.run([sys.executable, '-c', script], env=dict(os.environ, PYTHONPATH=source), capture_output=True, text=True)
+    assert result.returncode == 0
+    # Without the NullHandler this would reach stderr through logging.lastResort
+    assert result.stderr == ''
+
+def test_rate_limit_allows_a_burst_then_reports_what_it_suppressed():
+    now = [0.0]
+    limit = RateLimitFilter(rate=1.0, burst=2, clock=lambda: now[0])
+    assert [limit.filter(record()) for _ in range(4)] == [True, True, False, False]
+    # Other message templates have their own bucket
+    assert limit.filter(record('other'))
+    now[0] = 1.0
+    passed = record()
+    assert limit.filter(passed)
+    assert passed.suppressed == 2
+    assert not limit.filter(record())
+    now[0] = 10.0
+    passed = record()
+    assert limit.filter(passed)
+    assert passed.suppressed == 1
+
+def test_full_queues_drop_records_instead_of_blocking():
+    records = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(records)
+    handler.handle(record('first', ()))
+    handler.handle(record('second', ()))
+    assert records.qsize() == 1
+    assert records.get_nowait().getMessage() == 'first'
+
+def test_records_are_frozen_when_queued():
+    records = queue.Queue()
+    handler = DroppingQueueHandler(records)
+    arm = ['left']
+    data = {'x':1}
+    handler.handle(record('moved %s', (arm,), data=data))
+    arm.append('right')
+    data['x'] = 2
+    queued = records.get_nowait()
+    assert queued.getMessage() == "moved ['left']"
+    assert queued.args is None
+    assert queued.data == {'x':1}
+
+def test_enabled_diagnostics_write_extra_fields_from_the_listener_thread():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    enable_diagnostics(logging.INFO, handler=handler, rate=None)
+    try:
+        logging.getLogger('wisc_tools.control.planning').info('Changing override for %s', 'gripper', extra={'mode':'gripper'})
+        logging.getLogger('wisc_tools.control.planning').debug('hidden')
+    finally:
+        disable_diagnostics()
+    output = stream.getvalue()
+    assert 'Changing override for gripper' in output
+    assert "mode='gripper'" in output
+    assert 'hidden' not in output
@@ -0,0 +1,184 @@
+import numpy as np
+import pytest
+
+from wisc_tools.structures import ModeTrajectory
+from wisc_tools.control import EventController
+from wisc_tools.control.modes import ModeStack, ModeEngine
+from wisc_tools.convenience.instrumentation import metrics
+
+GRIPPER = {'override':False,'value':'open','values':{'open':1.0,'closed':0.0}}
+
+def steps(kind='step'):
+    return ModeTrajectory([{'time':1.0,'mode':0.0},{'time':2.0,'mode':1.0},{'time':4.0,'mode':0.5}], kind=kind)
+
+# Zero-order hold
+
+@pytest.mark.parametrize('kind', ['step', 'previous', 'zero'])
+def test_step_kinds_hold_each_value_until_the_next_waypoint(kind):
+    trajectory = steps(kind)
+    assert trajectory.step
+    assert [trajectory[time] for time in [1.0, 1.5, 1.999, 2.0, 3.9, 4.0]] == [0.0, 0.0, 0.0, 1.0, 1.0, 0.5]
+
+def test_step_lookups_hold_outside_the_waypoints():
+    trajectory = steps()
+    assert trajectory[0.0] == 0.0
+    assert trajectory[-10.0] == 0.0
+    assert trajectory[100.0] == 0.5
+
+def test_step_sample_matches_single_lookups():
+    trajectory = steps()
+    times = np.linspace(-1.0, 6.0, 57)
+    sampled = trajectory.sample(times)
+    assert sampled.shape == times.shape
+    assert sampled.tolist() == [trajectory[time] for time in times]
+
+def test_step_trajectory_from_arrays():
+    trajectory = ModeTrajectory.from_arrays([0.0, 1.0], [2.0, 3.0], kind='zero')
+    assert trajectory[0.99] == 2.0
+    assert trajectory.sample([0.5, 1.0, 2.0]).tolist() == [2.0, 3.0, 3.0]
+
+def test_single_waypoint_step_trajectory():
+    trajectory = ModeTrajectory([{'time':0,'mode':0.25}], kind='step')
+    assert trajectory[-1.0] == 0.25
+    assert trajectory.sample([-1.0, 0.0, 1.0]).tolist() == [0.25, 0.25, 0.25]
+
+def test_linear_kinds_still_interpolate():
+    trajectory = steps('slinear')
+    assert not trajectory.step
+    assert trajectory[1.5] == pytest.approx(0.5)
+    assert trajectory.sample([3.0]).tolist() == pytest.approx([0.75])
+
+# ModeStack
+
+def test_mode_stack_matches_single_lookups():
+    trajectories = [steps('step'), steps('previous'), steps('slinear'),
+                    ModeTrajectory([{'time':0,'mode':1.0}], kind='step'),
+                    ModeTrajectory([{'time':float(time),'mode':float(time % 3)} for time in range(6)], kind='linear')]
+    stack = ModeStack(trajectories)
+    for time in np.linspace(-1.0, 7.0, 33):
+        assert stack.sample(time).tolist() == pytest.approx([trajectory[time] for trajectory in trajectories])
+
+def test_mode_stack_refresh_only_rewrites_replaced_rows():
+    first = steps()
+    stack = ModeStack([first, steps('slinear')])
+    values = stack.values
+    replacement = ModeTrajectory([{'time':0.0,'mode':0.0},{'time':1.0,'mode':1.0}], kind='step')
+    stack.refresh([first, replacement])
+    # Same count and width, so the arrays are reused in place
+    assert stack.values is values
+    assert stack.trajectories[0] is first
+    assert stack.sample(0.5).tolist() == [0.0, 0.0]
+    assert stack.sample(1.5).tolist() == [0.0, 1.0]
+
+# Override and deferred layers
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+def test_toggling_the_override_refits_nothing(recording):
+    events = EventController({}, {}, {'gripper':GRIPPER})
+    events.add_mode_at_time(0.0, 1.0, 'gripper', 0.0, True, 0)
+    rebuilds = recording.export()['timers']['trajectory_rebuild']['mode/gripper']['count']
+    for override in [True, False, True]:
+        events.set_mode_override(0.0, 'gripper', override)
+        assert events.mode_trajectories['gripper'].active is override
+    assert recording.export()['timers']['trajectory_rebuild']['mode/gripper']['count'] == rebuilds
+    assert events.mode_trajectories['gripper'][1.0] == pytest.approx(0.0)
+    events.set_mode_override(0.0, 'gripper', False)
+    assert events.mode_trajectories['gripper'][1.0] == pytest.approx(1.0)
+
+def test_adding_a_mode_refits_only_its_layer():
+    events = EventController({}, {}, {'gripper':GRIPPER})
+    deferred = events.mode_engine.layer('gripper', False)
+    events.add_mode_at_time(0.0, 1.0, 'gripper', 0.0, True, 0)
+    assert events.mode_engine.layer('gripper', False) is deferred
+    override = events.mode_engine.layer('gripper', True)
+    assert override is not deferred
+    events.add_mode_at_time(0.0, 2.0, 'gripper', 0.5, False, 1)
+    assert events.mode_engine.layer('gripper', True) is override
+    assert events.mode_engine.layer('gripper', False)[2.0] == pytest.approx(0.5)
+
+def test_add_events_refits_only_the_layers_that_changed():
+    from wisc_tools.control import Event
+    events = EventController({}, {}, {'gripper':GRIPPER})
+    override = events.mode_engine.layer('gripper', True)
+    event = Event(1.0)
+    event.add_mode('gripper', 0.0, False, 0)
+    events.add_events(0.0, [event])
+    assert events.mode_engine.layer('gripper', True) is override
+    assert events.mode_engine.layer('gripper', False)[1.0] == pytest.approx(0.0)
+
+def test_batched_layer_refits_are_coalesced_per_layer(recording):
+    events = EventController({}, {}, {'gripper':GRIPPER})
+    deferred = events.mode_engine.layer('gripper', False)
+    with events.batch(0.0):
+        events.add_mode_at_time(0.0, 1.0, 'gripper', 0.0, True, 0)
+        events.add_mode_at_time(0.0, 2.0, 'gripper', 1.0, True, 1)
+    assert recording.export()['counters']['coalesced_refreshes']['mode/gripper'] == 1
+    assert recording.export()['timers']['trajectory_rebuild']['mode/gripper']['count'] == 1
+    assert events.mode_engine.layer('gripper', False) is deferred
+    assert events.mode_engine.layer('gripper', True)[1.5] == pytest.approx(0.5)
+
+def test_fades_blend_from_the_old_layer_to_the_new():
+    engine = ModeEngine({'gripper':dict(GRIPPER, fade=2.0)})
+    engine.set_layer('gripper', True, ModeTrajectory([{'time':0,'mode':0.0},{'time':1.5,'mode':0.0}]))
+    assert engine.set_override(1.0, 'gripper', True)
+    assert not engine.set_override(1.0, 'gripper', True)
+    view = engine['gripper']
+    assert [view[time] for time in [0.0, 1.0, 1.5, 2.0, 3.0, 4.0]] == pytest.approx([1.0, 1.0, 0.75, 0.5, 0.0, 0.0])
+    assert view.sample([1.0, 1.5, 2.0, 3.0]).tolist() == pytest.approx([1.0, 0.75, 0.5, 0.0])
+    assert engine.evaluate_all(2.0)['gripper'] == pytest.approx(0.5)
+    # Once the fade has run out it is dropped, and lookups go straight to the new layer
+    assert engine.evaluate_all(3.0)['gripper'] == pytest.approx(0.0)
+    assert engine['gripper'].fade is None
+    assert view.fade == (1.0, 2.0)
+
+def test_switching_layers_rebases_the_new_one_on_the_current_value():
+    engine = ModeEngine({'gripper':GRIPPER})
+    engine.set_layer('gripper', True, ModeTrajectory([{'time':0,'mode':0.0},{'time':2.0,'mode':0.0}]))
+    engine.set_override(1.0, 'gripper', True)
+    # The override layer now ramps from where the mode was to its own waypoint
+    assert [engine['gripper'][time] for time in [1.0, 1.5, 2.0]] == pytest.approx([1.0, 0.5, 0.0])
+    assert engine.evaluate_all(1.5)['gripper'] == pytest.approx(0.5)
+    engine.set_override(2.0, 'gripper', False)
+    # The deferred layer was fitted before the override, but holds the current value instead of jumping back
+    assert engine.evaluate_all(2.0)['gripper'] == 0.0
+    assert engine.evaluate_all(5.0)['gripper'] == 0.0
+
+# Through the controller
+
+def test_step_kind_survives_refits(controller, clock):
+    controller.set_mode('light', 'on')
+    # set_mode schedules the change time_to_mode seconds ahead
+    due = controller.time_to_mode(0.0, 1.0)
+    trajectory = controller.snapshot.mode_trajectories['light'].trajectory
+    assert trajectory.kind == 'step'
+    assert trajectory.sample([0.5, due - 0.001, due]).tolist() == [0.0, 0.0, 1.0]
+    clock.advance_to(due - 0.001)
+    assert controller.timestep()['modes']['light']['value'] == 0.0
+    clock.advance_to(due)
+    assert controller.timestep()['modes']['light']['value'] == 1.0
+
+def test_mode_is_continuous_when_an_override_is_released(controller, clock):
+    controller.set_mode('gripper', 'closed')
+    clock.advance_to(100.0)
+    assert controller.timestep()['modes']['gripper']['value'] == pytest.approx(0.0)
+    controller.set_mode('gripper', None, override=False, update=False)
+    assert controller.timestep()['modes']['gripper']['value'] == pytest.approx(0.0)
+    clock.advance_to(101.0)
+    assert controller.timestep()['modes']['gripper']['value'] == pytest.approx(0.0)
+
+def test_released_override_fades_into_later_deferred_values(controller, clock):
+    controller.event_controller.mode_engine.fade_times['gripper'] = 1.0
+    controller.event_controller.add_mode_at_time(0.0, 200.0, 'gripper', 1.0, False, 0)
+    controller.set_mode('gripper', 'closed')
+    clock.advance_to(100.0)
+    controller.set_mode('gripper', None, override=False, update=False)
+    # The deferred layer ramps from the current value to its next waypoint
+    clock.advance_to(150.0)
+    assert controller.timestep()['modes']['gripper']['value'] == pytest.approx(0.5)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from wisc_tools.structures import PoseTrajectory
+from wisc_tools.structures.parallel import fit_trajectories, resample_times
+
+def demonstration(n, seed):
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.05, 0.2, n))
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    return times, rng.uniform(-1, 1, (n, 3)), quaternions
+
+def serial(times, positions, quaternions, period):
+    trajectory = PoseTrajectory.from_arrays(times, positions, quaternions)
+    resampled = resample_times(times, period)
+    return (resampled,) + trajectory.sample(resampled)
+
+def test_parallel_fitting_matches_serial():
+    demonstrations = [demonstration(n, seed) for seed, n in enumerate([2, 5, 40, 13])]
+    fitted = fit_trajectories(demonstrations, 0.05, max_workers=2)
+    assert len(fitted) == len(demonstrations)
+    for (times, positions, quaternions), result in zip(demonstrations, fitted):
+        expected = serial(times, positions, quaternions, 0.05)
+        for column, expected_column in zip(result, expected):
+            np.testing.assert_allclose(column, expected_column, atol=1e-12)
+
+def test_trajectories_are_accepted_and_returned_on_request():
+    times, positions, quaternions = demonstration(10, 3)
+    fitted = fit_trajectories([PoseTrajectory.from_arrays(times, positions, quaternions)], 0.1, max_workers=1, arrays=False)
+    assert isinstance(fitted[0], PoseTrajectory)
+    expected = serial(times, positions, quaternions, 0.1)
+    np.testing.assert_allclose(fitted[0].times, expected[0])
+    np.testing.assert_allclose(fitted[0].positions, expected[1], atol=1e-12)
+
+def test_resample_times_covers_the_span():
+    times = resample_times(np.array([1.0, 1.3]), 0.1)
+    np.testing.assert_allclose(times, [1.0, 1.1, 1.2, 1.3])
@@ -0,0 +1,157 @@
+import time
+
+import pytest
+
+from wisc_tools.control import EventController
+from wisc_tools.convenience.instrumentation import metrics
+from wisc_tools.structures import Pose
+
+def eulerpose(x=0.0, y=0.0, z=0.0):
+    return Pose.from_eulerpose_dict({'position':{'x':x,'y':y,'z':z},'rotation':{'r':0,'p':0,'y':0}})
+
+@pytest.fixture
+def events():
+    return EventController({'left':eulerpose()}, {'say':{}}, {'gripper':{'override':False,'value':'open','values':{'open':1.0,'closed':0.0}}})
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+# EventController.batch
+
+def test_batch_refits_each_channel_once(events, recording):
+    before = events.arm_trajectories['left']
+    with events.batch(0.0):
+        for index in range(5):
+            events.add_pose_at_time(0.0, 1.0 + index, 'left', eulerpose(x=index), index)
+        # Nothing is refit until the block exits
+        assert events.arm_trajectories['left'] is before
+    counters = recording.export()['counters']
+    assert counters['coalesced_refreshes']['arm/left'] == 4
+    assert recording.export()['timers']['trajectory_rebuild']['arm/left']['count'] == 1
+    assert events.arm_trajectories['left'][5.0].position.x == pytest.approx(4.0)
+
+def test_batch_rolls_back_when_the_block_raises(events):
+    events.add_pose_at_time(0.0, 1.0, 'left', eulerpose(x=1), 0)
+    trajectory = events.arm_trajectories['left']
+    times = events.times
+    with pytest.raises(RuntimeError):
+        with events.batch(0.0):
+            events.add_pose_at_time(0.0, 2.0, 'left', eulerpose(x=2), 1)
+            events.add_mode_at_time(0.0, 2.0, 'gripper', 0.0, False, 1)
+            events.set_mode_override(0.0, 'gripper', True)
+            raise RuntimeError('abort')
+    assert events.times == times
+    assert events.arm_trajectories['left'] is trajectory
+    assert events.mode_overrides['gripper'] is False
+    assert events.mode_trajectories['gripper'][3.0] == pytest.approx(1.0)
+    # Events are restored as copies, so later edits start from the old state
+    assert not events[1.0].has_mode('gripper', False)
+
+def test_nested_batches_fold_into_the_outermost(events, recording):
+    with events.batch(0.0):
+        events.add_pose_at_time(0.0, 1.0, 'left', eulerpose(x=1), 0)
+        with events.batch(0.0):
+            events.add_pose_at_time(0.0, 2.0, 'left', eulerpose(x=2), 1)
+        assert events.arm_trajectories['left'][2.0].position.x == pytest.approx(0.0)
+    assert recording.export()['timers']['trajectory_rebuild']['arm/left']['count'] == 1
+    assert events.arm_trajectories['left'][2.0].position.x == pytest.approx(2.0)
+
+# Bulk insertion and annotations
+
+def test_annotations_at_one_time_all_fire(events):
+    events.add_annotation_at_time(0.0, 1.0, 'say', 'first', 0)
+    events.add_annotation_at_time(0.0, 1.0, 'say', 'second', 1)
+    assert events.timestep_to(1.0) == {'say':['first', 'second']}
+
+def test_annotations_fire_exactly_once(events):
+    events.add_annotation_at_time(0.0, 1.0, 'say', 'once', 0)
+    assert events.timestep_to(0.5) == {'say':[]}
+    assert events.timestep_to(1.0) == {'say':['once']}
+    assert events.timestep_to(1.0) == {'say':[]}
+    assert events.timestep_to(2.0) == {'say':[]}
+
+def test_annotation_added_at_the_tick_time_fires_on_the_next_tick(events):
+    events.timestep_to(1.0)
+    # The clock has not moved, so this lands on the event that was just ticked
+    events.add_annotation_at_time(1.0, 1.0, 'say', 'late', 0)
+    assert events.timestep_to(1.0) == {'say':['late']}
+    assert events.timestep_to(1.5) == {'say':[]}
+
+def test_annotation_delivery_does_not_rebuild_the_index(events):
+    for time in [3.0, 1.0, 2.0]:
+        events.add_annotation_at_time(0.0, time, 'say', time, 0)
+    trajectory = events.annotation_trajectories['say']
+    assert [events.timestep_to(time)['say'] for time in [1.0, 2.5, 3.0]] == [[1.0], [2.0], [3.0]]
+    assert events.annotation_trajectories['say'] is trajectory
+    # Late annotations still fire once, before anything due later
+    events.add_annotation_at_time(3.0, 0.5, 'say', 'late', 0)
+    events.add_annotation_at_time(3.0, 4.0, 'say', 'next', 0)
+    assert events.timestep_to(3.5) == {'say':['late']}
+    assert events.timestep_to(4.0) == {'say':['next']}
+
+def test_annotation_delivery_cost_does_not_grow_with_pending_annotations():
+    from wisc_tools.control import Event
+    def per_tick(count):
+        events = EventController({}, {'say':{}}, {})
+        pending = []
+        for index in range(count):
+            event = Event(float(index + 1))
+            event.add_annotation('say', index, 0)
+            pending.append(event)
+        events.add_events(0.0, pending)
+        best = float('inf')
+        for tick in range(1, 101):
+            start = time.perf_counter()
+            fired = events.timestep_to(float(tick))
+            best = min(best, time.perf_counter() - start)
+            assert fired == {'say':[tick - 1]}
+        return best
+    # Rebuilding the index on every delivery made this ratio over 100
+    assert per_tick(100000) < 10 * per_tick(1000)
+
+def test_annotation_added_to_a_delivered_event_fires_alone(events):
+    events.add_annotation_at_time(0.0, 1.0, 'say', 'first', 0)
+    assert events.timestep_to(1.0) == {'say':['first']}
+    events.add_annotation_at_time(1.0, 1.0, 'say', 'second', 0)
+    assert events.timestep_to(1.2) == {'say':['second']}
+
+def test_add_events_merges_with_existing_events(events):
+    from wisc_tools.control import Event
+    events.add_pose_at_time(0.0, 1.0, 'left', eulerpose(x=1), 0)
+    events.add_annotation_at_time(0.0, 1.0, 'say', 'kept', 0)
+    added = []
+    for time in [2.0, 1.0, 3.0]:
+        event = Event(time)
+        event.add_pose('left', eulerpose(x=time * 10), 5)
+        event.add_annotation('say', 'added', 5)
+        added.append(event)
+    events.add_events(0.0, added)
+    assert events.times == [1.0, 2.0, 3.0]
+    assert events.arm_trajectories['left'][1.0].position.x == pytest.approx(10.0)
+    assert events.arm_trajectories['left'][3.0].position.x == pytest.approx(30.0)
+    assert events.timestep_to(1.0) == {'say':['kept', 'added']}
+
+def test_add_events_keeps_its_own_copies(events):
+    from wisc_tools.control import Event
+    event = Event(1.0)
+    event.add_pose('left', eulerpose(x=1), 0)
+    event.add_annotation('say', 'hello', 0)
+    event.add_mode('gripper', 0.0, False, 0)
+    events.add_events(0.0, [event])
+    assert all(stored is not event for stored in events.events)
+    # Reusing the Event afterwards does not reach into the store
+    event.add_pose('left', eulerpose(x=5), 0)
+    event.add_annotation('say', 'later', 0)
+    event.add_mode('gripper', 1.0, False, 0)
+    event.time = 9.0
+    assert events.times == [1.0]
+    assert events.events[0].get_pose('left').position.x == pytest.approx(1.0)
+    assert events.events[0].get_mode('gripper').deferred_value == 0.0
+    assert events.timestep_to(1.0) == {'say':['hello']}
+    # The caller's Event never sees delivery either
+    assert event.get_undelivered_annotations('say') == ['hello', 'later']
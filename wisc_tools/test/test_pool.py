@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from wisc_tools.control import StateController, StateControllerPool
+from wisc_tools.structures import PoseTrajectory, PoseTrajectoryStack
+
+def columns(n, seed):
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.1, 0.5, n))
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    return times, rng.uniform(-1, 1, (n, 3)), quaternions
+
+def same_rotation(a, b):
+    # q and -q are the same rotation
+    return np.minimum(np.abs(a - b).max(axis=-1), np.abs(a + b).max(axis=-1))
+
+@pytest.mark.parametrize('length', [1, 2, 3, 4, 7])
+def test_stack_matches_each_trajectory(length):
+    trajectories = [PoseTrajectory.from_arrays(*columns(length, seed)) for seed in range(5)]
+    stack = PoseTrajectoryStack(trajectories)
+    start = min(trajectory.times[0] for trajectory in trajectories)
+    stop = max(trajectory.times[-1] for trajectory in trajectories)
+    # Before, inside and after every span, including the extrapolated front of long trajectories
+    for time in np.linspace(start - 1.0, stop + 1.0, 37):
+        positions, quaternions = stack.sample(time)
+        for row, trajectory in enumerate(trajectories):
+            expected_positions, expected_quaternions = trajectory.sample([time])
+            np.testing.assert_allclose(positions[row], expected_positions[0], atol=1e-9)
+            assert same_rotation(quaternions[row], expected_quaternions[0]) < 1e-9
+
+def test_stack_only_rewrites_replaced_rows():
+    trajectories = [PoseTrajectory.from_arrays(*columns(4, seed)) for seed in range(3)]
+    stack = PoseTrajectoryStack(trajectories)
+    replacement = PoseTrajectory.from_arrays(*columns(2, 9))
+    stack.refresh([trajectories[0], replacement, trajectories[2]])
+    assert stack.trajectories[1] is replacement
+    assert list(stack.lengths) == [4, 2, 4]
+    assert list(stack.extrapolated) == [True, False, True]
+
+def test_pool_matches_serial_controllers(catalog, clock):
+    pool = StateControllerPool(catalog, clock)
+    pooled = [pool.spawn(['left','right']) for index in range(3)]
+    serial = [StateController(None, ['left','right'], clock=clock, catalog=catalog) for index in range(3)]
+    for index, (a, b) in enumerate(zip(pooled, serial)):
+        for controller in (a, b):
+            controller.set_pose('left', 'up', offset=1.0 + index)
+            controller.set_mode('gripper', 'closed')
+            if index == 2:
+                controller.set_action('reach')
+    for time in [0.25, 0.5, 1.0, 1.75, 2.5, 4.0, 9.0]:
+        clock.advance_to(time)
+        results = pool.timestep()
+        for result, controller in zip(results, serial):
+            expected = controller.timestep()
+            for arm in ['left', 'right']:
+                for axis in ['x', 'y', 'z']:
+                    assert result['arms'][arm]['position'][axis] == pytest.approx(expected['arms'][arm]['position'][axis], abs=1e-9)
+            assert result['modes'] == expected['modes']
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from wisc_tools.conversions import transformations
+from wisc_tools.structures import Pose, Position, Quaternion
+from wisc_tools.structures.vectorized import PoseArray
+
+def random_poses(count, seed=0):
+    rng = np.random.RandomState(seed)
+    quaternions = np.array([transformations.random_quaternion(rng.uniform(0, 1, 3)) for _ in range(count)]).reshape(-1, 4)
+    return PoseArray(rng.uniform(-1, 1, (count, 3)), quaternions)
+
+def matrix(pose):
+    result = transformations.quaternion_matrix(list(pose.quaternion))
+    result[:3, 3] = [pose.position.x, pose.position.y, pose.position.z]
+    return result
+
+def matrices(poses):
+    return np.array([matrix(pose) for pose in poses.poses]).reshape(-1, 4, 4)
+
+def test_poses_round_trip():
+    poses = random_poses(6)
+    again = PoseArray.from_poses(poses.poses)
+    np.testing.assert_allclose(again.positions, poses.positions)
+    np.testing.assert_allclose(again.quaternions, poses.quaternions)
+    pose = poses[2]
+    assert isinstance(pose, Pose)
+    assert [pose.position.x, pose.position.y, pose.position.z] == poses.positions[2].tolist()
+    assert len(poses[1:4]) == 3
+
+def test_distances_match_scalar_poses():
+    poses = random_poses(20)
+    target = random_poses(1, seed=1)[0]
+    spatial, rotational = poses.distances_to(target)
+    expected = np.array([pose.distance_to(target) for pose in poses.poses])
+    np.testing.assert_allclose(spatial, expected[:, 0], atol=1e-12)
+    np.testing.assert_allclose(rotational, expected[:, 1], atol=1e-9)
+
+def test_pairwise_distances_match_scalar_poses():
+    poses, others = random_poses(5), random_poses(7, seed=1)
+    spatial, rotational = poses.pairwise_distances(others)
+    assert spatial.shape == rotational.shape == (5, 7)
+    for i, pose in enumerate(poses.poses):
+        for j, other in enumerate(others.poses):
+            assert (spatial[i, j], rotational[i, j]) == pytest.approx(pose.distance_to(other), abs=1e-9)
+    spatial, rotational = poses.pairwise_distances()
+    np.testing.assert_allclose(np.diag(spatial), 0.0)
+    np.testing.assert_allclose(spatial, spatial.T)
+    np.testing.assert_allclose(rotational, rotational.T, atol=1e-9)
+
+def test_negated_quaternions_keep_the_scalar_distance():
+    poses = random_poses(6)
+    flipped = PoseArray(poses.positions, -poses.quaternions)
+    target = poses[0]
+    spatial, rotational = flipped.distances_to(target)
+    for index, pose in enumerate(flipped.poses[1:], 1):
+        assert (spatial[index], rotational[index]) == pytest.approx(pose.distance_to(target), abs=1e-9)
+
+def test_exact_negations_are_pi_apart():
+    # q and -q are the same rotation, but on the quaternion sphere they are antipodal.
+    # Quaternion.distance gives 0 or pi there depending on rounding; the kernel
+    # always gives pi, the limit of the scalar distance from nearby quaternions.
+    poses = random_poses(6)
+    flipped = PoseArray(poses.positions, -poses.quaternions)
+    np.testing.assert_allclose(flipped.distances_to(poses[0])[1][0], np.pi)
+    np.testing.assert_allclose(np.diag(flipped.pairwise_distances(poses)[1]), np.pi)
+    nudged = Quaternion.from_vector_quaternion(-poses.quaternions[0] + [0, 1e-6, 0, 0])
+    assert nudged.distance_to(poses[0].quaternion) == pytest.approx(np.pi, abs=1e-5)
+
+def test_nearest_matches_a_sort_of_scalar_scores():
+    poses = random_poses(30)
+    target = random_poses(1, seed=2)[0]
+    distances = np.array([pose.distance_to(target) for pose in poses.poses])
+    for weight in [0.0, 0.5]:
+        scores = distances[:, 0] + weight * distances[:, 1]
+        for k in [1, 5, 30, 100]:
+            nearest = poses.nearest(target, k, weight)
+            assert nearest.tolist() == np.argsort(scores, kind='stable')[:k].tolist()
+
+def test_compose_and_inverse_match_matrices():
+    poses = random_poses(10)
+    offset = random_poses(1, seed=3)
+    composed = poses.compose(offset)
+    np.testing.assert_allclose(matrices(composed), matrices(poses).dot(matrices(offset)[0]), atol=1e-9)
+    pairwise = poses.compose(random_poses(10, seed=4))
+    np.testing.assert_allclose(matrices(pairwise), np.matmul(matrices(poses), matrices(random_poses(10, seed=4))), atol=1e-9)
+    np.testing.assert_allclose(matrices(poses.inverse()), np.linalg.inv(matrices(poses)), atol=1e-9)
+    identity = poses.compose(poses.inverse())
+    np.testing.assert_allclose(identity.positions, 0.0, atol=1e-9)
+    np.testing.assert_allclose(np.abs(identity.quaternions[:, 0]), 1.0, atol=1e-9)
+
+def test_negated_quaternions_compose_to_the_same_transform():
+    poses = random_poses(5)
+    flipped = PoseArray(poses.positions, -poses.quaternions)
+    offset = random_poses(1, seed=5)
+    np.testing.assert_allclose(matrices(flipped.compose(offset)), matrices(poses.compose(offset)), atol=1e-9)
+    np.testing.assert_allclose(matrices(flipped.inverse()), matrices(poses.inverse()), atol=1e-9)
+
+def test_empty_arrays():
+    pose = Pose(Position(0, 0, 0), Quaternion(1, 0, 0, 0))
+    for empty in [PoseArray.from_poses([]), PoseArray([], []), random_poses(0)]:
+        assert len(empty) == 0
+        assert empty.positions.shape == (0, 3) and empty.quaternions.shape == (0, 4)
+        assert empty.poses == []
+        assert [len(distances) for distances in empty.distances_to(pose)] == [0, 0]
+        assert empty.pairwise_distances(random_poses(3))[0].shape == (0, 3)
+        assert empty.nearest(pose, 3).tolist() == []
+        assert len(empty.compose(pose)) == 0
+        assert len(empty.inverse()) == 0
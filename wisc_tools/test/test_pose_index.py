@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from wisc_tools.conversions import transformations
+from wisc_tools.structures.index import PoseIndex
+from wisc_tools.structures.vectorized import PoseArray
+
+def random_poses(rng, count, spread=1.0):
+    quaternions = np.array([transformations.random_quaternion(rng.uniform(0, 1, 3)) for _ in range(count)]).reshape(-1, 4)
+    return PoseArray(rng.uniform(-spread, spread, (count, 3)), quaternions)
+
+def brute_force(poses, query, rotation_weight):
+    spatial, rotational = poses.distances_to(query)
+    scores = spatial + rotation_weight * rotational
+    order = np.argsort(scores, kind='stable')
+    return order, spatial, rotational
+
+def same_matches(matches, order, spatial, rotational):
+    assert [match.index for match in matches] == order.tolist()
+    assert [match.key for match in matches] == ['pose{0}'.format(index) for index in order]
+    np.testing.assert_allclose([match.spatial for match in matches], spatial[order], atol=1e-12)
+    np.testing.assert_allclose([match.rotational for match in matches], rotational[order], atol=1e-12)
+
+@pytest.mark.parametrize('rotation_weight', [0.0, 0.05, 0.5, 5.0])
+def test_nearest_matches_brute_force(rotation_weight):
+    rng = np.random.RandomState(int(rotation_weight * 100))
+    for trial in range(20):
+        poses = random_poses(rng, rng.randint(1, 300))
+        index = PoseIndex.from_poses(poses, ['pose{0}'.format(i) for i in range(len(poses))], rotation_weight=rotation_weight, leafsize=4)
+        query = random_poses(rng, 1, spread=1.5)
+        order, spatial, rotational = brute_force(poses, query, rotation_weight)
+        for k in [1, 3, 10, len(poses), len(poses) + 5]:
+            same_matches(index.nearest(query, k), order[:k], spatial, rotational)
+
+@pytest.mark.parametrize('max_rotation', [None, 1.0])
+def test_within_matches_brute_force(max_rotation):
+    rng = np.random.RandomState(7)
+    for trial in range(20):
+        poses = random_poses(rng, rng.randint(1, 300))
+        index = PoseIndex.from_poses(poses, ['pose{0}'.format(i) for i in range(len(poses))], leafsize=4)
+        query = random_poses(rng, 1)
+        order, spatial, rotational = brute_force(poses, query, 0.0)
+        for radius in [0.1, 0.5, 2.0, 10.0]:
+            keep = spatial[order] <= radius
+            if max_rotation is not None:
+                keep &= rotational[order] <= max_rotation
+            same_matches(index.within(query, radius, max_rotation), order[keep], spatial, rotational)
+
+def test_k_beyond_the_index_returns_everything():
+    rng = np.random.RandomState(1)
+    poses = random_poses(rng, 5)
+    index = PoseIndex.from_poses(poses, rotation_weight=1.0)
+    matches = index.nearest(poses[2], 50)
+    assert len(matches) == 5
+    assert matches[0].index == 2 and matches[0].spatial == 0.0
+    assert index.nearest(poses[2], 0) == []
+
+def test_zero_radius_only_matches_coincident_positions():
+    rng = np.random.RandomState(2)
+    poses = random_poses(rng, 10)
+    # Two poses share a position with different orientations
+    poses.positions[7] = poses.positions[3]
+    index = PoseIndex.from_poses(poses)
+    assert sorted(match.index for match in index.within(poses[3], 0.0)) == [3, 7]
+    assert [match.index for match in index.within(poses[3], 0.0, max_rotation=0.0)] == [3]
+    assert index.within(PoseArray([5.0, 5.0, 5.0], [1, 0, 0, 0]), 0.0) == []
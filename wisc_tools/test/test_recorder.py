@@ -0,0 +1,108 @@
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from wisc_tools.control import EventController, TrajectoryRecorder, TrajectoryReplayer
+from wisc_tools.structures import Pose
+
+def eulerpose(x=0.0):
+    return Pose.from_eulerpose_dict({'position':{'x':x,'y':0,'z':0},'rotation':{'r':0,'p':0,'y':0}})
+
+def record(controller, clock, path, ticks=50, chunk_size=16):
+    recorder = TrajectoryRecorder.for_controller(controller, path, chunk_size=chunk_size)
+    controller.set_pose('left', 'up', offset=1.0, update=False)
+    controller.set_mode('gripper', 'closed', update=False)
+    expected = []
+    for tick in range(ticks):
+        clock.advance_to(tick * 0.05)
+        if tick == 10:
+            controller.set_annotation('say', 'first')
+            controller.set_annotation('say', {'text':'second'})
+        expected.append(controller.timestep())
+    recorder.close()
+    return recorder, expected
+
+def test_recordings_round_trip(controller, clock, tmp_path):
+    path = str(tmp_path / 'run.wrec')
+    recorder, expected = record(controller, clock, path)
+    assert recorder.dropped == 0 and recorder.failed == 0
+    states = list(TrajectoryReplayer(path))
+    assert [state['time'] for state in states] == pytest.approx([tick * 0.05 for tick in range(50)])
+    for state, current in zip(states, expected):
+        for arm in ['left', 'right']:
+            position = state['arms'][arm].position
+            assert [position.x, position.y, position.z] == pytest.approx([current['arms'][arm]['position'][axis] for axis in 'xyz'])
+        assert state['modes']['gripper'] == pytest.approx(current['modes']['gripper']['value'])
+        assert state['annotations'].get('say', []) == current['annotations']['say']
+    # Both annotations set at one time come back, in order
+    assert states[10]['annotations']['say'] == ['first', {'text':'second'}]
+
+def test_in_memory_recordings_replay(controller, clock):
+    recorder, expected = record(controller, clock, None, ticks=20, chunk_size=8)
+    states = list(TrajectoryReplayer(recorder))
+    assert len(states) == 20
+    assert states[-1]['modes']['gripper'] == pytest.approx(expected[-1]['modes']['gripper']['value'])
+
+def test_feed_schedules_the_recording(controller, clock, tmp_path):
+    path = str(tmp_path / 'run.wrec')
+    record(controller, clock, path)
+    events = EventController({'left':eulerpose(), 'right':eulerpose()}, {'say':{}},
+                             {'gripper':{'override':False,'value':'open','values':{'open':1.0,'closed':0.0}}})
+    assert TrajectoryReplayer(path).feed(events, 0.0, offset=10.0, group_id=7) == 50
+    for state in TrajectoryReplayer(path):
+        time = state['time'] + 10.0
+        assert events.arm_trajectories['left'][time].position.x == pytest.approx(state['arms']['left'].position.x)
+        assert events.mode_trajectories['gripper'][time] == pytest.approx(state['modes']['gripper'])
+    assert events.timestep_to(11.0)['say'] == ['first', {'text':'second'}]
+    assert set(info['group_id'] for event in events for info in event.poses.values()) == set([7])
+
+def test_feed_refits_each_trajectory_once(controller, clock, tmp_path):
+    path = str(tmp_path / 'run.wrec')
+    record(controller, clock, path, ticks=2000, chunk_size=256)
+    events = EventController({'left':eulerpose(), 'right':eulerpose()}, {'say':{}},
+                             {'gripper':{'override':False,'value':'open','values':{'open':1.0,'closed':0.0}}})
+    refits = []
+    refresh = events.refresh_arm_trajectory
+    events.refresh_arm_trajectory = lambda current_time, arm: (refits.append(arm), refresh(current_time, arm))
+    start = time.perf_counter()
+    TrajectoryReplayer(path).feed(events, 0.0)
+    assert sorted(refits) == ['left', 'right']
+    assert len(events.events) == 2000
+    # Generous bound; the per-tick insertion this replaced took seconds here
+    assert time.perf_counter() - start < 2.0
+
+def test_a_bad_chunk_does_not_end_the_recording():
+    recorder = TrajectoryRecorder(['left'], ['gripper'], chunk_size=1)
+    current = {'arms':{'left':eulerpose()}, 'modes':{'gripper':{'value':1.0}}, 'annotations':{}}
+    recorder.record(0.0, dict(current, annotations={'say':[object()]}))
+    recorder.record(1.0, current)
+    recorder.close()
+    assert recorder.failed == 1
+    assert [state['time'] for state in TrajectoryReplayer(recorder)] == [1.0]
+
+class BlockingSink(io.BytesIO):
+    def __init__(self):
+        io.BytesIO.__init__(self)
+        self.release = threading.Event()
+
+    def write(self, data):
+        if self.tell() > 0:
+            self.release.wait(5)
+        return io.BytesIO.write(self, data)
+
+def test_close_does_not_block_on_a_full_queue():
+    sink = BlockingSink()
+    recorder = TrajectoryRecorder(['left'], [], sink=sink, chunk_size=1, max_chunks=2)
+    current = {'arms':{'left':eulerpose()}, 'modes':{}, 'annotations':{}}
+    for tick in range(10):
+        recorder.record(float(tick), current)
+    start = time.perf_counter()
+    recorder.close(timeout=0.2)
+    assert time.perf_counter() - start < 1.0
+    assert recorder.dropped > 0
+    sink.release.set()
+    recorder.writer.join(5)
+    assert not recorder.writer.is_alive()
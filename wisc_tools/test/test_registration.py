@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from wisc_tools.conversions import transformations
+from wisc_tools.conversions.registration import (IncrementalRegistration, ransac_registration,
+                                                 solve, solve_batch, transform_points)
+
+def pair(rng, count=30, noise=0.01, scale=1.0):
+    v0 = rng.uniform(-1, 1, (count, 3))
+    matrix = transformations.concatenate_matrices(transformations.translation_matrix(rng.uniform(-1, 1, 3)),
+                                                  transformations.random_rotation_matrix(rng.uniform(0, 1, 3)),
+                                                  transformations.scale_matrix(scale))
+    v1 = transform_points(matrix, v0) + rng.normal(0, noise, (count, 3))
+    return v0, v1
+
+@pytest.mark.parametrize('seed', range(5))
+def test_solve_matches_superimposition_matrix(seed):
+    rng = np.random.RandomState(seed)
+    v0, v1 = pair(rng)
+    np.testing.assert_allclose(solve(v0, v1), transformations.superimposition_matrix(v0.T, v1.T), atol=1e-9)
+
+def test_scaled_solve_matches_superimposition_matrix():
+    rng = np.random.RandomState(7)
+    v0, v1 = pair(rng, noise=0.0, scale=2.5)
+    expected = transformations.superimposition_matrix(v0.T, v1.T, scale=True)
+    np.testing.assert_allclose(solve(v0, v1, scale=True), expected, atol=1e-9)
+    np.testing.assert_allclose(transform_points(expected, v0), v1, atol=1e-9)
+
+def test_batches_match_single_solves():
+    rng = np.random.RandomState(3)
+    pairs = [pair(rng) for index in range(6)]
+    batched = solve_batch(np.array([v0 for v0, v1 in pairs]), np.array([v1 for v0, v1 in pairs]))
+    for matrix, (v0, v1) in zip(batched, pairs):
+        np.testing.assert_allclose(matrix, transformations.superimposition_matrix(v0.T, v1.T), atol=1e-9)
+
+def test_reflections_are_never_returned():
+    rng = np.random.RandomState(4)
+    v0 = rng.uniform(-1, 1, (10, 3))
+    v1 = v0 * np.array([1.0, 1.0, -1.0])
+    assert np.linalg.det(solve(v0, v1)[:3, :3]) == pytest.approx(1.0)
+
+def test_incremental_registration_tracks_the_window():
+    rng = np.random.RandomState(5)
+    v0, v1 = pair(rng, count=40)
+    registration = IncrementalRegistration()
+    with pytest.raises(ValueError):
+        registration.matrix
+    registration.add_many(v0[:10], v1[:10])
+    for p0, p1 in zip(v0[10:], v1[10:]):
+        registration.add(p0, p1)
+    for p0, p1 in zip(v0[:10], v1[:10]):
+        registration.remove(p0, p1)
+    assert len(registration) == 30
+    np.testing.assert_allclose(registration.matrix, transformations.superimposition_matrix(v0[10:].T, v1[10:].T), atol=1e-8)
+
+def test_ransac_ignores_outliers():
+    rng = np.random.RandomState(6)
+    v0, v1 = pair(rng, count=60, noise=0.001)
+    outliers = rng.choice(60, 15, replace=False)
+    v1[outliers] += rng.uniform(1, 2, (15, 3))
+    matrix, inliers = ransac_registration(v0, v1, threshold=0.01, rng=np.random.RandomState(0))
+    assert not inliers[outliers].any()
+    assert inliers.sum() == 45
+    clean = np.setdiff1d(np.arange(60), outliers)
+    np.testing.assert_allclose(matrix, transformations.superimposition_matrix(v0[clean].T, v1[clean].T), atol=1e-9)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from wisc_tools.adapters import ros
+from wisc_tools.conversions import transformations
+from wisc_tools.structures import Pose, Position, Quaternion
+from wisc_tools.structures.vectorized import PoseArray
+
+def random_poses(count, seed=0):
+    rng = np.random.RandomState(seed)
+    quaternions = np.array([transformations.random_quaternion(rng.uniform(0, 1, 3)) for _ in range(count)]).reshape(-1, 4)
+    return PoseArray(rng.uniform(-1, 1, (count, 3)), quaternions)
+
+def values(message):
+    return ([message.position.x, message.position.y, message.position.z],
+            [message.orientation.w, message.orientation.x, message.orientation.y, message.orientation.z])
+
+def same_values(messages, poses):
+    assert len(messages) == len(poses)
+    for message, position, quaternion in zip(messages, poses.positions, poses.quaternions):
+        assert all(type(value) is float for value in sum(values(message), []))
+        assert values(message) == (position.tolist(), quaternion.tolist())
+
+def test_fill_helpers_write_into_the_given_message():
+    pose = Pose(Position(0.1, 0.2, 0.3), Quaternion(axis=[0, 0, 1], angle=0.5))
+    msg = ros.geometry_msgs.Pose()
+    point, orientation = msg.position, msg.orientation
+    assert ros.fill_ros_pose(msg, pose) is msg
+    assert msg.position is point and msg.orientation is orientation
+    assert msg == ros.ros_pose(pose)
+    assert ros.fill_ros_point(ros.geometry_msgs.Point(), pose.position) == ros.ros_point(pose.position)
+    assert ros.fill_ros_quaternion(ros.geometry_msgs.Quaternion(), pose.quaternion) == ros.ros_quaternion(pose.quaternion)
+    ros.fill_ros_pose_values(msg, [1.0, 2.0, 3.0], [0.0, 1.0, 0.0, 0.0])
+    assert values(msg) == ([1.0, 2.0, 3.0], [0.0, 1.0, 0.0, 0.0])
+    assert msg.position is point and msg.orientation is orientation
+
+def test_message_pool_reuses_released_messages():
+    pool = ros.MessagePool(ros.geometry_msgs.Pose)
+    first = pool.acquire()
+    assert len(pool) == 0
+    pool.release(first)
+    assert len(pool) == 1
+    assert pool.acquire() is first
+    assert pool.acquire() is not first
+
+def test_goals_reuse_their_pose_messages():
+    poses = random_poses(5)
+    msg = ros.fill_ee_pose_goals(ros.wisc_msgs.EEPoseGoals(), poses)
+    same_values(msg.ee_poses, poses)
+    kept = list(msg.ee_poses)
+    moved = random_poses(5, seed=1)
+    assert ros.fill_ee_pose_goals(msg, moved, stamp=4.0) is msg
+    assert [id(message) for message in msg.ee_poses] == [id(message) for message in kept]
+    same_values(msg.ee_poses, moved)
+    assert msg.header.stamp == 4.0
+
+def test_goal_count_changes_go_through_the_pool():
+    pool = ros.MessagePool(ros.geometry_msgs.Pose)
+    msg = ros.fill_ee_pose_goals(ros.wisc_msgs.EEPoseGoals(), random_poses(5), pool)
+    kept = list(msg.ee_poses)
+    ros.fill_ee_pose_goals(msg, random_poses(2, seed=1), pool)
+    assert msg.ee_poses == kept[:2] and all(a is b for a, b in zip(msg.ee_poses, kept))
+    assert sorted(map(id, pool.free)) == sorted(map(id, kept[2:]))
+    poses = random_poses(4, seed=2)
+    ros.fill_ee_pose_goals(msg, poses, pool)
+    # Shrinking released kept[4], kept[3], kept[2]; growing takes the latest back first
+    assert [id(message) for message in msg.ee_poses] == [id(kept[index]) for index in [0, 1, 2, 3]]
+    assert len(pool) == 1 and pool.free[0] is kept[4]
+    same_values(msg.ee_poses, poses)
+
+def test_poses_and_arrays_fill_the_same_values():
+    poses = random_poses(3)
+    from_array = ros.fill_ee_pose_goals(ros.wisc_msgs.EEPoseGoals(), poses)
+    from_poses = ros.fill_ee_pose_goals(ros.wisc_msgs.EEPoseGoals(), iter(poses.poses))
+    assert from_poses.ee_poses == ros.ros_ee_pose_goals(poses.poses).ee_poses
+    for a, b in zip(from_array.ee_poses, from_poses.ee_poses):
+        np.testing.assert_allclose(sum(values(a), []), sum(values(b), []), atol=1e-15)
+    # Round trip back through the scalar conversions
+    for message, pose in zip(from_array.ee_poses, poses.poses):
+        back = ros.from_ros_pose(message)
+        assert back.distance_to(pose) == pytest.approx((0.0, 0.0), abs=1e-12)
+    assert ros.fill_ee_pose_goals(from_array, []).ee_poses == []
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from wisc_tools.control import StateControllerRunner
+
+def run(runner, ticks):
+    # Stops the runner from inside its own loop after the given number of ticks
+    on_tick = runner.on_tick
+    def stop(current):
+        if on_tick is not None:
+            on_tick(current)
+        if runner.ticks >= ticks:
+            runner.running = False
+    runner.on_tick = stop
+    asyncio.run(runner.run())
+
+def test_later_commands_for_one_target_replace_earlier_ones(controller, clock):
+    runner = StateControllerRunner(controller)
+    applied = []
+    runner.queue(('pose','left'), applied.append, 'first')
+    runner.queue(('mode','gripper'), applied.append, 'mode')
+    runner.queue(('pose','left'), applied.append, 'second')
+    runner.tick()
+    # The replacement moves to the back, so commands apply in arrival order
+    assert applied == ['mode', 'second']
+    runner.tick()
+    assert applied == ['mode', 'second']
+
+def test_every_queued_annotation_is_delivered(controller):
+    runner = StateControllerRunner(controller)
+    runner.set_annotation('say', 'hello')
+    runner.set_pose('left', 'up')
+    runner.set_annotation('say', 'world')
+    assert runner.tick()['annotations']['say'] == ['hello', 'world']
+    assert runner.tick()['annotations']['say'] == []
+
+def test_coalesced_pose_commands_schedule_one_goal(controller, clock):
+    runner = StateControllerRunner(controller)
+    runner.set_pose('left', 'up', offset=2.0)
+    runner.set_pose('left', 'up', offset=1.0)
+    runner.tick()
+    assert controller.event_controller.next_event_time(0.0) == 1.0
+    assert [event.time for event in controller.event_controller.events if event.has_pose('left')] == [0.0, 1.0]
+    clock.advance_to(1.0)
+    assert controller.snapshot.arm_trajectories['left'][1.0].distance_to(controller.poses['left']['up']['pose'])[0] == pytest.approx(0.0)
+
+def test_failed_commands_do_not_stop_the_tick(controller):
+    runner = StateControllerRunner(controller)
+    runner.set_pose('left', 'missing')
+    current = runner.tick()
+    assert runner.ticks == 1
+    assert 'left' in current['arms']
+
+def test_ticks_follow_the_rate_on_a_simulated_clock(controller, clock):
+    times = []
+    runner = StateControllerRunner(controller, rate=10.0, on_tick=lambda current: times.append(clock.now()))
+    run(runner, 5)
+    assert times == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4])
+    assert runner.missed_deadlines == 0
+
+def test_runner_wakes_early_for_scheduled_events(controller, clock):
+    controller.set_pose('left', 'up', offset=0.05)
+    times = []
+    runner = StateControllerRunner(controller, rate=10.0, on_tick=lambda current: times.append(clock.now()))
+    run(runner, 3)
+    assert times == pytest.approx([0.0, 0.05, 0.1])
+
+def test_slow_ticks_skip_missed_deadlines(controller, clock):
+    missed = []
+    times = []
+    def on_tick(current):
+        times.append(clock.now())
+        if len(times) == 1:
+            # The first tick overruns by two and a half periods
+            clock.advance(0.25)
+    runner = StateControllerRunner(controller, rate=10.0, on_tick=on_tick,
+                                   on_deadline_missed=lambda count, late: missed.append((count, late)))
+    run(runner, 3)
+    assert runner.missed_deadlines == 2
+    assert missed[0][0] == 2
+    assert missed[0][1] == pytest.approx(0.15)
+    # Instead of bursting to catch up, the next tick lands on the period grid
+    assert times == pytest.approx([0.0, 0.3, 0.4])
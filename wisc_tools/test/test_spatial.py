@@ -0,0 +1,62 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from wisc_tools.conversions import spatial, transformations
+
+def quaternion_dict(rng):
+    w, x, y, z = transformations.random_quaternion(rng.uniform(0, 1, 3))
+    return {'x':x, 'y':y, 'z':z, 'w':w}
+
+def samples(kind, count=4):
+    rng = np.random.RandomState(len(kind))
+    values = []
+    for index in range(count):
+        position = dict(zip('xyz', rng.uniform(-1, 1, 3)))
+        if kind == 'position':
+            values.append(position)
+        elif kind == 'orientation':
+            values.append(quaternion_dict(rng))
+        else:
+            values.append({'position':position, 'orientation':quaternion_dict(rng)})
+    return values
+
+SOURCES = {'position':'dict', 'orientation':'quaternion_dict', 'pose':'quaternion_dict'}
+
+def canonical(kind, value, representation, form):
+    # tf lists, with the quaternion sign fixed, so equal values compare equal
+    tf = spatial.convert(kind, value, representation, 'tf', form)
+    if kind == 'position':
+        return np.array(tf)
+    rotation = np.array(tf if kind == 'orientation' else tf[1])
+    rotation = rotation if rotation[3] >= 0 else -rotation
+    return rotation if kind == 'orientation' else np.concatenate([tf[0], rotation])
+
+@pytest.mark.parametrize('kind', ['position', 'orientation', 'pose'])
+@pytest.mark.parametrize('form', ['sxyz', 'szxy'])
+def test_every_route_round_trips(kind, form):
+    representations = spatial.conversions.representations(kind)
+    for value in samples(kind):
+        expected = canonical(kind, value, SOURCES[kind], form)
+        for first, second in itertools.product(representations, repeat=2):
+            there = spatial.convert(kind, value, SOURCES[kind], first, form)
+            back = spatial.convert(kind, spatial.convert(kind, there, first, second, form), second, SOURCES[kind], form)
+            np.testing.assert_allclose(canonical(kind, back, SOURCES[kind], form), expected, atol=1e-9,
+                                       err_msg='{0} -> {1} -> {2}'.format(first, second, SOURCES[kind]))
+
+@pytest.mark.parametrize('kind', ['orientation', 'pose'])
+def test_batches_match_single_conversions(kind):
+    euler = [spatial.convert(kind, value, 'quaternion_dict', 'euler_dict', 'szxy') for value in samples(kind, 8)]
+    for target in ['quaternion_dict', 'tf', 'quaternion_msg']:
+        batched = spatial.convert_many(kind, euler, 'euler_dict', target, 'szxy')
+        single = [spatial.convert(kind, value, 'euler_dict', target, 'szxy') for value in euler]
+        assert len(batched) == len(single)
+        for a, b in zip(batched, single):
+            np.testing.assert_allclose(canonical(kind, a, target, 'szxy'), canonical(kind, b, target, 'szxy'), atol=1e-12)
+
+def test_routes_are_cached_and_unknown_routes_fail():
+    graph = spatial.conversions
+    assert graph.converter('pose', 'euler_msg', 'tf') is graph.converter('pose', 'euler_msg', 'tf')
+    with pytest.raises(ValueError):
+        graph.converter('pose', 'euler_msg', 'matrix')
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+def test_snapshots_are_never_modified(controller, clock):
+    first = controller.snapshot
+    current = first.current
+    arms = dict(current['arms'])
+    modes = {mode:dict(info) for mode,info in current['modes'].items()}
+    trajectory = first.arm_trajectories['left']
+    clock.advance_to(0.5)
+    controller.set_pose('left', 'up', offset=1.0)
+    controller.set_mode('gripper', 'closed')
+    clock.advance_to(1.5)
+    controller.timestep()
+    assert controller.snapshot is not first
+    assert first.current is current
+    assert current['arms'] == arms
+    assert {mode:dict(info) for mode,info in current['modes'].items()} == modes
+    assert first.arm_trajectories['left'] is trajectory
+    assert first.mode_overrides['gripper'] is False
+    assert controller.snapshot.mode_overrides['gripper'] is True
+    assert controller.snapshot.arm_trajectories['left'] is not trajectory
+
+def test_snapshot_mode_views_keep_their_layer(controller, clock):
+    view = controller.snapshot.mode_trajectories['gripper']
+    controller.set_mode('gripper', 'closed')
+    assert view.active is False
+    assert controller.snapshot.mode_trajectories['gripper'].active is True
+
+def test_future_reads_only_the_snapshot(controller, clock):
+    controller.set_pose('left', 'up', offset=1.0)
+    future = controller.future
+    assert [arm['name'] for arm in future['armData']] == list(controller.snapshot.arm_trajectories.keys())
+    assert sorted(mode['name'] for mode in future['modeData']) == ['gripper', 'light']
+
+def test_nearest_poses_does_not_take_the_lock(controller, clock):
+    controller.set_pose('left', 'up', offset=1.0)
+    clock.advance_to(1.0)
+    controller.timestep()
+    result = []
+    # Hold the writer lock from another thread; readers must still get through
+    held = threading.Event()
+    release = threading.Event()
+    def writer():
+        with controller.lock:
+            held.set()
+            release.wait(5)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    held.wait(5)
+    try:
+        reader = threading.Thread(target=lambda: result.append(controller.nearest_poses('left')))
+        reader.start()
+        reader.join(5)
+        assert result == [['up']]
+    finally:
+        release.set()
+        thread.join()
+
+def test_lookups_are_timed_per_tick(controller, clock):
+    from wisc_tools.convenience.instrumentation import metrics
+    from wisc_tools.structures import PoseTrajectory, ModeTrajectory
+    # The trajectory hot paths carry no instrumentation wrapper at all
+    assert not hasattr(PoseTrajectory.__getitem__, '__wrapped__')
+    assert not hasattr(ModeTrajectory.__getitem__, '__wrapped__')
+    metrics.reset()
+    metrics.enable()
+    try:
+        for tick in range(3):
+            clock.advance(0.1)
+            controller.timestep()
+        timers = metrics.export()['timers']
+    finally:
+        metrics.disable()
+        metrics.reset()
+    assert timers['timestep'][None]['count'] == 3
+    assert timers['pose_lookup'][None]['count'] == 3
+    assert timers['mode_lookup'][None]['count'] == 3
+
+def test_annotation_set_right_after_a_tick_is_delivered_once(controller, clock):
+    clock.advance_to(1.0)
+    controller.timestep()
+    controller.set_annotation('say', 'hello')
+    assert controller.timestep()['annotations']['say'] == ['hello']
+    clock.advance_to(1.1)
+    assert controller.timestep()['annotations']['say'] == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from wisc_tools.structures import PoseTrajectory, ModeTrajectory, AnnotationTrajectory
+from wisc_tools.structures import storage
+
+def columns(n, seed=0):
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.1, 0.5, n))
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    return times, rng.uniform(-1, 1, (n, 3)), quaternions
+
+@pytest.mark.parametrize('length', [1, 3, 20])
+def test_pose_trajectories_round_trip(tmp_path, length):
+    path = str(tmp_path / 'pose.wtrj')
+    original = PoseTrajectory.from_arrays(*columns(length))
+    original.save(path)
+    opened = PoseTrajectory.open(path)
+    # Columns are views onto the mapped file, not copies
+    assert not opened.times.flags.owndata and not opened.positions.flags.owndata
+    np.testing.assert_array_equal(opened.times, original.times)
+    np.testing.assert_array_equal(opened.positions, original.positions)
+    np.testing.assert_array_equal(opened.quaternions, original.quaternions)
+    queries = np.linspace(original.times[0] - 1.0, original.times[-1] + 1.0, 25)
+    for expected, actual in zip(original.sample(queries), opened.sample(queries)):
+        np.testing.assert_allclose(actual, expected)
+    pose = opened[float(queries[7])]
+    np.testing.assert_allclose(pose.position.array, original[float(queries[7])].position.array)
+
+def test_mode_and_annotation_trajectories_round_trip(tmp_path):
+    path = str(tmp_path / 'mode.wtrj')
+    original = ModeTrajectory([{'time':0.0,'mode':0.0},{'time':1.0,'mode':1.0},{'time':3.0,'mode':0.5}], kind='step')
+    original.save(path)
+    opened = ModeTrajectory.open(path)
+    assert opened.kind == 'step'
+    assert [opened[time] for time in [-1.0, 0.5, 1.0, 2.9, 5.0]] == [0.0, 0.0, 1.0, 1.0, 0.5]
+
+    path = str(tmp_path / 'annotation.wtrj')
+    AnnotationTrajectory([{'time':2.0,'annotation':{'say':'b'}},{'time':1.0,'annotation':'a'}]).save(path)
+    opened = AnnotationTrajectory.open(path)
+    assert opened.between(None, 5.0) == ['a', {'say':'b'}]
+
+def test_open_checks_the_file(tmp_path):
+    path = str(tmp_path / 'pose.wtrj')
+    PoseTrajectory.from_arrays(*columns(4)).save(path)
+    with pytest.raises(TypeError):
+        ModeTrajectory.open(path)
+    bad = tmp_path / 'bad.wtrj'
+    bad.write_bytes(b'not a trajectory file at all, but long enough for a header')
+    with pytest.raises(ValueError):
+        storage.open_trajectory(str(bad))
+
+def test_opening_builds_nothing_until_a_lookup(tmp_path):
+    path = str(tmp_path / 'pose.wtrj')
+    PoseTrajectory.from_arrays(*columns(50)).save(path)
+    opened = PoseTrajectory.open(path)
+    assert opened.padded is None and opened.fitted is None
+    opened[3.0]
+    opened.sample([1.0, 2.0])
+    # Linear kinds read straight from the mapped columns, so nothing is ever padded
+    assert opened.padded is None
+
+    path = str(tmp_path / 'mode.wtrj')
+    ModeTrajectory.from_arrays(np.arange(50.0), np.arange(50.0) % 3).save(path)
+    opened = ModeTrajectory.open(path)
+    assert opened.bounds is None and opened.padded is None and opened.fitted is None
+    assert opened[1.5] == pytest.approx(1.5)
+    assert opened.padded is None
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from wisc_tools.adapters import ros
+from wisc_tools.conversions import style
+
+# matplotlib's viridis at values that land on one of the hex stops
+VIRIDIS = {0.0:(0.267004, 0.004874, 0.329415), 0.25:(0.229739, 0.322361, 0.545706),
+           0.5:(0.127568, 0.566949, 0.550556), 1.0:(0.993248, 0.906157, 0.143936)}
+
+def test_viridis_matches_known_stops():
+    colormap = style.get_colormap('viridis')
+    assert colormap.lut.shape == (256, 4)
+    for value, rgb in VIRIDIS.items():
+        # The table is built from 8-bit hex stops, so allow one step of rounding
+        np.testing.assert_allclose(colormap.rgba([value], 0.0, 1.0)[0], list(rgb) + [1.0], atol=1.5 / 255)
+    # Every 16th entry lands exactly on one of the hex stops
+    assert colormap.lut[128, :3].tolist() == style.rgb_fromHex('#21918c')
+    assert colormap.lut[255, :3].tolist() == style.rgb_fromHex('#fde725')
+
+def test_greys_interpolate_linearly():
+    lut = style.get_colormap('Greys').lut
+    np.testing.assert_allclose(lut[:, 0], np.linspace(0.0, 1.0, 256))
+    np.testing.assert_allclose(lut[:, 3], 1.0)
+
+def test_values_outside_the_range_clamp_to_the_ends():
+    colormap = style.VIRIDIS
+    colors = colormap.rgba([-5.0, 0.0, 1.0, 7.0], 0.0, 1.0)
+    np.testing.assert_array_equal(colors[0], colormap.lut[0])
+    np.testing.assert_array_equal(colors[1], colormap.lut[0])
+    np.testing.assert_array_equal(colors[2], colormap.lut[-1])
+    np.testing.assert_array_equal(colors[3], colormap.lut[-1])
+
+def test_default_range_bad_values_and_alpha():
+    colormap = style.VIRIDIS
+    indices, finite = colormap.indices([2.0, np.nan, 4.0, 3.0])
+    assert indices.tolist() == [0, 0, 255, 128] and finite.tolist() == [True, False, True, True]
+    colors = colormap.rgba([2.0, np.nan, 4.0], alpha=0.5)
+    assert colors[1].tolist() == [0.0, 0.0, 0.0, 0.0]
+    assert colors[[0, 2], 3].tolist() == [0.5, 0.5]
+    # The lookup table itself is never modified
+    assert (colormap.lut[:, 3] == 1.0).all()
+    # A flat range maps everything to the first color
+    assert colormap.indices([3.0, 3.0])[0].tolist() == [0, 0]
+
+def test_fill_writes_into_existing_messages():
+    rgba = style.color_rgbaFromValues([0.0, 0.5, 1.0], vmin=0.0, vmax=1.0, alpha=0.25)
+    msgs = [ros.std_msgs.ColorRGBA() for _ in range(4)]
+    kept = list(msgs)
+    assert style.color_fillMsgsFromRGBA(msgs, rgba) is msgs
+    assert all(a is b for a, b in zip(msgs, kept)) and len(msgs) == 4
+    assert msgs[:3] == style.color_msgsFromRGBA(rgba)
+    assert all(type(value) is float for msg in msgs[:3] for value in (msg.r, msg.g, msg.b, msg.a))
+    # Messages beyond the given colors are left alone
+    assert msgs[3] == ros.std_msgs.ColorRGBA()
+    assert style.color_dictsFromRGBA(rgba) == [style.color_dictFromMsg(msg) for msg in msgs[:3]]
+
+def test_unknown_colormaps_raise_lookup_error():
+    assert style.get_colormap(style.GREYS) is style.GREYS
+    with pytest.raises(LookupError):
+        style.get_colormap('jet')
+    custom = style.register_colormap('Reds', [(0.0, '#000000'), (1.0, '#ff0000')], size=3)
+    assert style.get_colormap('reds') is custom and len(custom) == 3
+    assert custom.lut[:, :3].tolist() == [[0.0, 0.0, 0.0], [0.5, 0.0, 0.0], [1.0, 0.0, 0.0]]
+    del style.colormaps['reds']
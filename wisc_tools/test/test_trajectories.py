@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from scipy import interpolate
+
+from wisc_tools.structures import PoseTrajectory, ModeTrajectory
+from wisc_tools.structures.structures import interpolate_columns
+
+def padded_interp1d(trajectory, values):
+    # The reference: interp1d over the padded columns, as trajectories were fitted originally
+    return interpolate.interp1d(trajectory.__pad_times__(trajectory.times), trajectory.__pad_rows__(values),
+                                kind='slinear', axis=0, fill_value='extrapolate')
+
+@pytest.mark.parametrize('length', [1, 2, 3, 4, 9])
+def test_linear_lookups_match_padded_interp1d(length):
+    rng = np.random.RandomState(length)
+    times = np.cumsum(rng.uniform(0.1, 0.5, length))
+    positions = rng.uniform(-1, 1, (length, 3))
+    quaternions = rng.normal(size=(length, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    trajectory = PoseTrajectory.from_arrays(times, positions, quaternions)
+    modes = ModeTrajectory.from_arrays(times, positions[:, 0])
+    queries = np.linspace(times[0] - 30.0, times[-1] + 30.0, 101)
+    if length > 1:
+        reference = padded_interp1d(trajectory, positions)
+        np.testing.assert_allclose(trajectory.sample_positions(queries), reference(queries), atol=1e-12)
+        for query in queries[::10]:
+            np.testing.assert_allclose(trajectory[float(query)].position.array, reference(query), atol=1e-12)
+        expected = np.clip(padded_interp1d(modes, positions[:, 0])(queries), positions[:, 0].min(), positions[:, 0].max())
+        np.testing.assert_allclose(modes.sample(queries), expected, atol=1e-12)
+        assert [modes[float(query)] for query in queries[::10]] == pytest.approx(list(expected[::10]), abs=1e-12)
+    else:
+        np.testing.assert_allclose(trajectory.sample_positions(queries), np.repeat(positions, len(queries), axis=0))
+        assert modes[float(queries[0])] == positions[0, 0]
+
+def test_orientations_hold_outside_the_waypoints():
+    times = np.array([0.0, 1.0, 2.0, 3.0])
+    quaternions = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0], [0, 0, 1.0, 0], [0, 0, 0, 1.0]])
+    trajectory = PoseTrajectory.from_arrays(times, np.zeros((4, 3)), quaternions)
+    positions, sampled = trajectory.sample([-5.0, 0.0, 3.0, 50.0])
+    np.testing.assert_allclose(sampled, quaternions[[0, 0, 3, 3]])
+    assert trajectory[-5.0].quaternion.w == pytest.approx(1.0)
+    assert trajectory[50.0].quaternion.z == pytest.approx(1.0)
+
+def test_interpolate_columns_handles_repeated_times():
+    times = np.array([0.0, 1.0, 1.0, 2.0])
+    values = np.array([0.0, 1.0, 5.0, 6.0])
+    assert interpolate_columns(times, values, 0.5) == pytest.approx(0.5)
+    np.testing.assert_allclose(interpolate_columns(times, values, np.array([0.5, 1.0, 1.5])), [0.5, 5.0, 5.5])
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from wisc_tools.conversions import transformations
+from wisc_tools.conversions.transform_buffer import ExtrapolationError, TransformBuffer
+from wisc_tools.structures import Pose, Position, Quaternion
+
+def random_transform(rng):
+    return rng.uniform(-1, 1, 3), transformations.random_quaternion(rng.uniform(0, 1, 3))
+
+def matrix(translation, rotation):
+    result = transformations.quaternion_matrix(rotation)
+    result[:3, 3] = translation
+    return result
+
+def same_transform(actual, expected):
+    np.testing.assert_allclose(matrix(*actual), expected, atol=1e-9)
+
+@pytest.fixture
+def tree():
+    # world -> base -> arm -> hand, and world -> camera
+    rng = np.random.RandomState(0)
+    buffer = TransformBuffer()
+    edges = {}
+    for parent, child in [('world', 'base'), ('base', 'arm'), ('arm', 'hand'), ('world', 'camera')]:
+        edges[child] = random_transform(rng)
+        buffer.set_static_transform(parent, child, *edges[child])
+    return buffer, {child:matrix(*edge) for child, edge in edges.items()}
+
+def test_lookups_match_chained_matrices(tree):
+    buffer, m = tree
+    world_hand = m['base'].dot(m['arm']).dot(m['hand'])
+    same_transform(buffer.lookup('world', 'hand'), world_hand)
+    same_transform(buffer.lookup('camera', 'hand'), np.linalg.inv(m['camera']).dot(world_hand))
+    same_transform(buffer.lookup('hand', 'camera'), np.linalg.inv(world_hand).dot(m['camera']))
+    same_transform(buffer.lookup('arm', 'arm'), np.identity(4))
+    np.testing.assert_allclose(buffer.lookup_matrix('camera', 'arm'), np.linalg.inv(m['camera']).dot(m['base']).dot(m['arm']), atol=1e-9)
+
+def test_points_and_poses_match_matrices(tree):
+    buffer, m = tree
+    points = np.random.RandomState(1).uniform(-1, 1, (5, 3))
+    camera_hand = np.linalg.inv(m['camera']).dot(m['base']).dot(m['arm']).dot(m['hand'])
+    expected = camera_hand[:3, :3].dot(points.T).T + camera_hand[:3, 3]
+    np.testing.assert_allclose(buffer.transform_points('camera', 'hand', points), expected, atol=1e-9)
+    pose = Pose(Position(0.1, 0.2, 0.3), Quaternion(axis=[0, 0, 1], angle=0.5))
+    moved = buffer.transform_pose('camera', 'hand', pose)
+    same_transform(((moved.position.x, moved.position.y, moved.position.z), list(moved.quaternion)),
+                   camera_hand.dot(matrix([0.1, 0.2, 0.3], list(pose.quaternion))))
+
+def test_lookups_interpolate_between_stamps():
+    rng = np.random.RandomState(2)
+    buffer = TransformBuffer()
+    (p0, q0), (p1, q1) = random_transform(rng), random_transform(rng)
+    buffer.set_transform('world', 'hand', 1.0, p0, q0)
+    buffer.set_transform('world', 'hand', 3.0, p1, q1)
+    same_transform(buffer.lookup('world', 'hand', 1.5), matrix(p0 + 0.25 * (p1 - p0), transformations.quaternion_slerp(q0, q1, 0.25)))
+    same_transform(buffer.lookup('world', 'hand'), matrix(p1, q1))
+    with pytest.raises(ExtrapolationError):
+        buffer.lookup('world', 'hand', 3.5)
+
+def test_cached_results_follow_new_transforms():
+    buffer = TransformBuffer()
+    buffer.set_transform('world', 'hand', 1.0, [0, 0, 0], [1, 0, 0, 0])
+    buffer.set_transform('world', 'hand', 2.0, [2, 0, 0], [1, 0, 0, 0])
+    assert buffer.lookup('world', 'hand', 2.0)[0][0] == pytest.approx(2.0)
+    # A late sample at an existing stamp replaces it, and the cached lookup is dropped
+    buffer.set_transform('world', 'hand', 2.0, [4, 0, 0], [1, 0, 0, 0])
+    assert buffer.lookup('world', 'hand', 2.0)[0][0] == pytest.approx(4.0)
+    assert buffer.lookup('world', 'hand', 1.5)[0][0] == pytest.approx(2.0)
+
+def test_only_stamp_independent_results_are_cached(tree):
+    buffer, m = tree
+    buffer.set_transform('hand', 'finger', 1.0, [0, 0, 0], [1, 0, 0, 0])
+    buffer.set_transform('hand', 'finger', 2.0, [1, 0, 0], [1, 0, 0, 0])
+    for stamp in np.linspace(1.0, 2.0, 50):
+        buffer.lookup('world', 'finger', stamp)
+    assert len(buffer.results) == 0
+    latest = buffer.lookup('world', 'finger')
+    assert buffer.lookup('world', 'finger') is latest
+    # Static paths give the same transform at any stamp, so stamped lookups share one entry
+    assert buffer.lookup('world', 'hand', 5.0) is buffer.lookup('world', 'hand', 7.0)
+    assert len(buffer.results) == 2
+    buffer.set_transform('hand', 'finger', 3.0, [3, 0, 0], [1, 0, 0, 0])
+    assert buffer.lookup('world', 'finger') is not latest
+    same_transform(buffer.lookup('hand', 'finger'), matrix([3, 0, 0], [1, 0, 0, 0]))
+
+def test_results_cannot_be_modified(tree):
+    buffer, m = tree
+    translation, rotation = buffer.lookup('world', 'hand')
+    with pytest.raises(ValueError):
+        translation[0] = 100.0
+    with pytest.raises(ValueError):
+        rotation[0] = 0.0
+    same_transform(buffer.lookup('world', 'hand'), m['base'].dot(m['arm']).dot(m['hand']))
+
+def test_edges_can_switch_between_static_and_dynamic():
+    buffer = TransformBuffer()
+    buffer.set_transform('world', 'hand', 1.0, [1, 0, 0], [1, 0, 0, 0])
+    buffer.set_transform('world', 'hand', 2.0, [2, 0, 0], [1, 0, 0, 0])
+    buffer.lookup('world', 'hand')
+    buffer.set_static_transform('world', 'hand', [5, 0, 0], [1, 0, 0, 0])
+    assert buffer.edges['hand'].static
+    assert len(buffer.edges['hand']) == 1
+    # Static edges answer any stamp, including ones the dynamic history never covered
+    assert buffer.lookup('world', 'hand', 10.0)[0][0] == pytest.approx(5.0)
+    assert buffer.lookup('world', 'hand')[0][0] == pytest.approx(5.0)
+    buffer.set_transform('world', 'hand', 3.0, [3, 0, 0], [1, 0, 0, 0])
+    assert not buffer.edges['hand'].static
+    assert buffer.lookup('world', 'hand')[0][0] == pytest.approx(3.0)
+    with pytest.raises(ExtrapolationError):
+        buffer.lookup('world', 'hand', 10.0)
+
+def test_cycles_and_disconnected_frames_are_rejected(tree):
+    buffer, m = tree
+    with pytest.raises(ValueError):
+        buffer.set_static_transform('hand', 'world', [0, 0, 0], [1, 0, 0, 0])
+    buffer.set_static_transform('elsewhere', 'thing', [0, 0, 0], [1, 0, 0, 0])
+    with pytest.raises(LookupError):
+        buffer.lookup('world', 'thing')
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from wisc_tools.adapters import ros
+from wisc_tools.control.visualization import TrajectoryMarkers, decimate
+from wisc_tools.structures import PoseTrajectory
+
+def arc(count, bend):
+    # Unit steps that turn by bend radians at every interior point
+    headings = np.arange(count - 1) * bend
+    steps = np.stack([np.cos(headings), np.sin(headings), np.zeros(count - 1)], axis=1)
+    return np.concatenate([np.zeros((1, 3)), steps.cumsum(axis=0)])
+
+def trajectory(positions, start=0.0, step=1.0):
+    positions = np.asarray(positions, dtype=float)
+    quaternions = np.tile([1.0, 0.0, 0.0, 0.0], (len(positions), 1))
+    return PoseTrajectory.from_arrays(start + step * np.arange(len(positions)), positions, quaternions)
+
+# decimate
+
+def test_short_and_straight_paths_keep_only_their_ends():
+    assert decimate(np.zeros((0, 3))).tolist() == []
+    assert decimate([[0, 0, 0]]).tolist() == [0]
+    assert decimate([[0, 0, 0], [1, 0, 0]]).tolist() == [0, 1]
+    line = np.linspace([0, 0, 0], [1, 2, 3], 50)
+    assert decimate(line).tolist() == [0, 49]
+    # Points that do not move add no turning either
+    assert decimate(np.zeros((10, 3))).tolist() == [0, 9]
+
+def test_bends_keep_a_point_per_angle_crossed():
+    # 0.037 rad per point crosses another 0.1 rad at points 3, 6, 9, 11 and 14
+    assert decimate(arc(17, 0.037), angle=0.1).tolist() == [0, 3, 6, 9, 11, 14, 16]
+    corner = np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0], [2, 1, 0], [2, 2, 0]], dtype=float)
+    assert decimate(corner).tolist() == [0, 2, 4]
+
+def test_spacing_keeps_a_point_per_length_crossed():
+    line = np.stack([np.arange(12.0), np.zeros(12), np.zeros(12)], axis=1)
+    # Lengths 3, 5, 8 and 10 cross multiples of 2.5
+    assert decimate(line, spacing=2.5).tolist() == [0, 3, 5, 8, 10, 11]
+    corner = np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0], [2, 1, 0], [2, 2, 0]], dtype=float)
+    # The corner at 2 comes from turning, 3 from the path length crossing 3.0
+    assert decimate(corner, spacing=1.5).tolist() == [0, 2, 3, 4]
+
+# TrajectoryMarkers
+
+def points(marker):
+    return [[point.x, point.y, point.z] for point in marker.points]
+
+def test_markers_follow_the_decimated_preview():
+    markers = TrajectoryMarkers(horizon=4.0, samples=41)
+    moving = trajectory(arc(20, 0.3))
+    changed = markers.update('left', moving, 2.0, stamp=7.0)
+    line, spheres = markers.arms['left']['line'], markers.arms['left']['spheres']
+    assert changed == [line, spheres]
+    assert line.type == ros.visualization_msgs.Marker.LINE_STRIP
+    assert spheres.type == ros.visualization_msgs.Marker.SPHERE_LIST
+    expected, ahead = markers.preview(moving, 2.0)
+    assert ahead[0] == 0.0 and ahead[-1] == 4.0
+    for marker in changed:
+        assert points(marker) == expected.tolist()
+        assert len(marker.colors) == len(expected)
+        assert marker.header.stamp == 7.0
+    first, last = markers.colormap.rgba([0.0, 4.0], 0.0, 4.0, 1.0)
+    assert [line.colors[0].r, line.colors[0].g, line.colors[0].b, line.colors[0].a] == pytest.approx(first)
+    assert [line.colors[-1].r, line.colors[-1].g, line.colors[-1].b, line.colors[-1].a] == pytest.approx(last)
+
+def test_markers_are_refilled_in_place():
+    markers = TrajectoryMarkers(horizon=4.0, samples=41)
+    moving = trajectory(arc(20, 0.3))
+    line, spheres = markers.update('left', moving, 2.0)
+    lists = line.points, line.colors
+    before = list(line.points), list(line.colors)
+    changed = markers.update('left', moving, 2.5)
+    assert changed[0] is line and changed[1] is spheres
+    assert line.points is lists[0] and line.colors is lists[1]
+    # Messages that are still needed are the same objects, refilled with the new preview
+    for old, new in zip(before, lists):
+        shared = min(len(old), len(new))
+        assert shared > 0 and all(a is b for a, b in zip(old[:shared], new[:shared]))
+    assert points(line) == markers.preview(moving, 2.5)[0].tolist()
+    assert markers.markers() == [line, spheres]
+
+def test_unchanged_previews_are_skipped():
+    markers = TrajectoryMarkers(horizon=2.0, samples=21)
+    moving, parked = trajectory(arc(20, 0.3)), trajectory(arc(5, 0.3))
+    assert len(markers.update_all({'left':moving, 'right':parked}, 10.0)) == 4
+    # right has finished its trajectory, so its preview holds the end pose
+    changed = markers.update_all({'left':moving, 'right':parked}, 11.0)
+    assert changed == [markers.arms['left']['line'], markers.arms['left']['spheres']]
+    assert markers.update('left', moving, 11.0) == []
+    # Movement within tolerance also counts as unchanged
+    nudged = trajectory(arc(5, 0.3) + 1e-6)
+    assert markers.update('right', nudged, 12.0) == []
+    assert len(markers.update('right', trajectory(arc(5, 0.3) + 1e-2), 12.0)) == 2
+
+def test_forgotten_arms_get_delete_markers():
+    markers = TrajectoryMarkers()
+    line, spheres = markers.update('left', trajectory(arc(20, 0.3)), 1.0)
+    deleted = markers.forget('left')
+    assert [(marker.ns, marker.id, marker.action) for marker in deleted] == \
+        [(line.ns, line.id, ros.visualization_msgs.Marker.DELETE), (spheres.ns, spheres.id, ros.visualization_msgs.Marker.DELETE)]
+    assert markers.forget('left') == []
+    assert markers.markers() == []